@@ -21,7 +21,29 @@ def reload_modules():
     exception_dialog_system.import_extensions(refresh=True)
     
 
-def startup():
+def reload_extensions():
+    """Re-import only the extensions that changed, without reloading the tool or removing the exception hook"""
     from . import exception_dialog_system
-    exception_dialog_system.import_extensions()
-    exception_dialog_system.register_exception_hook()
+    return exception_dialog_system.reload_extensions()
+
+
+def startup(lazy=False, load_on_idle=False, prewarm=False, capture_logging=False):
+    """
+    lazy: only install the exception hook(s), the extensions and UI are loaded on the first exception
+    load_on_idle: (with lazy) load the extensions and UI once the DCC is idle instead
+    prewarm: build the dialog window (hidden) once the DCC is idle, so the first exception only has to show it
+    capture_logging: also show exceptions that are logged with logger.exception (or exc_info=True)
+    """
+    import time
+    start_time = time.time()
+
+    from . import exception_dialog_system
+    if not lazy:
+        exception_dialog_system.import_extensions()
+    exception_dialog_system.register_exception_hook(lazy=lazy, load_on_idle=load_on_idle, prewarm=prewarm)
+
+    if capture_logging:
+        from . import exception_dialog_logging
+        exception_dialog_logging.install_logging_handler()
+
+    exception_dialog_system.SessionInfo.startup_duration = time.time() - start_time
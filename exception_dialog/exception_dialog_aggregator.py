@@ -0,0 +1,467 @@
+"""
+Local aggregator for the exceptions of every python / DCC process on a machine.
+
+Each process streams compact records to the aggregator over a unix domain socket,
+the aggregator dedupes them across processes and batch-writes them to the exception store.
+
+Start it with:
+python -m exception_dialog.exception_dialog_aggregator
+
+"""
+import argparse
+import collections
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+
+if sys.version_info.major >= 3:
+    import socketserver
+else:
+    import SocketServer as socketserver
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import exception_dialog_metrics as edm
+from . import exception_dialog_store
+from . import exception_dialog_writer
+
+# frame header: payload length + payload format
+FRAME_HEADER = struct.Struct(">IB")
+FORMAT_JSON = 0
+FORMAT_MSGPACK = 1
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# used when the platform has no unix domain sockets
+FALLBACK_TCP_ADDRESS = ("127.0.0.1", 47811)
+
+
+def get_default_address():
+    if hasattr(socket, "AF_UNIX"):
+        return os.environ.get(
+            "EXCEPTION_DIALOG_AGGREGATOR",
+            os.path.join(os.path.expanduser("~"), ".exception_dialog", "aggregator.sock"),
+        )
+    return FALLBACK_TCP_ADDRESS
+
+
+def encode_frame(message):
+    if msgpack is not None:
+        payload = msgpack.packb(message, use_bin_type=True)
+        payload_format = FORMAT_MSGPACK
+    else:
+        payload = json.dumps(message).encode("utf-8")
+        payload_format = FORMAT_JSON
+    return FRAME_HEADER.pack(len(payload), payload_format) + payload
+
+
+def decode_payload(payload, payload_format):
+    if payload_format == FORMAT_MSGPACK:
+        if msgpack is None:
+            raise ValueError("received a msgpack frame, but msgpack is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    return json.loads(payload.decode("utf-8"))
+
+
+def read_exactly(stream, size):
+    data = stream.read(size)
+    if data is None or len(data) < size:
+        return None
+    return data
+
+
+def iter_frames(stream):
+    while True:
+        header = read_exactly(stream, FRAME_HEADER.size)
+        if header is None:
+            return
+
+        payload_size, payload_format = FRAME_HEADER.unpack(header)
+        if payload_size > MAX_FRAME_SIZE:
+            raise ValueError("frame of {} bytes is over the size limit".format(payload_size))
+
+        payload = read_exactly(stream, payload_size)
+        if payload is None:
+            return
+        yield decode_payload(payload, payload_format)
+
+
+#########################################################
+# client
+
+class AggregatorClient(object):
+    """
+    Sends exception records to the aggregator from a background thread.
+
+    Sending never blocks the caller. While the aggregator can't keep up, records and contexts are kept
+    up to queue_size (new records are dropped past that, the earlier ones are what later repeats refer to),
+    and repeats are added up per fingerprint, so a storm of them takes no extra memory.
+
+    When nothing is listening on the socket, the queued messages are dropped, and so is everything that's sent
+    until the next connection attempt, reconnect_interval seconds later.
+    """
+
+    def __init__(self, address=None, queue_size=10000, reconnect_interval=5.0):
+        self.address = address or get_default_address()
+        self.queue_size = queue_size
+        self.reconnect_interval = reconnect_interval
+        self.environment = exception_dialog_store.get_environment_info()
+
+        self._messages = collections.deque()  # (record or context message, exc_record)
+        self.repeats = exception_dialog_writer.RepeatCounter()
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._sender_thread = None
+        self._start_lock = threading.Lock()
+        self._socket = None
+        self._next_connect_time = 0
+        self._is_unreachable = False  # the last connection attempt failed
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.failed_count = 0  # messages that couldn't be encoded
+        self._sent_context_ids = set()
+
+    def start(self):
+        with self._start_lock:
+            if self._sender_thread is not None:
+                return
+            self._sender_thread = threading.Thread(target=self._sender_loop, name="ExceptionAggregatorClient")
+            self._sender_thread.daemon = True
+            self._sender_thread.start()
+
+    def send(self, message, exc_record=None):
+        """exc_record: the traceback text and source lines of this record are added to the message by the sender thread"""
+        if self._sender_thread is None:
+            self.start()
+
+        if self.is_unreachable():
+            self._count_dropped()
+            return
+
+        if self.repeats.queue_record(message.get("fingerprint"), lambda: self._enqueue(message, exc_record)):
+            self._wake_event.set()
+
+    def _count_dropped(self, count=1):
+        self.dropped_count += count
+        edm.metrics.increment(edm.MetricNames.aggregator_messages_dropped, count)
+
+    def _enqueue(self, message, exc_record):
+        with self._lock:
+            # contexts are only sent once per session and are never dropped
+            if len(self._messages) >= self.queue_size and message.get("kind") != "context":
+                self._count_dropped()
+                return False
+            self._messages.append((message, exc_record))
+            return True
+
+    def send_context(self, context_snapshot):
+        """The environment context is only sent once per snapshot, records refer to it by context_id"""
+        if context_snapshot.context_id in self._sent_context_ids:
+            return
+        self._sent_context_ids.add(context_snapshot.context_id)
+        message = context_snapshot.to_dict()
+        message["kind"] = "context"
+        self.send(message)
+
+    def send_record(self, exc_record, context_snapshot=None):
+        if context_snapshot is not None:
+            self.send_context(context_snapshot)
+        message = exc_record.to_dict(include_source=False)
+        message["kind"] = "record"
+        self.send(message, exc_record)
+
+    def send_repeat(self, occurrence, count=1):
+        self.send_repeat_count(occurrence.fingerprint, occurrence.last_time, count)
+
+    def send_repeat_count(self, fingerprint, last_time, count=1):
+        if self._sender_thread is None:
+            self.start()
+
+        if self.is_unreachable():
+            self._count_dropped()
+            return
+
+        self.repeats.add(fingerprint, last_time, count)
+        self._wake_event.set()
+
+    def has_pending_messages(self):
+        return bool(self._messages or self.repeats)
+
+    def is_unreachable(self):
+        """The last connection attempt failed, and it's not time for the next one yet"""
+        return self._is_unreachable and time.time() < self._next_connect_time
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until the queued messages have been sent, returns False if the timeout was hit first,
+        or right away if the aggregator isn't running
+        """
+        end_time = time.time() + timeout
+        while self.has_pending_messages() and time.time() < end_time:
+            if self._is_unreachable:
+                break  # nothing is listening, so there's nothing to wait for
+            self._wake_event.set()
+            time.sleep(0.01)
+        return not self._is_unreachable and not self.has_pending_messages()
+
+    def _drop_queued_messages(self):
+        """The aggregator isn't running, the messages aren't kept around for one that might never start"""
+        with self.repeats.lock:
+            with self._lock:
+                dropped_count = len(self._messages) + len(self.repeats.pending_repeats)
+                self._messages.clear()
+            self.repeats.pending_repeats.clear()
+            self.repeats.queued_fingerprints.clear()
+
+        # the dropped contexts are sent again with the next record that refers to them
+        self._sent_context_ids.clear()
+        if dropped_count:
+            self._count_dropped(dropped_count)
+
+    def _connect(self):
+        if time.time() < self._next_connect_time:
+            return None
+
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        client_socket = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            client_socket.connect(self.address)
+            client_socket.sendall(encode_frame({"kind": "hello", "environment": self.environment}))
+        except (IOError, OSError):
+            client_socket.close()
+            self._next_connect_time = time.time() + self.reconnect_interval
+            self._is_unreachable = True
+            return None
+
+        self._socket = client_socket
+        self._is_unreachable = False
+        return client_socket
+
+    def _take_messages(self, limit=1000):
+        """Records and contexts, and the added up repeats of the records that have been sent already"""
+        with self._lock:
+            messages = []
+            while self._messages and len(messages) < limit:
+                messages.append(self._messages.popleft())
+        return messages, self.repeats.take()
+
+    def _put_back_messages(self, messages, repeat_counts):
+        """Messages that couldn't be sent go back to the front of the queue, to be sent after reconnecting"""
+        with self._lock:
+            self._messages.extendleft(reversed(messages))
+        self.repeats.add_counts(repeat_counts)
+
+    def _sender_loop(self):
+        while True:
+            self._wake_event.wait(1.0)
+            self._wake_event.clear()
+
+            try:
+                self.send_pending_messages()
+            except Exception:
+                traceback.print_exc()
+
+    def encode_messages(self, messages):
+        """Frames of the messages that could be encoded, the ones that failed are counted and left out"""
+        frames = []
+        for message, exc_record in messages:
+            try:
+                if exc_record is not None:
+                    message.update(exc_record.get_source_data())
+                frames.append((message, encode_frame(message)))
+            except Exception:
+                traceback.print_exc()
+                self.failed_count += 1
+                edm.metrics.increment(edm.MetricNames.aggregator_messages_failed)
+                self.repeats.mark_written(message.get("fingerprint"))
+        return frames
+
+    def send_pending_messages(self):
+        while self.has_pending_messages():
+            client_socket = self._socket or self._connect()
+            if client_socket is None:
+                if self._is_unreachable:
+                    self._drop_queued_messages()
+                break
+
+            messages, repeat_counts = self._take_messages()
+            frames = self.encode_messages(messages)
+            for fingerprint, (count, last_time) in repeat_counts.items():
+                repeat_message = {"kind": "repeat", "fingerprint": fingerprint, "last_time": last_time, "count": count}
+                frames.append((repeat_message, encode_frame(repeat_message)))
+
+            try:
+                client_socket.sendall(b"".join(frame for message, frame in frames))
+                self.sent_count += len(frames)
+            except (IOError, OSError):
+                client_socket.close()
+                self._socket = None
+                encoded_messages = [(message, None) for message, frame in frames if message.get("kind") != "repeat"]
+                self._put_back_messages(encoded_messages, repeat_counts)
+                break
+
+            # the repeats of these records can be sent from now on
+            for message, frame in frames:
+                if message.get("kind") != "repeat":
+                    self.repeats.mark_written(message.get("fingerprint"))
+
+
+#########################################################
+# server
+
+class Aggregator(object):
+    """Merges the records of every connected process by fingerprint, and writes them to the store in batches"""
+
+    def __init__(self, store, flush_interval=1.0):
+        self.store = store  # type: exception_dialog_store.ExceptionStore
+        self.flush_interval = flush_interval
+        self.received_count = 0
+
+        self._lock = threading.Lock()
+        self._pending_records = {}
+        self._pending_repeats = {}
+        self._pending_contexts = {}
+        self._stop_event = threading.Event()
+        self._flush_thread = None
+
+    def add_message(self, message, environment=None):
+        kind = message.get("kind")
+        fingerprint = message.get("fingerprint")
+
+        with self._lock:
+            self.received_count += 1
+
+            if kind == "record":
+                pending_record = self._pending_records.get(fingerprint)
+                if pending_record is None:
+                    message["environment"] = environment
+                    self._pending_records[fingerprint] = message
+                else:
+                    merged_count = message.get("count", 1) + message.get("skipped_count", 0)
+                    pending_record["count"] = pending_record.get("count", 1) + merged_count
+                    pending_record["last_time"] = max(pending_record.get("last_time", 0), message.get("last_time", 0))
+
+            elif kind == "context":
+                self._pending_contexts[message["context_id"]] = message
+
+            elif kind == "repeat":
+                pending_record = self._pending_records.get(fingerprint)
+                if pending_record is not None:
+                    pending_record["count"] = pending_record.get("count", 1) + message.get("count", 1)
+                    pending_record["last_time"] = max(pending_record.get("last_time", 0), message.get("last_time", 0))
+                else:
+                    count, last_time = self._pending_repeats.get(fingerprint, (0, 0))
+                    self._pending_repeats[fingerprint] = (count + message.get("count", 1), max(last_time, message.get("last_time", 0)))
+
+    def flush(self):
+        with self._lock:
+            pending_records, self._pending_records = self._pending_records, {}
+            pending_repeats, self._pending_repeats = self._pending_repeats, {}
+            pending_contexts, self._pending_contexts = self._pending_contexts, {}
+
+        for context_data in pending_contexts.values():
+            self.store.add_context_data(context_data)
+
+        for record_data in pending_records.values():
+            self.store.add_record_data(record_data, environment=record_data.pop("environment", None))
+
+        for fingerprint, (count, last_time) in pending_repeats.items():
+            self.store.add_repeat_count(fingerprint, last_time, count)
+
+    def start(self):
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="ExceptionAggregatorFlush")
+        self._flush_thread.daemon = True
+        self._flush_thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self.flush()
+        return self.store.flush(timeout)
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+
+
+class AggregatorRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        environment = None
+        try:
+            for message in iter_frames(self.rfile):
+                if message.get("kind") == "hello":
+                    environment = message.get("environment")
+                    continue
+                self.server.aggregator.add_message(message, environment)
+        except (ValueError, IOError, OSError) as e:
+            print("Dropped aggregator client connection: {}".format(e))
+
+
+if hasattr(socket, "AF_UNIX"):
+    class AggregatorServerBase(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        pass
+else:
+    class AggregatorServerBase(socketserver.ThreadingMixIn, socketserver.TCPServer):
+        pass
+
+
+class AggregatorServer(AggregatorServerBase):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, aggregator):
+        self.aggregator = aggregator  # type: Aggregator
+
+        if isinstance(address, str):
+            folder_path = os.path.dirname(address)
+            if folder_path and not os.path.isdir(folder_path):
+                os.makedirs(folder_path)
+            if os.path.exists(address):
+                os.remove(address)  # left behind by an aggregator that didn't shut down cleanly
+
+        AggregatorServerBase.__init__(self, address, AggregatorRequestHandler)
+
+    def server_close(self):
+        AggregatorServerBase.server_close(self)
+        if isinstance(self.server_address, str) and os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def run_aggregator(address=None, store_path=None, flush_interval=1.0):
+    from . import exception_dialog_system as eds
+
+    address = address or get_default_address()
+    aggregator = Aggregator(exception_dialog_store.ExceptionStore(store_path or eds.lk.store_path), flush_interval)
+    aggregator.start()
+
+    server = AggregatorServer(address, aggregator)
+    print("Exception aggregator listening on: {}".format(address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        aggregator.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect the exceptions of every process on this machine")
+    parser.add_argument("--address", help="unix socket path to listen on")
+    parser.add_argument("--store", help="path of the exception database")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="seconds between writes to the database")
+    args = parser.parse_args()
+    run_aggregator(args.address, args.store, args.flush_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,13 @@
+import getpass
+import hashlib
+import json
+import os
+import platform
+import socket
+import sys
+import time
+
+
 class ExceptionDialogCoreInterface(object):
     def ui_available(self):
         return False
@@ -10,3 +20,198 @@ class ExceptionDialogCoreInterface(object):
         print("method 'unregister_exception_hook' is undefined for {}".format(self.__class__.__name__))
         return None
 
+    def execute_deferred(self, func):
+        """Run func when the DCC is idle, returns False if the DCC has no way of doing that"""
+        return False
+
+    def get_context_providers(self):
+        """ContextProviders for the environment context of the exceptions, DCCs add their own to these"""
+        return [
+            PythonContextProvider(),
+            ModulesContextProvider(),
+            SysPathContextProvider(),
+            EnvironmentVariablesContextProvider(),
+        ]
+
+
+#########################################################
+# environment context
+
+class SnapshotUnavailable(Exception):
+    """Raised by get_snapshot when it can't be taken right now (e.g. outside of the main thread), it's retaken later"""
+
+
+class ContextProvider(object):
+    """
+    One part of the environment context of the exceptions.
+
+    get_snapshot is called once per session and can be slow,
+    get_delta is called for every exception and should only do cheap checks.
+    """
+    name = ""
+
+    def get_snapshot(self):
+        return {}
+
+    def get_delta(self, snapshot):
+        """What changed since the snapshot was taken, or None when nothing did"""
+        return None
+
+
+class PythonContextProvider(ContextProvider):
+    name = "python"
+
+    def get_snapshot(self):
+        try:
+            user_name = getpass.getuser()
+        except Exception:
+            user_name = ""
+
+        return {
+            "host": socket.gethostname(),
+            "user": user_name,
+            "executable": sys.executable,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+        }
+
+
+class ModulesContextProvider(ContextProvider):
+    """Imported modules and the versions of the top level packages, the delta is the newly imported modules"""
+    name = "modules"
+    max_delta_modules = 200
+
+    def __init__(self):
+        self._snapshot_name_set = None
+        self._last_module_count = None
+        self._last_delta = None
+
+    def get_snapshot(self):
+        versions = {}
+        for module_name, module in list(sys.modules.items()):
+            if "." in module_name or module is None:
+                continue
+            try:
+                version = getattr(module, "__version__", None)
+            except Exception:
+                version = None
+            versions[module_name] = version if isinstance(version, str) else None
+
+        return {"names": sorted(sys.modules.keys()), "versions": versions}
+
+    def get_delta(self, snapshot):
+        snapshot_names = snapshot.get("names", [])
+        if len(sys.modules) == len(snapshot_names):
+            return None
+
+        # modules are rarely removed, so the same count almost always means the same modules
+        if len(sys.modules) == self._last_module_count:
+            return self._last_delta
+
+        if self._snapshot_name_set is None:
+            self._snapshot_name_set = set(snapshot_names)
+        self._last_module_count = len(sys.modules)
+        new_module_names = sorted(name for name in list(sys.modules.keys()) if name not in self._snapshot_name_set)
+        self._last_delta = new_module_names[:self.max_delta_modules] or None
+        return self._last_delta
+
+
+class SysPathContextProvider(ContextProvider):
+    name = "sys_path"
+
+    def get_snapshot(self):
+        return list(sys.path)
+
+    def get_delta(self, snapshot):
+        if sys.path == snapshot:
+            return None
+        return {
+            "added": [path for path in sys.path if path not in snapshot],
+            "removed": [path for path in snapshot if path not in sys.path],
+        }
+
+
+class EnvironmentVariablesContextProvider(ContextProvider):
+    """Environment variables, with the values of the ones that look like credentials hidden"""
+    name = "environment_variables"
+    hidden_name_parts = ("TOKEN", "SECRET", "PASSWORD", "PASSWD", "KEY", "AUTH", "CREDENTIAL", "COOKIE")
+
+    def __init__(self):
+        self._last_environ = None
+        self._last_delta = None
+
+    def get_value(self, name, value):
+        upper_name = name.upper()
+        if any(name_part in upper_name for name_part in self.hidden_name_parts):
+            return "<hidden>"
+        return value
+
+    def get_snapshot(self):
+        return dict((name, self.get_value(name, value)) for name, value in os.environ.items())
+
+    def get_delta(self, snapshot):
+        environ = dict(os.environ)
+        if environ == self._last_environ:
+            return self._last_delta
+
+        changed_variables = {}
+        for name, value in environ.items():
+            value = self.get_value(name, value)
+            if snapshot.get(name) != value:
+                changed_variables[name] = value
+        for name in snapshot:
+            if name not in environ:
+                changed_variables[name] = None
+
+        self._last_environ = environ
+        self._last_delta = changed_variables or None
+        return self._last_delta
+
+
+class ContextSnapshot(object):
+    """
+    Environment context, taken once per session. Exceptions only record what changed since.
+
+    The id is a hash of the content, so sessions with the same environment share a snapshot.
+    Parts that were unavailable when it was taken are filled in by retake(), which makes a new snapshot.
+    """
+
+    def __init__(self, providers, previous_snapshot=None):
+        self.providers = providers
+        self.timestamp = time.time()
+        self.unavailable_names = set()  # providers that raised SnapshotUnavailable
+
+        self.data = {}
+        for provider in providers:
+            if previous_snapshot is not None and provider.name not in previous_snapshot.unavailable_names:
+                self.data[provider.name] = previous_snapshot.data.get(provider.name)
+                continue
+
+            try:
+                self.data[provider.name] = provider.get_snapshot()
+            except SnapshotUnavailable as e:
+                self.data[provider.name] = {"error": str(e)}
+                self.unavailable_names.add(provider.name)
+            except Exception as e:
+                self.data[provider.name] = {"error": "{}: {}".format(e.__class__.__name__, e)}
+
+        snapshot_json = json.dumps(self.data, sort_keys=True, default=str)
+        self.context_id = hashlib.sha1(snapshot_json.encode("utf-8")).hexdigest()[:16]
+
+    def get_delta(self):
+        delta = {}
+        for provider in self.providers:
+            try:
+                provider_delta = provider.get_delta(self.data.get(provider.name))
+            except Exception:
+                continue
+            if provider_delta:
+                delta[provider.name] = provider_delta
+        return delta or None
+
+    def retake(self):
+        """New snapshot with the unavailable parts taken again, and the others kept as they are"""
+        return ContextSnapshot(self.providers, previous_snapshot=self)
+
+    def to_dict(self):
+        return {"context_id": self.context_id, "timestamp": self.timestamp, "data": self.data}
@@ -1,3 +1,5 @@
+import threading
+
 import maya.utils
 import maya.cmds as cmds
 from . import exception_dialog_dcc_core
@@ -17,3 +19,51 @@ class ExceptionDialogMaya(exception_dialog_dcc_core.ExceptionDialogCoreInterface
     def unregister_exception_hook(self, previous_hook):
         maya.utils.formatGuiException = previous_hook
 
+    def execute_deferred(self, func):
+        maya.utils.executeDeferred(func)
+        return True
+
+    def get_context_providers(self):
+        providers = super(ExceptionDialogMaya, self).get_context_providers()
+        providers.append(MayaContextProvider())
+        return providers
+
+
+def is_main_thread():
+    if hasattr(threading, "main_thread"):
+        return threading.current_thread() is threading.main_thread()
+    return isinstance(threading.current_thread(), threading._MainThread)
+
+
+class MayaContextProvider(exception_dialog_dcc_core.ContextProvider):
+    """Maya version, scene and loaded plugins. maya.cmds can only be used from the main thread"""
+    name = "maya"
+
+    def get_snapshot(self):
+        if not is_main_thread():
+            raise exception_dialog_dcc_core.SnapshotUnavailable("snapshot was taken outside of the main thread")
+
+        return {
+            "version": cmds.about(version=True),
+            "api_version": cmds.about(apiVersion=True),
+            "cut": cmds.about(cutIdentifier=True),
+            "batch": cmds.about(batch=True),
+            "scene": cmds.file(query=True, sceneName=True),
+            "plugins": sorted(cmds.pluginInfo(query=True, listPlugins=True) or []),
+        }
+
+    def get_delta(self, snapshot):
+        if not is_main_thread() or "error" in snapshot:
+            return None
+
+        delta = {}
+        scene_name = cmds.file(query=True, sceneName=True)
+        if scene_name != snapshot.get("scene"):
+            delta["scene"] = scene_name
+
+        snapshot_plugins = snapshot.get("plugins", [])
+        loaded_plugins = cmds.pluginInfo(query=True, listPlugins=True) or []
+        if len(loaded_plugins) != len(snapshot_plugins):
+            delta["new_plugins"] = sorted(set(loaded_plugins) - set(snapshot_plugins))
+        return delta or None
+
@@ -0,0 +1,400 @@
+"""
+Spooled, batched delivery of exception reports to HTTP endpoints (issue trackers, chat webhooks, ...).
+
+Actions hand reports to a delivery, which writes them to an on-disk spool and returns right away.
+A background thread per endpoint sends the spooled reports in gzipped batches over pooled keep-alive connections,
+and retries with exponential backoff while the endpoint is down. Reports stay on disk until the endpoint accepted them,
+so they survive a crash or restart, and are sent by the next session that registers the endpoint.
+
+from exception_dialog import exception_dialog_delivery
+exception_dialog_delivery.register_endpoint("jira", "https://tracker.example.com/api/exceptions", headers={"Authorization": "..."})
+"""
+import gzip
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+
+if sys.version_info.major >= 3:
+    import http.client as http_client
+    from urllib.parse import urlsplit
+else:
+    import httplib as http_client
+    from urlparse import urlsplit
+
+from . import exception_dialog_system as eds
+
+SPOOL_EXTENSION = ".json"
+CLAIMED_EXTENSION = ".claimed"
+FAILED_FOLDER_NAME = "failed"
+
+
+class DeliveryError(Exception):
+    def __init__(self, message, is_permanent=False):
+        super(DeliveryError, self).__init__(message)
+        self.is_permanent = is_permanent  # the endpoint rejected the reports, sending them again won't help
+
+
+def format_json_batch(reports):
+    return {"reports": reports}
+
+
+def compress_data(data):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb") as fp:
+        fp.write(data)
+    return buffer.getvalue()
+
+
+class Endpoint(object):
+    def __init__(self, name, url, headers=None, batch_size=20, compress=True, format_batch=None, timeout=10.0):
+        """
+        batch_size: most reports sent in one request
+        compress: gzip the request body (sent with Content-Encoding: gzip)
+        format_batch: function(list of reports) -> json compatible request body, defaults to {"reports": [...]}
+        """
+        self.name = name
+        self.url = url
+        self.headers = headers or {}
+        self.batch_size = batch_size
+        self.compress = compress
+        self.format_batch = format_batch or format_json_batch
+        self.timeout = timeout
+
+        url_parts = urlsplit(url)
+        self.scheme = url_parts.scheme
+        self.host = url_parts.hostname
+        self.port = url_parts.port or (443 if self.scheme == "https" else 80)
+        self.path = url_parts.path or "/"
+        if url_parts.query:
+            self.path += "?" + url_parts.query
+
+
+class ConnectionPool(object):
+    """Idle keep-alive connections per (scheme, host, port), shared by every endpoint"""
+
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self.idle_connections = {}
+        self._lock = threading.Lock()
+
+    def get(self, endpoint):
+        """Returns (connection, is_reused)"""
+        connection_key = (endpoint.scheme, endpoint.host, endpoint.port)
+        with self._lock:
+            idle_connections = self.idle_connections.get(connection_key)
+            if idle_connections:
+                return idle_connections.pop(), True
+
+        connection_cls = http_client.HTTPSConnection if endpoint.scheme == "https" else http_client.HTTPConnection
+        return connection_cls(endpoint.host, endpoint.port, timeout=endpoint.timeout), False
+
+    def put(self, endpoint, connection):
+        connection_key = (endpoint.scheme, endpoint.host, endpoint.port)
+        with self._lock:
+            idle_connections = self.idle_connections.setdefault(connection_key, [])
+            if len(idle_connections) < self.max_idle:
+                idle_connections.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        with self._lock:
+            all_idle_connections, self.idle_connections = self.idle_connections, {}
+        for idle_connections in all_idle_connections.values():
+            for connection in idle_connections:
+                connection.close()
+
+
+connection_pool = ConnectionPool()
+
+
+class ReportSpool(object):
+    """
+    Folder of report files, oldest first.
+
+    Files are claimed (renamed) before they're sent, so several processes can share a spool without sending a report twice.
+    Claims of processes that died while sending are given up after claim_timeout seconds.
+    """
+
+    def __init__(self, folder_path, claim_timeout=300.0):
+        self.folder_path = folder_path
+        self.claim_timeout = claim_timeout
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def ensure_folder(self):
+        if not os.path.isdir(self.folder_path):
+            try:
+                os.makedirs(self.folder_path)
+            except OSError:
+                if not os.path.isdir(self.folder_path):  # made by another process in the meantime
+                    raise
+
+    def add(self, report):
+        self.ensure_folder()
+        with self._lock:
+            self._counter += 1
+            file_name = "{:.6f}_{}_{}".format(time.time(), os.getpid(), self._counter)
+
+        # write to a temp file first, so the sender never reads a half written report
+        temp_path = os.path.join(self.folder_path, file_name + ".tmp")
+        with open(temp_path, "w") as fp:
+            json.dump(report, fp)
+        file_path = os.path.join(self.folder_path, file_name + SPOOL_EXTENSION)
+        os.rename(temp_path, file_path)
+        return file_path
+
+    def get_file_names(self, extension=SPOOL_EXTENSION):
+        try:
+            file_names = os.listdir(self.folder_path)
+        except OSError:
+            return []
+        return sorted(file_name for file_name in file_names if file_name.endswith(extension))
+
+    def count(self):
+        return len(self.get_file_names())
+
+    def claim(self, limit):
+        """Returns [(claimed file path, report)] of up to limit of the oldest reports"""
+        claimed_reports = []
+        for file_name in self.get_file_names():
+            file_path = os.path.join(self.folder_path, file_name)
+            claimed_path = file_path[:-len(SPOOL_EXTENSION)] + CLAIMED_EXTENSION
+            try:
+                os.rename(file_path, claimed_path)
+                os.utime(claimed_path, None)
+            except OSError:
+                continue  # claimed by another process
+
+            try:
+                with open(claimed_path, "r") as fp:
+                    claimed_reports.append((claimed_path, json.load(fp)))
+            except (IOError, OSError, ValueError) as e:
+                print("Unreadable exception report {}: {}".format(claimed_path, e))
+                self.reject([claimed_path])
+                continue
+
+            if len(claimed_reports) >= limit:
+                break
+        return claimed_reports
+
+    def remove(self, claimed_paths):
+        for claimed_path in claimed_paths:
+            try:
+                os.remove(claimed_path)
+            except OSError:
+                pass
+
+    def release(self, claimed_paths):
+        """Put claimed reports back, to be sent again later"""
+        for claimed_path in claimed_paths:
+            try:
+                os.rename(claimed_path, claimed_path[:-len(CLAIMED_EXTENSION)] + SPOOL_EXTENSION)
+            except OSError:
+                pass
+
+    def reject(self, claimed_paths):
+        """Move reports the endpoint won't accept out of the spool, they're kept for inspection"""
+        failed_folder_path = os.path.join(self.folder_path, FAILED_FOLDER_NAME)
+        if not os.path.isdir(failed_folder_path):
+            os.makedirs(failed_folder_path)
+        for claimed_path in claimed_paths:
+            try:
+                os.rename(claimed_path, os.path.join(failed_folder_path, os.path.basename(claimed_path)))
+            except OSError:
+                pass
+
+    def release_stale_claims(self):
+        current_time = time.time()
+        stale_paths = []
+        for file_name in self.get_file_names(CLAIMED_EXTENSION):
+            claimed_path = os.path.join(self.folder_path, file_name)
+            try:
+                if current_time - os.path.getmtime(claimed_path) > self.claim_timeout:
+                    stale_paths.append(claimed_path)
+            except OSError:
+                pass
+        self.release(stale_paths)
+
+
+class ReportDelivery(object):
+    def __init__(self, endpoint, spool_path, retry_base_delay=1.0, retry_max_delay=300.0, poll_interval=5.0):
+        self.endpoint = endpoint  # type: Endpoint
+        self.spool = ReportSpool(spool_path)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.poll_interval = poll_interval  # to pick up reports spooled by other processes
+
+        self.sent_count = 0
+        self.retry_count = 0  # failed attempts in a row
+        self.last_error = None
+        self.sent_context_ids = set()
+
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._idle_event = threading.Event()
+        self._worker_thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._worker_thread is not None:
+                return
+            self._worker_thread = threading.Thread(
+                target=self._worker_loop, name="ExceptionReportDelivery-{}".format(self.endpoint.name))
+            self._worker_thread.daemon = True
+            self._worker_thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._worker_thread is not None:
+            self._worker_thread.join(timeout)
+
+    def deliver(self, report):
+        """Spool a json compatible report for sending, returns right away"""
+        self.spool.add(report)
+        self._idle_event.clear()
+        if self._worker_thread is None:
+            self.start()
+        self._wake_event.set()
+
+    def add_context_id(self, context_id):
+        """Returns True the first time a context id is added, its context only has to be sent with one report"""
+        with self._start_lock:
+            if context_id in self.sent_context_ids:
+                return False
+            self.sent_context_ids.add(context_id)
+            return True
+
+    def flush(self, timeout=10.0):
+        """Wait until every spooled report has been sent, returns False if the timeout was hit first"""
+        self._wake_event.set()
+        end_time = time.time() + timeout
+        while time.time() < end_time:
+            if self._idle_event.wait(0.05) and not self.spool.count():
+                return True
+            self._wake_event.set()
+        return False
+
+    def send_batch(self, reports):
+        body = json.dumps(self.endpoint.format_batch(reports)).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.endpoint.compress:
+            body = compress_data(body)
+            headers["Content-Encoding"] = "gzip"
+        headers.update(self.endpoint.headers)
+
+        while True:
+            connection, is_reused = connection_pool.get(self.endpoint)
+            try:
+                connection.request("POST", self.endpoint.path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                break
+            except (IOError, OSError, http_client.HTTPException) as e:
+                connection.close()
+                if not is_reused:
+                    raise DeliveryError("{}: {}".format(e.__class__.__name__, e))
+                # the server closed the idle connection, try again with a new one
+
+        if response.will_close:
+            connection.close()
+        else:
+            connection_pool.put(self.endpoint, connection)
+
+        if 200 <= response.status < 300:
+            return
+
+        is_permanent = 400 <= response.status < 500 and response.status not in (408, 429)
+        raise DeliveryError("{} {}".format(response.status, response.reason), is_permanent)
+
+    def get_retry_delay(self):
+        delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** (self.retry_count - 1)))
+        return delay * random.uniform(0.5, 1.0)  # jitter, so processes don't all retry at the same moment
+
+    def send_next_batch(self):
+        """Send a batch of the oldest spooled reports, returns False if there were none"""
+        claimed_reports = self.spool.claim(self.endpoint.batch_size)
+        if not claimed_reports:
+            return False
+
+        claimed_paths = [claimed_path for claimed_path, _ in claimed_reports]
+        try:
+            self.send_batch([report for _, report in claimed_reports])
+        except Exception as e:
+            if isinstance(e, DeliveryError) and e.is_permanent:
+                self.last_error = e
+                print("Exception report endpoint '{}' rejected {} report(s): {}".format(
+                    self.endpoint.name, len(claimed_paths), e))
+                self.spool.reject(claimed_paths)
+                return True
+
+            # sent again after the backoff
+            self.spool.release(claimed_paths)
+            raise
+
+        self.spool.remove(claimed_paths)
+        self.sent_count += len(claimed_paths)
+        self.retry_count = 0
+        return True
+
+    def _worker_loop(self):
+        self.spool.release_stale_claims()
+
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            try:
+                has_sent = self.send_next_batch()
+            except Exception as e:
+                # anything else (like a format_batch that fails) backs off too, instead of ending the thread
+                if not isinstance(e, DeliveryError):
+                    traceback.print_exc()
+                self.last_error = e
+                self.retry_count += 1
+                self._stop_event.wait(self.get_retry_delay())
+                continue
+
+            if not has_sent:
+                self._idle_event.set()
+                self._wake_event.wait(self.poll_interval)
+
+
+deliveries = {}  # {endpoint name: ReportDelivery}
+
+
+def get_action_endpoint_options(name):
+    """Endpoint arguments that the delivery actions of this endpoint need for their reports"""
+    endpoint_options = {}
+    for action_cls in eds.action_registry.action_classes:
+        if issubclass(action_cls, eds.DeliveryExceptionAction) and action_cls.endpoint_name == name:
+            endpoint_options.update(action_cls.get_endpoint_options())
+    return endpoint_options
+
+
+def register_endpoint(name, url, spool_path=None, **endpoint_kwargs):
+    """
+    Reports that earlier sessions spooled for this endpoint are sent as well.
+    endpoint_kwargs: see Endpoint, by default the ones the delivery actions of this endpoint need (like the slack format)
+    """
+    previous_delivery = deliveries.pop(name, None)
+    if previous_delivery is not None:
+        previous_delivery.stop()
+
+    endpoint_kwargs = dict(get_action_endpoint_options(name), **endpoint_kwargs)
+    delivery = ReportDelivery(
+        Endpoint(name, url, **endpoint_kwargs),
+        spool_path or os.path.join(eds.lk.delivery_spool_path, name),
+    )
+    deliveries[name] = delivery
+    delivery.start()
+    return delivery
+
+
+def get_delivery(name):
+    return deliveries.get(name)
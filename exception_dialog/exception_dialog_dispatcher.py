@@ -0,0 +1,218 @@
+import atexit
+import sys
+import threading
+import time
+import traceback
+
+from . import exception_dialog_metrics as edm
+
+if sys.version_info.major >= 3:
+    import queue
+else:
+    import Queue as queue
+
+
+class QueuePolicy:
+    drop_newest = "drop_newest"  # new jobs are dropped while the queue is full
+    drop_oldest = "drop_oldest"  # the oldest queued job is dropped to make room
+    block = "block"  # wait up to block_timeout for room, then drop the new job
+
+
+class ActionWorker(object):
+    def __init__(self, thread):
+        self.thread = thread
+        self.deadline = None  # (time, action class) while an action with a timeout runs
+        self.is_abandoned = False  # its action timed out, a new worker took its place
+
+
+class ActionDispatcher(object):
+    """
+    Runs exception actions on a pool of background threads, so the thread
+    that raised the exception only has to put a job on the queue.
+
+    Actions with a timeout run on the pool as well. Threads can't be killed, so when one hangs past its timeout
+    its worker is given up on and replaced, the pool only grows while actions are actually stuck.
+    """
+
+    def __init__(self, worker_count=2, queue_size=256, policy=QueuePolicy.drop_oldest, block_timeout=0.1):
+        self.worker_count = max(1, worker_count)
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.workers = []
+        self.dropped_count = 0
+        self.timed_out_count = 0
+
+        self._start_lock = threading.Lock()
+        self._is_shut_down = False
+        self._deadline_condition = threading.Condition()
+        self._watchdog_thread = None
+
+    def start(self):
+        with self._start_lock:
+            if self.workers or self._is_shut_down:
+                return
+
+            for _ in range(self.worker_count):
+                self._start_worker()
+
+            self._watchdog_thread = threading.Thread(target=self._watchdog_loop, name="ExceptionActionWatchdog")
+            self._watchdog_thread.daemon = True
+            self._watchdog_thread.start()
+
+    def _start_worker(self):
+        worker = ActionWorker(None)
+        worker.thread = threading.Thread(
+            target=self._worker_loop,
+            args=(worker,),
+            name="ExceptionActionWorker-{}".format(len(self.workers)),
+        )
+        worker.thread.daemon = True
+        self.workers.append(worker)
+        worker.thread.start()
+
+    def get_active_workers(self):
+        return [worker for worker in self.workers if not worker.is_abandoned]
+
+    def _count_dropped(self):
+        self.dropped_count += 1
+        edm.metrics.increment(edm.MetricNames.actions_dropped)
+
+    def submit(self, action_cls, exc_record):
+        """Returns False if the job was dropped"""
+        if self._is_shut_down:
+            return False
+
+        if not self.workers:
+            self.start()
+
+        job = (action_cls, exc_record)
+
+        if self.policy == QueuePolicy.block:
+            try:
+                self.jobs.put(job, timeout=self.block_timeout)
+                return True
+            except queue.Full:
+                self._count_dropped()
+                return False
+
+        try:
+            self.jobs.put_nowait(job)
+            return True
+        except queue.Full:
+            pass
+
+        if self.policy == QueuePolicy.drop_oldest:
+            try:
+                self.jobs.get_nowait()
+                self.jobs.task_done()
+            except queue.Empty:
+                pass
+
+            # the oldest job was dropped instead of this one
+            self._count_dropped()
+            try:
+                self.jobs.put_nowait(job)
+                return True
+            except queue.Full:
+                pass
+
+        self._count_dropped()
+        return False
+
+    def flush(self, timeout=None):
+        """Wait for the queued jobs to finish, returns False if the timeout was hit first"""
+        end_time = None if timeout is None else time.time() + timeout
+
+        with self.jobs.all_tasks_done:
+            while self.jobs.unfinished_tasks:
+                if end_time is None:
+                    self.jobs.all_tasks_done.wait()
+                    continue
+
+                remaining_time = end_time - time.time()
+                if remaining_time <= 0:
+                    return False
+                self.jobs.all_tasks_done.wait(remaining_time)
+        return True
+
+    def shutdown(self, timeout=None):
+        is_flushed = self.flush(timeout)
+        self._is_shut_down = True
+
+        with self._deadline_condition:
+            self._deadline_condition.notify()
+
+        for _ in self.get_active_workers():
+            try:
+                self.jobs.put_nowait(None)
+            except queue.Full:
+                break
+        return is_flushed
+
+    def _worker_loop(self, worker):
+        while not worker.is_abandoned:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+
+            action_cls, exc_record = job
+            timeout = getattr(action_cls, "timeout", None)
+            if timeout:
+                with self._deadline_condition:
+                    worker.deadline = (time.time() + timeout, action_cls)
+                    self._deadline_condition.notify()
+
+            try:
+                run_action(action_cls, exc_record)
+            finally:
+                with self._deadline_condition:
+                    worker.deadline = None
+                    # the watchdog already marked the job of an abandoned worker as done
+                    if not worker.is_abandoned:
+                        self.jobs.task_done()
+
+    def _watchdog_loop(self):
+        with self._deadline_condition:
+            while not self._is_shut_down:
+                current_time = time.time()
+                next_deadline = None
+
+                for worker in self.get_active_workers():
+                    if worker.deadline is None:
+                        continue
+
+                    deadline_time, action_cls = worker.deadline
+                    if deadline_time > current_time:
+                        next_deadline = deadline_time if next_deadline is None else min(next_deadline, deadline_time)
+                        continue
+
+                    # leave the stuck action behind, and give its place in the pool to a new worker
+                    worker.is_abandoned = True
+                    worker.deadline = None
+                    self.timed_out_count += 1
+                    edm.metrics.increment(edm.MetricNames.actions_timed_out)
+                    print("Exception action {} did not finish within {} seconds".format(
+                        action_cls.__name__, action_cls.timeout))
+                    self._start_worker()
+                    self.jobs.task_done()
+
+                self._deadline_condition.wait(None if next_deadline is None else next_deadline - current_time)
+
+
+def run_action(action_cls, exc_record):
+    start_time = edm.timer()
+    try:
+        action_cls.trigger_action(exc_record)
+    except Exception:
+        # printed instead of logged, so a broken action can't feed back into a logging based exception hook
+        traceback.print_exc()
+    edm.metrics.observe_action(action_cls, edm.timer() - start_time)
+
+
+def create_dispatcher(worker_count, queue_size, policy, flush_timeout):
+    dispatcher = ActionDispatcher(worker_count=worker_count, queue_size=queue_size, policy=policy)
+    atexit.register(dispatcher.shutdown, flush_timeout)
+    return dispatcher
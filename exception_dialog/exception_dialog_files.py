@@ -0,0 +1,58 @@
+"""
+File helpers shared by the modules that write files other processes read (metrics exports, the discovery index,
+the headless logs).
+
+Kept free of imports from the rest of the package, so any module can use it.
+"""
+import glob
+import os
+import time
+
+
+def write_file_atomic(file_path, file_content):
+    """Write to a temp file first and move it in place, so other processes never read a half written file"""
+    folder_path = os.path.dirname(file_path)
+    if folder_path and not os.path.isdir(folder_path):
+        os.makedirs(folder_path)
+
+    temp_path = "{}.{}.tmp".format(file_path, os.getpid())
+    with open(temp_path, "w") as fp:
+        fp.write(file_content)
+
+    if hasattr(os, "replace"):
+        os.replace(temp_path, file_path)
+    else:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        os.rename(temp_path, file_path)
+
+
+def remove_old_files(file_pattern, keep_paths=(), max_count=None, max_age=None):
+    """
+    Remove the files matching the glob file_pattern that are older than max_age seconds,
+    and the oldest ones past max_count. Files in keep_paths are left alone and not counted.
+    returns the removed paths
+    """
+    file_times = []
+    for file_path in glob.glob(file_pattern):
+        if file_path in keep_paths:
+            continue
+        try:
+            file_times.append((os.path.getmtime(file_path), file_path))
+        except OSError:
+            continue  # removed by another process in the meantime
+    file_times.sort(reverse=True)
+
+    now = time.time()
+    removed_paths = []
+    for file_index, (file_time, file_path) in enumerate(file_times):
+        is_past_count = max_count is not None and file_index >= max_count
+        is_past_age = max_age is not None and now - file_time > max_age
+        if not is_past_count and not is_past_age:
+            continue
+        try:
+            os.remove(file_path)
+            removed_paths.append(file_path)
+        except OSError:
+            pass
+    return removed_paths
@@ -0,0 +1,209 @@
+import atexit
+import json
+import os
+import socket
+import sys
+import threading
+import traceback
+
+if sys.version_info.major >= 3:
+    import queue
+else:
+    import Queue as queue
+
+from . import exception_dialog_files
+from . import exception_dialog_metrics as edm
+from . import exception_dialog_writer
+
+
+class JsonLinesSink(exception_dialog_writer.BackgroundWriter):
+    """
+    Appends exception records as one json object per line, for sessions without a UI (batch mode, farm jobs).
+
+    Lines are formatted and written by a background thread, the repeats of a record are added up
+    and written as {"kind": "repeat", "fingerprint", "last_time", "count"} lines once per flush interval.
+
+    The file is rotated once it's over max_bytes, keeping backup_count older files (file.1, file.2, ...).
+    Before the file is first opened, the files matching the glob old_files_pattern (logs of earlier processes)
+    are removed past max_old_files or max_old_file_age seconds.
+    """
+    thread_name = "ExceptionLogWriter"
+    dropped_metric_name = edm.MetricNames.headless_lines_dropped
+
+    def __init__(self, file_path, max_bytes=10 * 1024 * 1024, backup_count=3, flush_interval=1.0, queue_size=10000,
+                 old_files_pattern=None, max_old_files=None, max_old_file_age=None):
+        super(JsonLinesSink, self).__init__(queue_size)
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.old_files_pattern = old_files_pattern
+        self.max_old_files = max_old_files
+        self.max_old_file_age = max_old_file_age
+        self.pid = os.getpid()  # process the sink was made in, a forked child needs a sink of its own
+
+        self._file = None
+        self._lock = threading.Lock()
+        self._written_context_ids = set()  # environment contexts in the current file
+
+    def _open(self):
+        folder_path = os.path.dirname(self.file_path)
+        if folder_path and not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+        if self.old_files_pattern:
+            self.remove_old_files()
+        self._file = open(self.file_path, "a")
+
+    def remove_old_files(self):
+        own_paths = [self.file_path] + ["{}.{}".format(self.file_path, i + 1) for i in range(self.backup_count)]
+        exception_dialog_files.remove_old_files(
+            self.old_files_pattern, own_paths, max_count=self.max_old_files, max_age=self.max_old_file_age)
+        self.old_files_pattern = None  # once per process is enough
+
+    def rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._written_context_ids.clear()
+
+        for backup_index in range(self.backup_count - 1, 0, -1):
+            source_path = "{}.{}".format(self.file_path, backup_index)
+            if os.path.exists(source_path):
+                target_path = "{}.{}".format(self.file_path, backup_index + 1)
+                if os.path.exists(target_path):
+                    os.remove(target_path)
+                os.rename(source_path, target_path)
+
+        if self.backup_count > 0 and os.path.exists(self.file_path):
+            first_backup_path = self.file_path + ".1"
+            if os.path.exists(first_backup_path):
+                os.remove(first_backup_path)
+            os.rename(self.file_path, first_backup_path)
+        elif os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def write(self, data, context_data=None, exc_record=None):
+        """
+        context_data: environment context the data refers to, written before it once per file
+        exc_record: the traceback text and source lines of this record are added to data by the writer thread
+        """
+        self._enqueue_record(("line", data, context_data, exc_record), data.get("fingerprint"))
+
+    def write_record(self, exc_record, context_snapshot=None):
+        self.write(
+            exc_record.to_dict(include_source=False),
+            context_snapshot.to_dict() if context_snapshot is not None else None,
+            exc_record,
+        )
+
+    def _writer_loop(self):
+        while True:
+            try:
+                batch = [self._write_queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []  # only repeats came in
+
+            while batch and batch[-1][0] != "flush":
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if batch or self.repeats:
+                try:
+                    self.write_batch(batch)
+                except Exception:
+                    traceback.print_exc()
+
+            for item in batch:
+                if item[0] == "flush":
+                    item[1].set()
+
+    def write_batch(self, batch):
+        lines = []
+        try:
+            for item in batch:
+                if item[0] != "line":
+                    continue
+                data, context_data, exc_record = item[1:]
+                if exc_record is not None:
+                    data.update(exc_record.get_source_data())
+                lines.append((json.dumps(data) + "\n", context_data))
+        finally:
+            # the repeats of these records can be written from now on, even if writing them failed
+            for item in batch:
+                if item[0] == "line":
+                    self.repeats.mark_written(item[1].get("fingerprint"))
+
+        for fingerprint, (count, last_time) in self.take_pending_repeats().items():
+            repeat_data = {"kind": "repeat", "fingerprint": fingerprint, "last_time": last_time, "count": count}
+            lines.append((json.dumps(repeat_data) + "\n", None))
+
+        if not lines:
+            return
+
+        with self._lock:
+            for line, context_data in lines:
+                self._write_line(line, context_data)
+            self._file.flush()
+
+    def _write_line(self, line, context_data=None):
+        if self._file is None:
+            self._open()
+
+        if self.max_bytes and self._file.tell() + len(line) > self.max_bytes:
+            self.rotate()
+            self._open()
+
+        if context_data is not None and context_data["context_id"] not in self._written_context_ids:
+            context_data = dict(context_data, kind="context")
+            self._file.write(json.dumps(context_data) + "\n")
+            self._written_context_ids.add(context_data["context_id"])
+
+        self._file.write(line)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def glob_escape(path):
+    # glob.escape is python 3 only
+    return "".join("[{}]".format(char) if char in "*?[" else char for char in path)
+
+
+def get_log_file_path(path_template, pid=None):
+    """The log file of this process, fills in the {host} and {pid} of path_template"""
+    host_name = socket.gethostname().split(".")[0] or "localhost"
+    pid = os.getpid() if pid is None else pid
+    return path_template.replace("{host}", host_name).replace("{pid}", str(pid))
+
+
+def flush_sink(sink, timeout):
+    # the sinks of a parent process are flushed by the parent, a forked child doesn't have their writer thread
+    if sink.pid == os.getpid():
+        sink.flush(timeout)
+
+
+def create_sink(path_template, max_bytes, backup_count, max_old_files=None, max_old_file_age=None, flush_timeout=5.0):
+    """
+    path_template: {host} and {pid} are filled in, with a {pid} the older log files of this host
+    are cleaned up by max_old_files and max_old_file_age
+    """
+    old_files_pattern = None
+    if "{pid}" in path_template:
+        old_files_pattern = glob_escape(get_log_file_path(path_template, pid="{pid}")).replace("{pid}", "*") + "*"
+
+    sink = JsonLinesSink(
+        get_log_file_path(path_template),
+        max_bytes=max_bytes,
+        backup_count=backup_count,
+        old_files_pattern=old_files_pattern,
+        max_old_files=max_old_files,
+        max_old_file_age=max_old_file_age,
+    )
+    atexit.register(flush_sink, sink, flush_timeout)
+    return sink
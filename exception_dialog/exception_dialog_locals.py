@@ -0,0 +1,245 @@
+"""
+Budgeted capture of the local variables of traceback frames.
+
+Running repr() on every local of a scene frame can take seconds and gigabytes, so at exception time only
+a cheap summary is taken (type, length, shape and dtype of arrays, ...), within per-frame and per-exception time budgets.
+
+Only cheap builtins (numbers, None, short strings and small containers of those) are repr'd right away,
+any __repr__ of another type can take longer than the whole time budget.
+Everything else is held through a weak reference, and its repr is made when someone looks at the value,
+as long as something else still keeps it alive. The frames are released right after the exception hook,
+so short lived values only keep their type and summary.
+"""
+import itertools
+import sys
+import time
+import weakref
+
+if sys.version_info.major >= 3:
+    import reprlib
+    string_types = (str, bytes)
+    scalar_types = (type(None), bool, int, float, complex)
+else:
+    import repr as reprlib
+    string_types = (str, unicode)  # noqa: F821
+    scalar_types = (type(None), bool, int, long, float, complex)  # noqa: F821
+
+container_types = (list, tuple, set, frozenset, dict)
+
+timer = getattr(time, "perf_counter", time.time)
+
+# repr() calls slower than this (in seconds) mark the type as slow, and it's not repr'd again
+SLOW_REPR_TIME = 0.01
+slow_repr_types = set()
+
+# {type: function(value) -> summary string}, for types that have a cheaper / more useful summary than their repr
+summarizers = {}
+summarizers_by_name = {}  # {"module.TypeName": function}, for types from modules that might not be imported
+
+
+def register_summarizer(value_type, summarize_func):
+    """
+    value_type: the type, or "module.TypeName" for types from optional modules (like "numpy.ndarray")
+    summarize_func: takes the value, returns a short string. It should not call repr() on anything big.
+    """
+    if isinstance(value_type, str):
+        summarizers_by_name[value_type] = summarize_func
+    else:
+        summarizers[value_type] = summarize_func
+
+
+def summarize_array(value):
+    return "shape={} dtype={}".format(getattr(value, "shape", "?"), getattr(value, "dtype", "?"))
+
+
+register_summarizer("numpy.ndarray", summarize_array)
+register_summarizer("numpy.matrix", summarize_array)
+
+
+def get_type_name(value_type):
+    return "{}.{}".format(value_type.__module__, value_type.__name__)
+
+
+def get_summarizer(value_type):
+    summarize_func = summarizers.get(value_type)
+    if summarize_func is None and summarizers_by_name:
+        summarize_func = summarizers_by_name.get(get_type_name(value_type))
+    return summarize_func
+
+
+def get_bounded_repr(value, max_length):
+    value_repr = reprlib.repr(value)
+    if len(value_repr) > max_length:
+        value_repr = value_repr[:max_length] + "..."
+    return value_repr
+
+
+def make_repr(value, max_length):
+    """Bounded repr, or None for types that were slow to repr before"""
+    value_type = type(value)
+    if value_type in slow_repr_types:
+        return None
+
+    start_time = timer()
+    try:
+        value_repr = get_bounded_repr(value, max_length)
+    except Exception as e:
+        value_repr = "<repr failed: {}>".format(e.__class__.__name__)
+
+    if timer() - start_time > SLOW_REPR_TIME:
+        slow_repr_types.add(value_type)
+    return value_repr
+
+
+def is_cheap_value(value, max_length, max_children):
+    """Values that can be repr'd right away, without noticeable cost"""
+    if isinstance(value, scalar_types):
+        return True
+    if isinstance(value, string_types):
+        return len(value) <= max_length
+    if type(value) in container_types and len(value) <= max_children:
+        items = value.items() if isinstance(value, dict) else value
+        for item in items:
+            for sub_value in (item if isinstance(value, dict) else (item,)):
+                if not isinstance(sub_value, scalar_types) and not (
+                        isinstance(sub_value, string_types) and len(sub_value) <= max_length):
+                    return False
+        return True
+    return False
+
+
+class LocalValue(object):
+    """Summary of a local variable, with its repr made on demand"""
+
+    def __init__(self, name, type_name, summary="", value_repr=None, value_ref=None, children=None, max_repr_length=200):
+        self.name = name
+        self.type_name = type_name
+        self.summary = summary
+        self.children = children or []  # LocalValue per item, for containers
+        self.max_repr_length = max_repr_length
+
+        self._repr = value_repr
+        self._value_ref = value_ref
+
+    @property
+    def has_repr(self):
+        return self._repr is not None
+
+    def get_repr(self):
+        if self._repr is not None:
+            return self._repr
+
+        value = self._value_ref() if self._value_ref is not None else None
+        if value is None:
+            return "<released, only the summary was kept>" if self._value_ref is not None else "<not kept>"
+
+        value_repr = make_repr(value, self.max_repr_length)
+        if value_repr is None:
+            return "<repr skipped, {} is slow to repr>".format(self.type_name)
+        self._repr = value_repr
+        return self._repr
+
+    def to_dict(self):
+        """Only includes the repr if it was already made, nothing gets repr'd for this"""
+        value_data = {"name": self.name, "type": self.type_name, "summary": self.summary}
+        if self._repr is not None:
+            value_data["repr"] = self._repr
+        if self.children:
+            value_data["children"] = [child.to_dict() for child in self.children]
+        return value_data
+
+    @classmethod
+    def from_dict(cls, value_data):
+        return cls(
+            name=value_data["name"],
+            type_name=value_data.get("type", ""),
+            summary=value_data.get("summary", ""),
+            value_repr=value_data.get("repr"),
+            children=[cls.from_dict(child_data) for child_data in value_data.get("children", [])],
+        )
+
+
+def capture_value(name, value, max_repr_length, max_children, include_children=True):
+    """Summary of the value, only cheap builtins get their repr right away"""
+    value_type = type(value)
+    type_name = value_type.__name__
+
+    summarize_func = get_summarizer(value_type)
+    if summarize_func is not None:
+        try:
+            summary = summarize_func(value)
+        except Exception as e:
+            summary = "<summary failed: {}>".format(e.__class__.__name__)
+    elif isinstance(value, string_types) or type(value) in container_types:
+        summary = "len={}".format(len(value))
+    else:
+        summary = ""
+
+    if is_cheap_value(value, max_repr_length, max_children):
+        return LocalValue(name, type_name, summary, value_repr=get_bounded_repr(value, max_repr_length),
+                          max_repr_length=max_repr_length)
+
+    if isinstance(value, string_types):
+        # strings can't be weakly referenced, keep the start of long ones instead
+        return LocalValue(name, type_name, summary, value_repr=get_bounded_repr(value[:max_repr_length], max_repr_length),
+                          max_repr_length=max_repr_length)
+
+    value_ref = None
+    try:
+        value_ref = weakref.ref(value)
+    except TypeError:
+        pass  # builtins like list and dict can't be weakly referenced, their summary and children are kept instead
+
+    children = []
+    if include_children and type(value) in container_types:
+        items = itertools.islice(value.items() if isinstance(value, dict) else value, max_children)
+        for child_index, item in enumerate(items):
+            if isinstance(value, dict):
+                child_key, child_value = item
+                if is_cheap_value(child_key, max_repr_length, 0):
+                    child_name = get_bounded_repr(child_key, max_repr_length)
+                else:
+                    child_name = "<{}>".format(type(child_key).__name__)
+            else:
+                child_name, child_value = "[{}]".format(child_index), item
+            children.append(capture_value(child_name, child_value, max_repr_length, max_children, include_children=False))
+
+    return LocalValue(name, type_name, summary, value_ref=value_ref, children=children, max_repr_length=max_repr_length)
+
+
+def capture_frame_locals(exc_trace, max_locals=50, max_children=10, max_repr_length=200,
+                         frame_time_budget=0.002, total_time_budget=0.01):
+    """
+    Returns a list of LocalValue lists, one per traceback frame (outermost first).
+
+    Frames are captured innermost first, since those are the most useful. Once the total budget is spent,
+    the remaining (outer) frames get an empty list.
+    """
+    frames = []
+    tb = exc_trace
+    while tb is not None:
+        frames.append(tb.tb_frame)
+        tb = tb.tb_next
+
+    frame_locals = [[] for _ in frames]
+    total_end_time = timer() + total_time_budget
+
+    for frame_index in range(len(frames) - 1, -1, -1):
+        frame_start_time = timer()
+        if frame_start_time > total_end_time:
+            break
+        frame_end_time = min(frame_start_time + frame_time_budget, total_end_time)
+
+        captured_values = frame_locals[frame_index]
+        local_items = list(frames[frame_index].f_locals.items())
+        for local_name, local_value in local_items[:max_locals]:
+            if timer() > frame_end_time:
+                captured_values.append(LocalValue("...", "", "time budget reached, {} more locals".format(
+                    len(local_items) - len(captured_values))))
+                break
+            captured_values.append(capture_value(local_name, local_value, max_repr_length, max_children))
+        else:
+            if len(local_items) > max_locals:
+                captured_values.append(LocalValue("...", "", "{} more locals".format(len(local_items) - max_locals)))
+
+    return frame_locals
@@ -0,0 +1,164 @@
+"""
+Sends exceptions that are reported through logging (logger.exception, exc_info=True) into the exception dialog.
+
+The handler on the logger only puts the log record on a queue, a listener thread does the level filtering,
+dedupes exceptions that were logged more than once, and passes them on to exception_triggered.
+
+from exception_dialog import exception_dialog_logging
+exception_dialog_logging.install_logging_handler()
+"""
+import logging
+import logging.handlers
+import sys
+import threading
+
+if sys.version_info.major >= 3:
+    import queue
+else:
+    import Queue as queue
+
+from . import exception_dialog_metrics as edm
+from . import exception_dialog_system as eds
+
+# set on exceptions once they've been passed on, so an exception that's logged at several levels is only shown once
+REPORTED_ATTRIBUTE = "_exception_dialog_reported"
+
+if hasattr(logging.handlers, "QueueHandler"):
+    QueueHandlerBase = logging.handlers.QueueHandler
+    QueueListenerBase = logging.handlers.QueueListener
+else:
+    # python 2 has no queue handlers, these are the parts of them that are needed here
+    class QueueHandlerBase(logging.Handler):
+        def __init__(self, record_queue):
+            logging.Handler.__init__(self)
+            self.queue = record_queue
+
+        def enqueue(self, record):
+            self.queue.put_nowait(record)
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.enqueue(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListenerBase(object):
+        _sentinel = None
+
+        def __init__(self, record_queue, *handlers, **kwargs):
+            self.queue = record_queue
+            self.handlers = handlers
+            self.respect_handler_level = kwargs.get("respect_handler_level", False)
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor, name="ExceptionLoggingListener")
+            self._thread.daemon = True
+            self._thread.start()
+
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+        def handle(self, record):
+            for handler in self.handlers:
+                if not self.respect_handler_level or record.levelno >= handler.level:
+                    handler.handle(record)
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                self.handle(record)
+
+
+def has_exception(record):
+    return bool(record.exc_info) and record.exc_info[0] is not None
+
+
+class ExceptionQueueHandler(QueueHandlerBase):
+    """Puts log records with exception info on the queue, without formatting anything or blocking"""
+
+    def filter(self, record):
+        if not has_exception(record):
+            return False
+        return QueueHandlerBase.filter(self, record)
+
+    def prepare(self, record):
+        # the default prepare formats the message and traceback and drops exc_info, the listener needs exc_info
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            edm.metrics.increment(edm.MetricNames.log_records_dropped)
+
+
+class ExceptionPipelineHandler(logging.Handler):
+    """Runs on the listener thread, passes the exceptions of log records on to exception_triggered"""
+
+    def __init__(self, level=logging.ERROR):
+        logging.Handler.__init__(self, level)
+
+    def emit(self, record):
+        if record.name == __package__ or record.name.startswith(__package__ + "."):
+            return  # don't report the exception dialog's own errors back to itself
+
+        exc_type, exc_value, exc_trace = record.exc_info
+        if exc_value is not None:
+            if getattr(exc_value, REPORTED_ATTRIBUTE, False):
+                edm.metrics.increment(edm.MetricNames.exceptions_deduplicated)
+                return
+            try:
+                setattr(exc_value, REPORTED_ATTRIBUTE, True)
+            except (AttributeError, TypeError):
+                pass
+
+        try:
+            eds.load_from_hook()
+            eds.exception_triggered(exc_type, exc_value, exc_trace)
+        except Exception:
+            self.handleError(record)
+
+
+class LoggingCapture(object):
+    queue_handler = None  # type: ExceptionQueueHandler
+    queue_listener = None
+    logger = None  # type: logging.Logger
+
+
+def install_logging_handler(logger=None, level=None, queue_size=None):
+    """
+    logger: defaults to the root logger
+    level: log records below this level are ignored, defaults to ExceptionDialogConstants.logging_level
+    """
+    uninstall_logging_handler()
+
+    record_queue = queue.Queue(maxsize=queue_size or eds.lk.logging_queue_size)
+    pipeline_handler = ExceptionPipelineHandler(eds.lk.logging_level if level is None else level)
+
+    LoggingCapture.queue_listener = QueueListenerBase(record_queue, pipeline_handler, respect_handler_level=True)
+    LoggingCapture.queue_listener.start()
+
+    LoggingCapture.queue_handler = ExceptionQueueHandler(record_queue)
+    LoggingCapture.logger = logger or logging.getLogger()
+    LoggingCapture.logger.addHandler(LoggingCapture.queue_handler)
+    return LoggingCapture.queue_handler
+
+
+def uninstall_logging_handler():
+    if LoggingCapture.queue_handler is None:
+        return
+
+    LoggingCapture.logger.removeHandler(LoggingCapture.queue_handler)
+    LoggingCapture.queue_listener.stop()  # handles the records that are still queued
+
+    LoggingCapture.queue_handler = None
+    LoggingCapture.queue_listener = None
+    LoggingCapture.logger = None
@@ -0,0 +1,172 @@
+"""
+Counters and latency histograms for the exception hook.
+
+Increments don't take a lock, they rely on the GIL instead. Under heavy contention from many threads
+that can lose the odd increment, which is an acceptable trade for keeping the exception path cheap.
+Readers work on copies (dict() and list() copy in one step under the GIL), as keys can be added at any time.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+import traceback
+
+from . import exception_dialog_files
+
+timer = getattr(time, "perf_counter", time.time)
+
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# action classes each get a histogram, this caps how many there can be
+MAX_HISTOGRAMS = 200
+
+
+class MetricNames:
+    exceptions_seen = "exceptions_seen"
+    exceptions_suppressed = "exceptions_suppressed"
+    exceptions_deduplicated = "exceptions_deduplicated"
+    exceptions_sampled_out = "exceptions_sampled_out"
+    actions_dropped = "actions_dropped"
+    actions_timed_out = "actions_timed_out"
+    log_records_dropped = "log_records_dropped"
+    store_items_dropped = "store_items_dropped"
+    aggregator_messages_dropped = "aggregator_messages_dropped"
+    aggregator_messages_failed = "aggregator_messages_failed"
+    headless_lines_dropped = "headless_lines_dropped"
+
+    format_time = "format_seconds"
+    ui_update_time = "ui_update_seconds"
+    action_time_prefix = "action_seconds:"
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], self.bucket_counts)),
+        }
+
+
+class ExceptionMetrics(object):
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.time()
+
+    def increment(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            if len(self.histograms) >= MAX_HISTOGRAMS:
+                return
+            histogram = self.histograms.setdefault(name, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def observe_action(self, action_cls, seconds):
+        self.observe(MetricNames.action_time_prefix + action_cls.__name__, seconds)
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.time()
+
+    def snapshot(self):
+        return {
+            "timestamp": time.time(),
+            "start_time": self.start_time,
+            "pid": os.getpid(),
+            "counters": dict(self.counters),
+            "histograms": dict((name, histogram.to_dict()) for name, histogram in list(self.histograms.items())),
+        }
+
+    def to_prometheus_text(self):
+        lines = []
+        pid_label = 'pid="{}"'.format(os.getpid())
+
+        for name, value in sorted(dict(self.counters).items()):
+            metric_name = "exception_dialog_{}_total".format(name)
+            lines.append("# TYPE {} counter".format(metric_name))
+            lines.append("{}{{{}}} {}".format(metric_name, pid_label, value))
+
+        typed_metric_names = set()
+        for name, histogram in sorted(list(self.histograms.items())):
+            metric_name, _, action_name = name.partition(":")
+            metric_name = "exception_dialog_{}".format(metric_name)
+            labels = pid_label
+            if action_name:
+                labels += ',action="{}"'.format(action_name)
+
+            # the action histograms share one metric name, which can only be typed once
+            if metric_name not in typed_metric_names:
+                typed_metric_names.add(metric_name)
+                lines.append("# TYPE {} histogram".format(metric_name))
+            cumulative_count = 0
+            for bound, bucket_count in zip(list(LATENCY_BUCKETS) + ["+Inf"], list(histogram.bucket_counts)):
+                cumulative_count += bucket_count
+                lines.append('{}_bucket{{{},le="{}"}} {}'.format(metric_name, labels, bound, cumulative_count))
+            lines.append("{}_sum{{{}}} {}".format(metric_name, labels, histogram.total))
+            lines.append("{}_count{{{}}} {}".format(metric_name, labels, histogram.count))
+
+        return "\n".join(lines) + "\n"
+
+    def export(self, file_path, export_format="prometheus"):
+        if export_format == "json":
+            file_content = json.dumps(self.snapshot(), indent=2)
+        else:
+            file_content = self.to_prometheus_text()
+
+        # a scraper never reads a half written file
+        exception_dialog_files.write_file_atomic(file_path, file_content)
+
+
+class MetricsExporter(object):
+    """Writes the metrics to a file every interval seconds, from a background thread"""
+
+    def __init__(self, exception_metrics, file_path, interval=60.0, export_format="prometheus"):
+        self.metrics = exception_metrics  # type: ExceptionMetrics
+        self.file_path = file_path
+        self.interval = interval
+        self.export_format = export_format
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._export_loop, name="ExceptionMetricsExporter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def export(self):
+        try:
+            self.metrics.export(self.file_path, self.export_format)
+        except (IOError, OSError) as e:
+            print("Failed to export exception dialog metrics: {}".format(e))
+        except Exception:
+            traceback.print_exc()  # keep exporting at the next interval
+
+    def _export_loop(self):
+        while not self._stop_event.wait(self.interval):
+            self.export()
+
+
+metrics = ExceptionMetrics()
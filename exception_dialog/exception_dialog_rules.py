@@ -0,0 +1,269 @@
+"""
+Declarative suppression and routing rules for exceptions.
+
+Rules are read from a json file, and compiled once into a matcher that's checked before any formatting or UI work.
+The file is checked for changes (at most once per reload_interval), so rules can be edited without restarting the DCC.
+
+Example rules file:
+{
+    "rules": [
+        {
+            "name": "noisy viewport callback",
+            "exc_type": ["RuntimeError"],
+            "message": "Object '.*' not found",
+            "file": "*/viewport_tools/*",
+            "dcc": "maya",
+            "action": "suppress"
+        },
+        {
+            "name": "show a few render errors, then only record them",
+            "exc_type": "RenderError",
+            "rate_limit": 1,
+            "action": "silent"
+        }
+    ]
+}
+
+exc_type: exception class name(s), also matches subclasses. Can be "module.ClassName" as well
+message: regex, searched for in the exception message
+file: glob pattern, matched against the file of any frame in the traceback
+dcc: only apply the rule in this DCC ("maya", "python")
+rate_limit: the first N matches per second are let through, the action only applies to the rest
+action: see RuleActions
+
+Rules with values of the wrong type are skipped with a warning, the other rules in the file still apply.
+"""
+import fnmatch
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+if sys.version_info.major >= 3:
+    string_types = (str,)
+    number_types = (int, float)
+else:
+    string_types = (str, unicode)  # noqa: F821
+    number_types = (int, long, float)  # noqa: F821
+
+
+class RuleActions:
+    suppress = "suppress"  # ignore the exception entirely
+    silent = "silent"  # record it and run the automatic actions, but don't show the dialog
+    dialog = "dialog"  # the normal path, for exceptions that should get through a broader rule further down
+
+    all_actions = (suppress, silent, dialog)
+
+
+def get_string_list(rule_data, key):
+    values = rule_data.get(key) or []
+    if not isinstance(values, list):
+        values = [values]
+    for value in values:
+        if not isinstance(value, string_types):
+            raise ValueError("'{}' has to be a string or a list of strings, not: {!r}".format(key, value))
+    return values
+
+
+def get_optional_string(rule_data, key):
+    value = rule_data.get(key)
+    if value is not None and not isinstance(value, string_types):
+        raise ValueError("'{}' has to be a string, not: {!r}".format(key, value))
+    return value
+
+
+class ExceptionRule(object):
+    def __init__(self, rule_data, index=0):
+        """Raises ValueError (or re.error) for rule data that can't be used"""
+        if not isinstance(rule_data, dict):
+            raise ValueError("rule {} has to be an object, not: {!r}".format(index, rule_data))
+
+        self.index = index
+        self.name = rule_data.get("name", "rule {}".format(index))
+        self.action = rule_data.get("action", RuleActions.suppress)
+        if self.action not in RuleActions.all_actions:
+            raise ValueError("rule '{}' has an unknown action: {}".format(self.name, self.action))
+
+        self.exc_types = frozenset(get_string_list(rule_data, "exc_type"))
+
+        message_pattern = get_optional_string(rule_data, "message")
+        self.message_regex = re.compile(message_pattern) if message_pattern else None
+
+        file_patterns = get_string_list(rule_data, "file")
+        self.file_regex = None
+        if file_patterns:
+            file_patterns = [os.path.normcase(file_pattern) for file_pattern in file_patterns]
+            self.file_regex = re.compile("|".join(fnmatch.translate(file_pattern) for file_pattern in file_patterns))
+
+        self.dcc = get_optional_string(rule_data, "dcc")
+
+        self.rate_limit = rule_data.get("rate_limit")
+        if self.rate_limit is not None:
+            if isinstance(self.rate_limit, bool) or not isinstance(self.rate_limit, number_types):
+                raise ValueError("'rate_limit' has to be a number, not: {!r}".format(self.rate_limit))
+        self._rate_window_start = 0
+        self._rate_window_count = 0
+
+    def matches(self, exc_message, exc_files):
+        if self.message_regex is not None and not self.message_regex.search(exc_message):
+            return False
+
+        if self.file_regex is not None:
+            if not any(self.file_regex.match(os.path.normcase(file_path)) for file_path in exc_files):
+                return False
+
+        if self.rate_limit is not None:
+            return self.is_over_rate_limit()
+
+        return True
+
+    def is_over_rate_limit(self):
+        current_time = time.time()
+        if current_time - self._rate_window_start >= 1.0:
+            self._rate_window_start = current_time
+            self._rate_window_count = 0
+
+        self._rate_window_count += 1
+        return self._rate_window_count > self.rate_limit
+
+
+def get_exception_type_names(exc_type):
+    type_names = []
+    for cls in getattr(exc_type, "__mro__", ()):
+        type_names.append(cls.__name__)
+        type_names.append("{}.{}".format(cls.__module__, cls.__name__))
+    return type_names
+
+
+def get_traceback_files(exc_trace):
+    exc_files = []
+    tb = exc_trace
+    while tb is not None:
+        exc_files.append(tb.tb_frame.f_code.co_filename)
+        tb = tb.tb_next
+    return exc_files
+
+
+class CompiledRules(object):
+    """Rules indexed by exception type name, with the candidate rules for each exception class cached"""
+
+    def __init__(self, rules, dcc_name=None):
+        self.rules = [rule for rule in rules if rule.dcc is None or rule.dcc == dcc_name]
+
+        self.rules_by_type = {}
+        self.untyped_rules = []
+        for rule in self.rules:
+            if not rule.exc_types:
+                self.untyped_rules.append(rule)
+            for exc_type_name in rule.exc_types:
+                self.rules_by_type.setdefault(exc_type_name, []).append(rule)
+
+        self._candidate_cache = {}
+
+    def get_candidate_rules(self, exc_type):
+        candidate_rules = self._candidate_cache.get(exc_type)
+        if candidate_rules is None:
+            rule_set = set(self.untyped_rules)
+            for exc_type_name in get_exception_type_names(exc_type):
+                rule_set.update(self.rules_by_type.get(exc_type_name, ()))
+            candidate_rules = tuple(sorted(rule_set, key=lambda rule: rule.index))
+
+            if len(self._candidate_cache) > 1000:
+                self._candidate_cache.clear()
+            self._candidate_cache[exc_type] = candidate_rules
+        return candidate_rules
+
+    def match(self, exc_type, exc_value, exc_trace):
+        """Returns the first matching rule, or None"""
+        candidate_rules = self.get_candidate_rules(exc_type)
+        if not candidate_rules:
+            return None
+
+        # only pay for the message and file list if a rule needs them
+        exc_message = None
+        exc_files = None
+        for rule in candidate_rules:
+            if exc_message is None and rule.message_regex is not None:
+                try:
+                    exc_message = str(exc_value)
+                except Exception:
+                    exc_message = ""
+            if exc_files is None and rule.file_regex is not None:
+                exc_files = get_traceback_files(exc_trace)
+
+            if rule.matches(exc_message, exc_files):
+                return rule
+        return None
+
+
+def load_rules_file(rules_path):
+    """The rules in the file, rules that can't be used are skipped with a warning"""
+    with open(rules_path, "r") as fp:
+        rules_data = json.load(fp)
+
+    if isinstance(rules_data, dict):
+        rules_data = rules_data.get("rules", [])
+    if not isinstance(rules_data, list):
+        raise ValueError("'rules' has to be a list, not: {!r}".format(rules_data))
+
+    rules = []
+    for index, rule_data in enumerate(rules_data):
+        try:
+            rules.append(ExceptionRule(rule_data, index))
+        except (ValueError, re.error) as e:
+            print("Skipped exception rule {} in {}: {}".format(index, rules_path, e))
+    return rules
+
+
+class RuleEngine(object):
+    def __init__(self, rules_path, dcc_name=None, reload_interval=2.0):
+        self.rules_path = rules_path
+        self.dcc_name = dcc_name
+        self.reload_interval = reload_interval
+
+        self.compiled_rules = CompiledRules([], dcc_name)
+        self._rules_mtime = None
+        self._next_check_time = 0
+        self._reload_lock = threading.Lock()
+
+    def check_reload(self):
+        current_time = time.time()
+        if current_time < self._next_check_time:
+            return
+        self._next_check_time = current_time + self.reload_interval
+
+        try:
+            rules_mtime = os.stat(self.rules_path).st_mtime
+        except OSError:
+            rules_mtime = None
+
+        if rules_mtime == self._rules_mtime:
+            return
+
+        with self._reload_lock:
+            self._rules_mtime = rules_mtime
+            if rules_mtime is None:
+                self.compiled_rules = CompiledRules([], self.dcc_name)
+                return
+
+            try:
+                self.compiled_rules = CompiledRules(load_rules_file(self.rules_path), self.dcc_name)
+                print("Loaded exception rules: {}".format(self.rules_path))
+            except Exception as e:
+                # keep the previous rules until the file is fixed
+                print("Failed to load exception rules from {}: {}".format(self.rules_path, e))
+
+    def match(self, exc_type, exc_value, exc_trace):
+        """The first matching rule, or None. Never raises, it runs inside the exception hook"""
+        try:
+            self.check_reload()
+        except Exception as e:
+            print("Failed to check exception rules for changes: {}".format(e))
+
+        try:
+            return self.compiled_rules.match(exc_type, exc_value, exc_trace)
+        except Exception as e:
+            print("Failed to match exception rules: {}".format(e))
+            return None
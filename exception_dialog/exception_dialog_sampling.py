@@ -0,0 +1,203 @@
+"""
+Adaptive sampling of exception records, so automatic actions and storage see a bounded event rate.
+
+Records are grouped by a sampling key (exception type + the file and function of every frame, without line numbers),
+so exceptions that only differ in their message or a line number share a budget.
+The coalescer already collapses repeats of a fingerprint, so grouping by fingerprint would leave the sampler
+nothing to limit. Each key has a token bucket, and there's one global bucket on top of that.
+
+Every record is still counted exactly, and a small reservoir of examples is kept per key.
+The skipped records are passed on as repeat counts of their fingerprint by SkippedCountFlusher,
+so the store keeps exact totals.
+"""
+import collections
+import hashlib
+import random
+import threading
+import time
+import traceback
+
+
+class TokenBucket(object):
+    def __init__(self, rate, burst):
+        self.rate = float(rate)  # tokens per second
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last_time = time.time()
+
+    def take(self, current_time=None):
+        current_time = time.time() if current_time is None else current_time
+        self.tokens = min(self.burst, self.tokens + (current_time - self.last_time) * self.rate)
+        self.last_time = current_time
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class SamplingStats(object):
+    def __init__(self, sampling_key, rate, burst):
+        self.sampling_key = sampling_key
+        self.bucket = TokenBucket(rate, burst)
+        self.count = 0
+        self.passed_count = 0
+        self.skipped_counts = {}  # {fingerprint: [count, last time]} skipped since they were last passed on
+        self.passed_fingerprints = set()  # fingerprints with a record that was passed, the skips can be added to it
+        self.examples = []  # reservoir of records, every record of this key has had the same chance of being kept
+        self.last_time = 0
+
+    def to_dict(self):
+        return {
+            "sampling_key": self.sampling_key,
+            "count": self.count,
+            "passed_count": self.passed_count,
+            "last_time": self.last_time,
+            "examples": [example.to_dict() for example in self.examples],
+        }
+
+
+    def add_skipped(self, fingerprint, timestamp, count=1):
+        skipped_count = self.skipped_counts.get(fingerprint)
+        if skipped_count is None:
+            self.skipped_counts[fingerprint] = [count, timestamp]
+        else:
+            skipped_count[0] += count
+            skipped_count[1] = max(skipped_count[1], timestamp)
+
+
+def get_sampling_key(exc_record):
+    """Hash of the exception type and the (file, function) of every frame, short like the fingerprint"""
+    frame_keys = "|".join("{}:{}".format(frame[0], frame[2]) for frame in exc_record.frames)
+    sampling_key = "{}.{}|{}".format(exc_record.exc_module, exc_record.exc_type_name, frame_keys)
+    return hashlib.sha1(sampling_key.encode("utf-8")).hexdigest()[:16]
+
+
+class AdaptiveSampler(object):
+    def __init__(self, rate=1.0, burst=5, global_rate=20.0, global_burst=50, reservoir_size=5, max_keys=500):
+        self.rate = rate
+        self.burst = burst
+        self.reservoir_size = reservoir_size
+        self.max_keys = max_keys
+
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.stats = collections.OrderedDict()  # least recently seen key first
+        self.total_count = 0
+        self.total_passed_count = 0
+
+        self._lock = threading.Lock()
+
+    def sample(self, exc_record):
+        """
+        Returns True if the record should be passed on to the automatic actions and storage.
+
+        A passed record gets the amount of records of its fingerprint that were skipped since the last one,
+        and not taken by take_skipped_counts yet, as skipped_count.
+        The occurrence of a skipped record gets the sampling_key, for add_skipped_repeat.
+        """
+        current_time = time.time()
+        sampling_key = get_sampling_key(exc_record)
+
+        with self._lock:
+            stats = self._get_stats(sampling_key)
+            self.total_count += 1
+            stats.count += 1
+            stats.last_time = current_time
+
+            # reservoir sampling (algorithm R)
+            if len(stats.examples) < self.reservoir_size:
+                stats.examples.append(exc_record)
+            else:
+                example_index = random.randrange(stats.count)
+                if example_index < self.reservoir_size:
+                    stats.examples[example_index] = exc_record
+
+            # the global bucket is only drawn from when the key has budget left, so a noisy key can't starve the others
+            is_passed = stats.bucket.take(current_time) and self.global_bucket.take(current_time)
+            if not is_passed:
+                stats.add_skipped(exc_record.fingerprint, current_time)
+                if exc_record.occurrence is not None:
+                    exc_record.occurrence.sampling_key = stats.sampling_key
+                return False
+
+            exc_record.skipped_count = stats.skipped_counts.pop(exc_record.fingerprint, [0])[0]
+            stats.passed_fingerprints.add(exc_record.fingerprint)
+            stats.passed_count += 1
+            self.total_passed_count += 1
+            return True
+
+    def add_skipped_repeat(self, sampling_key, fingerprint, timestamp, count=1):
+        """Count repeats (collapsed by the coalescer) of a record that was skipped, like skipped records of their own"""
+        with self._lock:
+            stats = self._get_stats(sampling_key)
+            self.total_count += count
+            stats.count += count
+            stats.last_time = max(stats.last_time, timestamp)
+            stats.add_skipped(fingerprint, timestamp, count)
+
+    def _get_stats(self, sampling_key):
+        stats = self.stats.pop(sampling_key, None)
+        if stats is None:
+            stats = SamplingStats(sampling_key, self.rate, self.burst)
+            if len(self.stats) >= self.max_keys:
+                self.stats.popitem(last=False)
+        self.stats[sampling_key] = stats
+        return stats
+
+    def take_skipped_counts(self):
+        """
+        {fingerprint: (skipped count, last skipped time)} of the records skipped since the last call, to add as repeats.
+
+        Fingerprints that never passed a record keep their count for skipped_count, there's nothing stored to add
+        repeats to.
+        """
+        skipped_counts = {}
+        with self._lock:
+            for stats in self.stats.values():
+                for fingerprint in list(stats.skipped_counts.keys()):
+                    if fingerprint in stats.passed_fingerprints:
+                        skipped_counts[fingerprint] = tuple(stats.skipped_counts.pop(fingerprint))
+        return skipped_counts
+
+    def get_stats(self, sampling_key):
+        return self.stats.get(sampling_key)
+
+    def snapshot(self, limit=None):
+        """Stats per sampling key as dicts, most frequent first"""
+        with self._lock:
+            all_stats = sorted(self.stats.values(), key=lambda stats: stats.count, reverse=True)
+        return [stats.to_dict() for stats in all_stats[:limit]]
+
+
+class SkippedCountFlusher(object):
+    """Passes the skipped counts of the sampler to callback({fingerprint: (count, last time)}) every interval seconds"""
+
+    def __init__(self, sampler, callback, interval=1.0):
+        self.sampler = sampler  # type: AdaptiveSampler
+        self.callback = callback
+        self.interval = interval
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._flush_loop, name="ExceptionSamplingFlush")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def flush(self):
+        skipped_counts = self.sampler.take_skipped_counts()
+        if skipped_counts:
+            self.callback(skipped_counts)
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
@@ -0,0 +1,213 @@
+"""
+Inverted index over the exception records of the dialog's history, to filter them while typing.
+
+Records are added and removed one at a time as the history changes, so the index never has to be rebuilt.
+Type, module and message words are looked up in the (much smaller) vocabulary of indexed terms,
+only the records that match every part of the query are checked against the full message.
+"""
+import collections
+import os
+import re
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def get_words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def get_module_names(exc_record):
+    """Module of the exception type, and the modules (file names) of the frames in the traceback"""
+    module_names = set()
+    if exc_record.exc_module:
+        module_names.add(exc_record.exc_module.lower())
+    for frame in exc_record.frames:
+        module_names.add(os.path.splitext(os.path.basename(frame[0]))[0].lower())
+    return module_names
+
+
+class RecordQuery(object):
+    def __init__(self, exc_type="", module="", text="", since=None, until=None):
+        """
+        exc_type, module: part of the exception type name / module name, case insensitive
+        text: part of the message, case insensitive
+        since / until: unix timestamps
+        """
+        self.exc_type = exc_type.strip().lower()
+        self.module = module.strip().lower()
+        self.text = text.strip().lower()
+        self.since = since
+        self.until = until
+
+    def is_empty(self):
+        return not (self.exc_type or self.module or self.text or self.since is not None or self.until is not None)
+
+
+class TermPostings(object):
+    """
+    {term: set of record ids}
+
+    The terms that contain a query are cached while the vocabulary doesn't change,
+    and their record ids while no records are added or removed, so typing doesn't look them up again.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary_version = 0  # goes up when a term is added
+        self.postings_version = 0  # goes up when a record is added or removed
+        self._match_cache = {}  # {query: (vocabulary version, matching terms)}
+        self._record_ids_cache = {}  # {query: (postings version, record ids)}
+
+    def add(self, term, record_id):
+        self.postings_version += 1
+        record_ids = self.postings.get(term)
+        if record_ids is None:
+            record_ids = self.postings[term] = set()
+            self.vocabulary_version += 1
+        record_ids.add(record_id)
+
+    def discard(self, term, record_id):
+        record_ids = self.postings.get(term)
+        if record_ids is None:
+            return
+        self.postings_version += 1
+        record_ids.discard(record_id)
+        if not record_ids:
+            del self.postings[term]
+
+    def get_matching_terms(self, query):
+        cached_version, matching_terms = self._match_cache.get(query, (None, None))
+        if cached_version == self.vocabulary_version:
+            return matching_terms
+
+        # while typing, the query usually extends the previous one, so only the terms that matched that are checked
+        search_terms = self.postings
+        for cached_query, (cached_version, cached_terms) in self._match_cache.items():
+            if cached_version == self.vocabulary_version and cached_query in query:
+                if len(cached_terms) < len(search_terms):
+                    search_terms = cached_terms
+
+        matching_terms = [term for term in search_terms if query in term]
+        if len(self._match_cache) > 64:
+            self._match_cache.clear()
+        self._match_cache[query] = (self.vocabulary_version, matching_terms)
+        return matching_terms
+
+    def get_record_ids(self, query):
+        """ids of the records with a term that contains query, don't modify the returned set"""
+        cached_version, record_ids = self._record_ids_cache.get(query, (None, None))
+        if cached_version == self.postings_version:
+            return record_ids
+
+        record_ids = set()
+        for term in self.get_matching_terms(query):
+            record_ids.update(self.postings.get(term, ()))
+
+        if len(self._record_ids_cache) > 16:
+            self._record_ids_cache.clear()
+        self._record_ids_cache[query] = (self.postings_version, record_ids)
+        return record_ids
+
+
+class RecordIndex(object):
+    """
+    Incremental index of exception records, by type, module and message words.
+
+    Records are given increasing ids as they're added, so the results are in the order the records were added.
+    """
+    direct_check_count = 2000
+
+    def __init__(self):
+        self.records = collections.OrderedDict()  # {record id: ExceptionRecord}
+        self.type_postings = TermPostings()
+        self.module_postings = TermPostings()
+        self.word_postings = TermPostings()
+        self._record_terms = {}  # {record id: (type name, module names, words)}, to remove them again
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record_id, exc_record):
+        type_name = exc_record.exc_type_name.lower()
+        module_names = get_module_names(exc_record)
+        words = set(get_words(exc_record.message))
+
+        self.type_postings.add(type_name, record_id)
+        for module_name in module_names:
+            self.module_postings.add(module_name, record_id)
+        for word in words:
+            self.word_postings.add(word, record_id)
+
+        self.records[record_id] = exc_record
+        self._record_terms[record_id] = (type_name, module_names, words)
+
+    def remove(self, record_id):
+        if record_id not in self.records:
+            return
+        del self.records[record_id]
+
+        type_name, module_names, words = self._record_terms.pop(record_id)
+        self.type_postings.discard(type_name, record_id)
+        for module_name in module_names:
+            self.module_postings.discard(module_name, record_id)
+        for word in words:
+            self.word_postings.discard(word, record_id)
+
+    def clear(self):
+        self.__init__()
+
+    def search(self, query):
+        """Sorted ids of the records that match the RecordQuery"""
+        candidate_ids = None
+
+        def narrow(record_ids):
+            return record_ids if candidate_ids is None else candidate_ids & record_ids
+
+        if query.exc_type:
+            candidate_ids = narrow(self.type_postings.get_record_ids(query.exc_type))
+        if query.module:
+            candidate_ids = narrow(self.module_postings.get_record_ids(query.module))
+        for word in get_words(query.text):
+            # a few candidates are quicker to check against the message directly, below
+            if candidate_ids is not None and len(candidate_ids) < self.direct_check_count:
+                break
+            candidate_ids = narrow(self.word_postings.get_record_ids(word))
+
+        if candidate_ids is None:
+            record_ids = list(self.records.keys())
+        else:
+            record_ids = sorted(candidate_ids)
+
+        if query.text:
+            # the words matched separately, the message has to contain the text as a whole too
+            record_ids = [
+                record_id for record_id in record_ids if query.text in self.records[record_id].message.lower()
+            ]
+
+        if query.since is not None or query.until is not None:
+            since = float("-inf") if query.since is None else query.since
+            until = float("inf") if query.until is None else query.until
+            record_ids = [
+                record_id for record_id in record_ids if since <= self.records[record_id].timestamp <= until
+            ]
+
+        return record_ids
+
+    def matches(self, record_id, query):
+        """Whether one record matches the query, for records that are added while a query is active"""
+        exc_record = self.records.get(record_id)
+        if exc_record is None:
+            return False
+
+        if query.exc_type and query.exc_type not in exc_record.exc_type_name.lower():
+            return False
+        if query.module and not any(query.module in module_name for module_name in self._record_terms[record_id][1]):
+            return False
+        if query.text and query.text not in exc_record.message.lower():
+            return False
+        if query.since is not None and exc_record.timestamp < query.since:
+            return False
+        if query.until is not None and exc_record.timestamp > query.until:
+            return False
+        return True
+
@@ -0,0 +1,89 @@
+"""
+Shared cache of source file lines, for formatting tracebacks.
+
+Exception records only store the file, line number and function of each frame, the source lines
+are looked up here when a record is displayed or exported, so no files are read on the exception path.
+
+Files are kept in least recently used order, and re-read when their mtime or size changes.
+"""
+import collections
+import linecache
+import os
+import sys
+import threading
+import time
+
+if sys.version_info.major >= 3:
+    import tokenize
+
+    def read_source_lines(file_path):
+        # tokenize.open respects the encoding declaration of the file
+        with tokenize.open(file_path) as fp:
+            return fp.readlines()
+else:
+    def read_source_lines(file_path):
+        with open(file_path, "r") as fp:
+            return fp.readlines()
+
+
+class SourceFile(object):
+    def __init__(self, lines, mtime, size):
+        self.lines = lines
+        self.mtime = mtime
+        self.size = size
+        self.check_time = time.time()
+
+
+class SourceCache(object):
+    def __init__(self, max_files=200, check_interval=2.0):
+        self.max_files = max_files
+        self.check_interval = check_interval  # seconds between mtime checks of the same file
+
+        self.files = collections.OrderedDict()  # {file path: SourceFile}, least recently used first
+        self._lock = threading.Lock()
+
+    def get_lines(self, file_path):
+        current_time = time.time()
+
+        with self._lock:
+            source_file = self.files.pop(file_path, None)
+            if source_file is not None:
+                self.files[file_path] = source_file
+                if current_time - source_file.check_time < self.check_interval:
+                    return source_file.lines
+
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            # not a file on disk, like "<string>" or a module in a zip
+            return linecache.getlines(file_path)
+
+        if source_file is not None and (source_file.mtime, source_file.size) == (file_stat.st_mtime, file_stat.st_size):
+            source_file.check_time = current_time
+            return source_file.lines
+
+        try:
+            lines = read_source_lines(file_path)
+        except (IOError, OSError, SyntaxError, UnicodeDecodeError):
+            lines = []
+
+        with self._lock:
+            self.files.pop(file_path, None)
+            self.files[file_path] = SourceFile(lines, file_stat.st_mtime, file_stat.st_size)
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+        return lines
+
+    def get_line(self, file_path, line_number):
+        """Stripped source line, or an empty string if it can't be found"""
+        lines = self.get_lines(file_path)
+        if 1 <= line_number <= len(lines):
+            return lines[line_number - 1].strip()
+        return ""
+
+    def clear(self):
+        with self._lock:
+            self.files.clear()
+
+
+source_cache = SourceCache()
@@ -0,0 +1,303 @@
+import atexit
+import getpass
+import json
+import os
+import platform
+import socket
+import sqlite3
+import sys
+import time
+import traceback
+
+if sys.version_info.major >= 3:
+    import queue
+else:
+    import Queue as queue
+
+from . import exception_dialog_metrics as edm
+from . import exception_dialog_writer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    fingerprint TEXT PRIMARY KEY,
+    exc_type TEXT,
+    exc_module TEXT,
+    message TEXT,
+    text TEXT,
+    first_seen REAL,
+    last_seen REAL,
+    total_count INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS occurrences (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fingerprint TEXT,
+    first_seen REAL,
+    last_seen REAL,
+    count INTEGER,
+    message TEXT,
+    environment TEXT,
+    context_id TEXT,
+    context_delta TEXT
+);
+
+CREATE TABLE IF NOT EXISTS contexts (
+    context_id TEXT PRIMARY KEY,
+    timestamp REAL,
+    data TEXT
+);
+
+CREATE INDEX IF NOT EXISTS occurrences_fingerprint_time ON occurrences (fingerprint, first_seen);
+CREATE INDEX IF NOT EXISTS occurrences_time ON occurrences (first_seen);
+"""
+
+
+def get_environment_info():
+    try:
+        user_name = getpass.getuser()
+    except Exception:
+        user_name = ""
+
+    return {
+        "host": socket.gethostname(),
+        "user": user_name,
+        "pid": os.getpid(),
+        "executable": sys.executable,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path, timeout=5.0)
+    # write ahead logging, so queries from other processes don't block the writer
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class ExceptionStore(exception_dialog_writer.BackgroundWriter):
+    """
+    SQLite database of exception records and their occurrence counts, indexed by fingerprint and time.
+
+    Writes are queued and committed in batches by a background thread, queries use their own connection.
+    Repeats are added up per fingerprint and written once per flush interval.
+    """
+    thread_name = "ExceptionStoreWriter"
+    dropped_metric_name = edm.MetricNames.store_items_dropped
+
+    def __init__(self, db_path, flush_interval=1.0, batch_size=200, queue_size=10000):
+        super(ExceptionStore, self).__init__(queue_size)
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.environment = get_environment_info()
+
+        # occurrence row of the latest occurrence per fingerprint, written to by repeats (writer thread only)
+        self._occurrence_row_ids = {}
+        self._added_context_ids = set()
+
+    def ensure_schema(self, connection):
+        connection.executescript(SCHEMA)
+
+        # databases from before the environment context was stored
+        column_names = [row[1] for row in connection.execute("PRAGMA table_info(occurrences)")]
+        for column_name in ("context_id", "context_delta"):
+            if column_name not in column_names:
+                connection.execute("ALTER TABLE occurrences ADD COLUMN {} TEXT".format(column_name))
+
+    def add_record(self, exc_record, environment=None, context_snapshot=None):
+        """context_snapshot: the environment context the record refers to, only written once per snapshot"""
+        if context_snapshot is not None:
+            self.add_context_data(context_snapshot.to_dict())
+
+        # the traceback text is formatted on the writer thread, it needs the source files
+        record_data = exc_record.to_dict(include_source=False)
+        self._enqueue_record(("record", record_data, environment or self.environment, exc_record), record_data.get("fingerprint"))
+
+    def add_context_data(self, context_data):
+        if context_data["context_id"] in self._added_context_ids:
+            return
+        self._added_context_ids.add(context_data["context_id"])
+        self._enqueue(("context", context_data))
+
+    def add_record_data(self, record_data, environment=None):
+        """add an already serialized record, for records that come from other processes"""
+        self._enqueue_record(("record", record_data, environment or self.environment, None), record_data.get("fingerprint"))
+
+    def _writer_loop(self):
+        folder_path = os.path.dirname(self.db_path)
+        if folder_path and not os.path.isdir(folder_path):
+            os.makedirs(folder_path)
+
+        connection = connect(self.db_path)
+        self.ensure_schema(connection)
+
+        while True:
+            try:
+                batch = [self._write_queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                # only repeats came in
+                if self.repeats:
+                    try:
+                        self.write_batch(connection, [])
+                    except Exception:
+                        traceback.print_exc()
+                continue
+
+            batch_end_time = time.time() + self.flush_interval
+
+            while len(batch) < self.batch_size and batch[-1][0] != "flush":
+                remaining_time = batch_end_time - time.time()
+                if remaining_time <= 0:
+                    break
+                try:
+                    batch.append(self._write_queue.get(timeout=remaining_time))
+                except queue.Empty:
+                    break
+
+            try:
+                self.write_batch(connection, batch)
+            except Exception:
+                traceback.print_exc()
+
+            for item in batch:
+                if item[0] == "flush":
+                    item[1].set()
+
+    def write_batch(self, connection, batch):
+        try:
+            with connection:
+                for item in batch:
+                    if item[0] == "record":
+                        if item[3] is not None:
+                            item[1].update(item[3].get_source_data())
+                        self._write_record(connection, item[1], item[2])
+                    elif item[0] == "context":
+                        connection.execute(
+                            "INSERT OR IGNORE INTO contexts VALUES (?, ?, ?)",
+                            (item[1]["context_id"], item[1]["timestamp"], json.dumps(item[1]["data"])),
+                        )
+        finally:
+            # the repeats of these records can be written from now on, even if writing them failed
+            for item in batch:
+                if item[0] == "record":
+                    self.repeats.mark_written(item[1].get("fingerprint"))
+
+        pending_repeats = self.take_pending_repeats()
+        if pending_repeats:
+            with connection:
+                for fingerprint, (count, last_time) in pending_repeats.items():
+                    self._write_repeat(connection, fingerprint, last_time, count)
+
+    def _write_record(self, connection, record_data, environment):
+        fingerprint = record_data.get("fingerprint")
+        count = record_data.get("count", 1) + record_data.get("skipped_count", 0)
+        first_seen = record_data["timestamp"]
+        last_seen = record_data.get("last_time", first_seen)
+
+        connection.execute(
+            "INSERT OR IGNORE INTO fingerprints VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (fingerprint, record_data["exc_type_name"], record_data.get("exc_module", ""),
+             record_data.get("message", ""), record_data.get("text", ""), first_seen, last_seen),
+        )
+        connection.execute(
+            "UPDATE fingerprints SET total_count = total_count + ?, last_seen = MAX(last_seen, ?) "
+            "WHERE fingerprint = ?",
+            (count, last_seen, fingerprint),
+        )
+        cursor = connection.execute(
+            "INSERT INTO occurrences (fingerprint, first_seen, last_seen, count, message, environment, context_id, context_delta) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint, first_seen, last_seen, count, record_data.get("message", ""), json.dumps(environment),
+             record_data.get("context_id"), json.dumps(record_data.get("context_delta"))),
+        )
+        if len(self._occurrence_row_ids) > 10000:
+            self._occurrence_row_ids.clear()
+        self._occurrence_row_ids[fingerprint] = cursor.lastrowid
+
+    def _write_repeat(self, connection, fingerprint, timestamp, count):
+        connection.execute(
+            "UPDATE fingerprints SET total_count = total_count + ?, last_seen = MAX(last_seen, ?) "
+            "WHERE fingerprint = ?",
+            (count, timestamp, fingerprint),
+        )
+
+        row_id = self._occurrence_row_ids.get(fingerprint)
+        if row_id is not None:
+            connection.execute(
+                "UPDATE occurrences SET count = count + ?, last_seen = MAX(last_seen, ?) WHERE id = ?",
+                (count, timestamp, row_id),
+            )
+
+    #########################################################
+    # queries
+
+    def query(self, sql, parameters=()):
+        if not os.path.exists(self.db_path):
+            return []
+
+        connection = connect(self.db_path)
+        try:
+            self.ensure_schema(connection)
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    def top_fingerprints(self, limit=20, since=None, until=None):
+        """
+        Most frequent exceptions in the time range, as dicts with fingerprint, exc_type, message, count and last_seen
+
+        since / until: unix timestamps, defaults to the last 7 days
+        """
+        if since is None:
+            since = time.time() - 7 * 24 * 3600
+        if until is None:
+            until = time.time()
+
+        rows = self.query(
+            "SELECT occurrences.fingerprint, fingerprints.exc_type, fingerprints.message, "
+            "SUM(occurrences.count) AS occurrence_count, MAX(occurrences.last_seen) "
+            "FROM occurrences JOIN fingerprints ON fingerprints.fingerprint = occurrences.fingerprint "
+            "WHERE occurrences.first_seen >= ? AND occurrences.first_seen <= ? "
+            "GROUP BY occurrences.fingerprint ORDER BY occurrence_count DESC LIMIT ?",
+            (since, until, limit),
+        )
+        return [
+            {"fingerprint": row[0], "exc_type": row[1], "message": row[2], "count": row[3], "last_seen": row[4]}
+            for row in rows
+        ]
+
+    def get_fingerprint(self, fingerprint):
+        rows = self.query(
+            "SELECT exc_type, exc_module, message, text, first_seen, last_seen, total_count "
+            "FROM fingerprints WHERE fingerprint = ?",
+            (fingerprint,),
+        )
+        if not rows:
+            return None
+
+        exc_type, exc_module, message, text, first_seen, last_seen, total_count = rows[0]
+        return {
+            "fingerprint": fingerprint,
+            "exc_type": exc_type,
+            "exc_module": exc_module,
+            "message": message,
+            "text": text,
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+            "count": total_count,
+        }
+
+    def get_context(self, context_id):
+        """Environment context snapshot the occurrences refer to, as {"context_id", "timestamp", "data"}"""
+        rows = self.query("SELECT timestamp, data FROM contexts WHERE context_id = ?", (context_id,))
+        if not rows:
+            return None
+        return {"context_id": context_id, "timestamp": rows[0][0], "data": json.loads(rows[0][1])}
+
+
+def create_store(db_path, flush_timeout=5.0):
+    store = ExceptionStore(db_path)
+    atexit.register(store.flush, flush_timeout)
+    return store
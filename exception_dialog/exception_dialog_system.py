@@ -1,138 +1,1296 @@
+import atexit
+import collections
+import hashlib
 import importlib
+import inspect
+import json
 import logging
 import os
+import stat
 import sys
+import threading
 import time
 import traceback
+import warnings
+
+from . import exception_dialog_files
+from . import exception_dialog_metrics as edm
+from . import exception_dialog_source
+
+if sys.version_info.major >= 3:
+    from importlib import reload as reload_module
+else:
+    reload_module = reload  # noqa: F821
 
 active_dcc_is_maya = "maya" in os.path.basename(sys.executable)
 
-if active_dcc_is_maya:
-    from . import exception_dialog_dcc_maya as dcc_module
+dcc = None  # type: exception_dialog_dcc_core.ExceptionDialogCoreInterface
 
-    dcc = dcc_module.ExceptionDialogMaya()
-else:
-    from . import exception_dialog_dcc_core as dcc_module
 
-    dcc = dcc_module.ExceptionDialogCoreInterface()
+def get_dcc():
+    """The DCC backend is only decided when it's first needed, to keep the import of this module cheap"""
+    global dcc
+    if dcc is None:
+        if active_dcc_is_maya:
+            from . import exception_dialog_dcc_maya as dcc_module
+
+            dcc = dcc_module.ExceptionDialogMaya()
+        else:
+            from . import exception_dialog_dcc_core as dcc_module
+
+            dcc = dcc_module.ExceptionDialogCoreInterface()
+    return dcc
 
 
 class ExceptionDialogConstants:
     extension_file_prefix = "exception_dialog_ext"
 
+    # "scan" looks through sys.path (cached per folder in the discovery index)
+    # "entry_points" only imports modules registered under the entry point group below
+    extension_discovery_mode = os.environ.get("EXCEPTION_DIALOG_DISCOVERY_MODE", "scan")
+    extension_entry_point_group = "exception_dialog.extensions"
+
+    # comma separated list of extension modules, skips discovery entirely when set
+    extension_modules_env_var = "EXCEPTION_DIALOG_EXTENSIONS"
+
+    # repeats of the same exception within this many seconds are collapsed into one entry
+    coalesce_window = 5.0
+    coalesce_max_fingerprints = 1000
+
+    # max amount of exception records kept in the dialog history
+    history_max_records = 1000
+    ui_update_interval_ms = 50
+    search_delay_ms = 150  # the history is filtered once typing in the search fields pauses this long
+
+    # reports of the delivery actions are kept here until their endpoint accepted them, see exception_dialog_delivery
+    delivery_spool_path = os.environ.get(
+        "EXCEPTION_DIALOG_SPOOL",
+        os.path.join(os.path.expanduser("~"), ".exception_dialog", "spool"),
+    )
+
+    # local database of every exception, see exception_dialog_store
+    store_enabled = True
+    store_path = os.environ.get(
+        "EXCEPTION_DIALOG_STORE",
+        os.path.join(os.path.expanduser("~"), ".exception_dialog", "exceptions.db"),
+    )
+
+    # stream records to the machine wide aggregator process (which writes the store) instead of writing the store directly
+    aggregator_enabled = os.environ.get("EXCEPTION_DIALOG_USE_AGGREGATOR", "0") == "1"
+    aggregator_address = None  # defaults to exception_dialog_aggregator.get_default_address()
+
+    # without a UI (batch mode, farm jobs) exceptions are written to a json lines file instead of shown in the dialog
+    headless_enabled = os.environ.get("EXCEPTION_DIALOG_HEADLESS", "1") == "1"
+    # {host} and {pid} are filled in when the log is created, so every process (forked ones too) gets its own file
+    headless_log_path = os.path.join(
+        os.environ.get("EXCEPTION_DIALOG_HEADLESS_DIR", os.path.join(os.path.expanduser("~"), ".exception_dialog", "logs")),
+        "exceptions_{host}_{pid}.jsonl",
+    )
+    headless_log_max_bytes = 10 * 1024 * 1024
+    headless_log_backup_count = 3
+    # log files of earlier processes on this host are removed past this count or age
+    headless_log_max_old_files = 50
+    headless_log_max_old_file_age = 7 * 24 * 60 * 60  # seconds
+
+    # exceptions reported through logging, see exception_dialog_logging
+    logging_level = logging.ERROR
+    logging_queue_size = 1000
+
+    # periodically write the hook metrics to this file, as prometheus text ("prometheus") or a json snapshot ("json")
+    metrics_export_path = os.environ.get("EXCEPTION_DIALOG_METRICS_PATH")
+    metrics_export_format = os.environ.get("EXCEPTION_DIALOG_METRICS_FORMAT", "prometheus")
+    metrics_export_interval = 60.0
+
+    # token bucket rates (records per second) for what reaches the automatic actions and storage
+    sampling_enabled = True
+    sampling_rate = 1.0
+    sampling_burst = 5
+    sampling_global_rate = 20.0
+    sampling_global_burst = 50
+    sampling_reservoir_size = 5
+    sampling_flush_interval = 1.0  # seconds between passing on the skipped counts as repeats
+
+    # json file with suppression and routing rules, see exception_dialog_rules
+    rules_path = os.environ.get(
+        "EXCEPTION_DIALOG_RULES",
+        os.path.join(os.path.expanduser("~"), ".exception_dialog", "rules.json"),
+    )
+
+    # clear the locals of the traceback frames once the exception has been reported,
+    # so the dialog doesn't keep scene data alive through sys.last_traceback and friends.
+    # checked on every hook call, set to False (or EXCEPTION_DIALOG_RELEASE_FRAMES=0) to debug with pdb.pm()
+    release_exception_frames = os.environ.get("EXCEPTION_DIALOG_RELEASE_FRAMES", "1") == "1"
+
+    # store a summary of the locals of each frame in the exception record, see exception_dialog_locals
+    capture_locals = False
+    locals_max_per_frame = 50
+    locals_max_children = 10  # items of lists / dicts that get a summary of their own
+    locals_max_repr_length = 200
+    locals_frame_time_budget = 0.002  # seconds
+    locals_total_time_budget = 0.01  # seconds, for all frames of one exception
+
+    # automatic actions run on background threads, see exception_dialog_dispatcher.QueuePolicy for the policies
+    action_worker_count = 2
+    action_queue_size = 256
+    action_queue_policy = "drop_oldest"
+    action_flush_timeout = 5.0  # seconds to wait for queued actions when the process exits
+
+    # environment context (python, modules, sys.path, env vars, DCC) is taken once per session,
+    # records only hold what changed since, see exception_dialog_dcc_core.ContextSnapshot
+    context_enabled = True
+
+    discovery_index_path = os.environ.get(
+        "EXCEPTION_DIALOG_DISCOVERY_INDEX",
+        os.path.join(os.path.expanduser("~"), ".exception_dialog", "discovery_index.json"),
+    )
+
 
 class SessionInfo:
     disable_until_this_time = None
     disabled_for_this_session = False
 
+    # time spent (in seconds) in startup() and in loading the extensions + UI
+    startup_duration = None
+    load_duration = None
+
 
 class ExceptionHookHandler(object):
     previous_except_hook = None
     previous_dcc_except_hook = None
+    previous_threading_except_hook = None
 
     dialog_instance = None
+    action_dispatcher = None  # type: exception_dialog_dispatcher.ActionDispatcher
+    exception_store = None  # type: exception_dialog_store.ExceptionStore
+    aggregator_client = None  # type: exception_dialog_aggregator.AggregatorClient
+
+    is_loaded = False
+    is_load_pending = False  # queued onto the main thread, for an exception on another thread
+    load_lock = threading.RLock()
+    is_headless = False
+    # the UI module makes the Qt objects that hand records over to the main thread, so it's only imported there.
+    # not the same as is_loaded, the hooks registered without lazy loading are loaded before the UI is imported
+    is_ui_imported = False
+    headless_sink = None  # type: exception_dialog_headless.JsonLinesSink
+    metrics_exporter = None  # type: exception_dialog_metrics.MetricsExporter
+    rule_engine = None  # type: exception_dialog_rules.RuleEngine
+    sampler = None  # type: exception_dialog_sampling.AdaptiveSampler
+    sampling_flusher = None  # type: exception_dialog_sampling.SkippedCountFlusher
+    context_snapshot = None  # type: exception_dialog_dcc_core.ContextSnapshot
+
+    # the only record that keeps its (exc_type, exc_value, exc_trace), for the buttons of legacy actions
+    exc_info_record = None  # type: ExceptionRecord
+    exc_info_lock = threading.Lock()
+
+    # records from other threads, waiting to be added to the dialog on the main thread
+    main_thread_records = collections.deque()
+    has_main_thread_repeats = False
+    is_main_thread_drain_pending = False
 
 
 hook_cls = ExceptionHookHandler()
 lk = ExceptionDialogConstants
 
 
+def get_exception_fingerprint(exc_type, exc_trace):
+    """Hash of the exception type and the (file, function, line) of every frame in the traceback"""
+    fingerprint_parts = ["{}.{}".format(getattr(exc_type, "__module__", ""), getattr(exc_type, "__name__", exc_type))]
+
+    tb = exc_trace
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        fingerprint_parts.append("{}:{}:{}".format(os.path.normcase(code.co_filename), code.co_name, tb.tb_lineno))
+        tb = tb.tb_next
+
+    return hashlib.sha1("|".join(fingerprint_parts).encode("utf-8")).hexdigest()[:16]
+
+
+class ExceptionOccurrence(object):
+    def __init__(self, fingerprint, timestamp):
+        self.fingerprint = fingerprint
+        self.count = 1
+        self.first_time = timestamp
+        self.last_time = timestamp
+        self.sampling_key = None  # set when the sampler skipped the record of this occurrence
+
+
+class ExceptionCoalescer(object):
+    """Collapses repeats of the same fingerprint within a time window into a single occurrence"""
+
+    def __init__(self, window=None, max_fingerprints=None):
+        self.window = lk.coalesce_window if window is None else window
+        self.max_fingerprints = max_fingerprints or lk.coalesce_max_fingerprints
+        self.occurrences = {}
+        self._lock = threading.Lock()  # exceptions can come in on any thread
+
+    def add(self, fingerprint, timestamp=None):
+        """returns the occurrence for this fingerprint, and whether it's a new one"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            occurrence = self.occurrences.get(fingerprint)
+            if occurrence is not None and timestamp - occurrence.first_time < self.window:
+                occurrence.count += 1
+                occurrence.last_time = timestamp
+                return occurrence, False
+
+            if len(self.occurrences) >= self.max_fingerprints:
+                self.prune(timestamp)
+
+            occurrence = ExceptionOccurrence(fingerprint, timestamp)
+            self.occurrences[fingerprint] = occurrence
+            return occurrence, True
+
+    def prune(self, timestamp):
+        """Called by add, with the lock held"""
+        expired_fingerprints = [
+            fingerprint for fingerprint, occurrence in self.occurrences.items()
+            if timestamp - occurrence.first_time >= self.window
+        ]
+        for fingerprint in expired_fingerprints:
+            del self.occurrences[fingerprint]
+
+        # still full, everything is within the window, so drop the oldest ones
+        if len(self.occurrences) >= self.max_fingerprints:
+            by_age = sorted(self.occurrences.values(), key=lambda occ: occ.first_time)
+            for occurrence in by_age[:len(by_age) // 2]:
+                del self.occurrences[occurrence.fingerprint]
+
+
+coalescer = ExceptionCoalescer()
+
+
+class ExceptionRecord(object):
+    """
+    Frame-free summary of an exception, safe to keep around without pinning scene memory.
+
+    Only the file, line number and function of each frame are captured,
+    the source lines and the traceback text are filled in when they're first needed.
+    """
+
+    def __init__(self, exc_type_name, message, text=None, frames=None, frame_locals=None,
+                 exc_module="", occurrence=None, timestamp=None, exception_lines=None, chained_exceptions=None):
+        self.exc_type_name = exc_type_name
+        self.exc_module = exc_module
+        self.message = message
+        self.frames = frames or []  # (file path, line number, function name, source line or None)
+        self.exception_lines = exception_lines or []  # from traceback.format_exception_only
+        self.chained_exceptions = chained_exceptions or []  # (frames, exception lines, chain message), outermost first
+        self.frame_locals = frame_locals  # list of LocalValue per frame, if capture_locals is enabled
+        self.occurrence = occurrence  # type: ExceptionOccurrence
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.skipped_count = 0  # similar records that the sampler skipped before this one
+        self.context_id = None  # environment context snapshot this record refers to
+        self.context_delta = None  # what changed in the environment since that snapshot
+        # (type, value, traceback), only kept while actions with the old trigger_action arguments are registered
+        self.exc_info = None
+
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = format_record_text(self)
+        return self._text
+
+    def get_source_frames(self):
+        """frames with their source lines looked up"""
+        if any(frame[3] is None for frame in self.frames):
+            self.frames = get_source_frames(self.frames)
+        return self.frames
+
+    def get_source_data(self):
+        """The parts of to_dict that need source files to be read"""
+        return {
+            "text": self.text,
+            "frames": [list(frame) for frame in self.get_source_frames()],
+        }
+
+    @property
+    def count(self):
+        return self.occurrence.count if self.occurrence else 1
+
+    @property
+    def fingerprint(self):
+        return self.occurrence.fingerprint if self.occurrence else None
+
+    def to_dict(self, include_source=True):
+        """
+        json compatible dict, for storing or sending the record.
+
+        include_source: False leaves out the traceback text and source lines, they can be added with get_source_data
+        on a background thread, to keep file reads off the exception path.
+        """
+        record_data = {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "last_time": self.occurrence.last_time if self.occurrence else self.timestamp,
+            "timestamp": self.timestamp,
+            "exc_type_name": self.exc_type_name,
+            "exc_module": self.exc_module,
+            "message": self.message,
+            "frames": [list(frame) for frame in self.frames],
+            "frame_locals": [
+                [local_value.to_dict() for local_value in local_values] for local_values in self.frame_locals
+            ] if self.frame_locals is not None else None,
+            "skipped_count": self.skipped_count,
+            "context_id": self.context_id,
+            "context_delta": self.context_delta,
+        }
+        if include_source:
+            record_data.update(self.get_source_data())
+        return record_data
+
+    @classmethod
+    def from_dict(cls, record_data):
+        occurrence = None
+        if record_data.get("fingerprint"):
+            occurrence = ExceptionOccurrence(record_data["fingerprint"], record_data["timestamp"])
+            occurrence.count = record_data.get("count", 1)
+            occurrence.last_time = record_data.get("last_time", record_data["timestamp"])
+
+        frame_locals = None
+        if record_data.get("frame_locals") is not None:
+            from . import exception_dialog_locals
+            frame_locals = [
+                [exception_dialog_locals.LocalValue.from_dict(value_data) for value_data in local_values]
+                for local_values in record_data["frame_locals"]
+            ]
+
+        exc_record = cls(
+            exc_type_name=record_data["exc_type_name"],
+            exc_module=record_data.get("exc_module", ""),
+            message=record_data.get("message", ""),
+            text=record_data.get("text") or "",
+            frames=[tuple(frame) for frame in record_data.get("frames", [])],
+            frame_locals=frame_locals,
+            occurrence=occurrence,
+            timestamp=record_data["timestamp"],
+        )
+        exc_record.skipped_count = record_data.get("skipped_count", 0)
+        exc_record.context_id = record_data.get("context_id")
+        exc_record.context_delta = record_data.get("context_delta")
+        return exc_record
+
+
+CAUSE_MESSAGE = "\nThe above exception was the direct cause of the following exception:\n\n"
+CONTEXT_MESSAGE = "\nDuring handling of the above exception, another exception occurred:\n\n"
+
+
+def extract_frames(exc_trace):
+    """(file path, line number, function name, None) per frame, without reading any source files"""
+    frames = []
+    tb = exc_trace
+    while tb is not None:
+        code = tb.tb_frame.f_code
+        frames.append((code.co_filename, tb.tb_lineno, code.co_name, None))
+        tb = tb.tb_next
+    return frames
+
+
+def get_source_frames(frames):
+    source_cache = exception_dialog_source.source_cache
+    return [
+        (file_path, line_number, function_name, source_cache.get_line(file_path, line_number) if source is None else source)
+        for file_path, line_number, function_name, source in frames
+    ]
+
+
+def get_exception_lines(exc_type, exc_value):
+    try:
+        return traceback.format_exception_only(exc_type, exc_value)
+    except Exception as e:
+        return ["{}: <failed to format exception: {}>\n".format(getattr(exc_type, "__name__", exc_type), e)]
+
+
+def capture_chained_exceptions(exc_value):
+    """The causes and contexts that lead up to the exception (python 3 only), outermost first"""
+    chained_exceptions = []
+    seen_ids = set([id(exc_value)])
+
+    while exc_value is not None:
+        if getattr(exc_value, "__cause__", None) is not None:
+            exc_value, chain_message = exc_value.__cause__, CAUSE_MESSAGE
+        elif getattr(exc_value, "__context__", None) is not None and not getattr(exc_value, "__suppress_context__", False):
+            exc_value, chain_message = exc_value.__context__, CONTEXT_MESSAGE
+        else:
+            break
+
+        if id(exc_value) in seen_ids:
+            break
+        seen_ids.add(id(exc_value))
+
+        chained_exceptions.append((
+            extract_frames(exc_value.__traceback__),
+            get_exception_lines(type(exc_value), exc_value),
+            chain_message,
+        ))
+
+    chained_exceptions.reverse()
+    return chained_exceptions
+
+
+def format_traceback_lines(frames, exception_lines):
+    lines = []
+    if frames:
+        lines.append("Traceback (most recent call last):\n")
+        for file_path, line_number, function_name, source in get_source_frames(frames):
+            lines.append('  File "{}", line {}, in {}\n'.format(file_path, line_number, function_name))
+            if source:
+                lines.append("    {}\n".format(source))
+    lines.extend(exception_lines)
+    return lines
+
+
+def format_record_text(exc_record):
+    """Same layout as traceback.format_exception, with the source lines from the shared source cache"""
+    lines = ["--- Exception at: {}\n".format(time.strftime("%H:%M:%S", time.localtime(exc_record.timestamp)))]
+    for frames, exception_lines, chain_message in exc_record.chained_exceptions:
+        lines.extend(format_traceback_lines(frames, exception_lines))
+        lines.append(chain_message)
+    lines.extend(format_traceback_lines(exc_record.get_source_frames(), exc_record.exception_lines))
+    return "".join(lines)
+
+
+def capture_exception(exc_type, exc_value, exc_trace, occurrence=None):
+    """Record of the exception, nothing is formatted and no source files are read here"""
+    timestamp = occurrence.first_time if occurrence else time.time()
+
+    frame_locals = None
+    if lk.capture_locals:
+        from . import exception_dialog_locals
+        frame_locals = exception_dialog_locals.capture_frame_locals(
+            exc_trace,
+            max_locals=lk.locals_max_per_frame,
+            max_children=lk.locals_max_children,
+            max_repr_length=lk.locals_max_repr_length,
+            frame_time_budget=lk.locals_frame_time_budget,
+            total_time_budget=lk.locals_total_time_budget,
+        )
+
+    return ExceptionRecord(
+        exc_type_name=getattr(exc_type, "__name__", str(exc_type)),
+        exc_module=getattr(exc_type, "__module__", ""),
+        message=str(exc_value),
+        frames=extract_frames(exc_trace),
+        exception_lines=get_exception_lines(exc_type, exc_value),
+        chained_exceptions=capture_chained_exceptions(exc_value),
+        frame_locals=frame_locals,
+        occurrence=occurrence,
+        timestamp=timestamp,
+    )
+
+
+def is_interactive_session():
+    return hasattr(sys, "ps1") or bool(getattr(sys.flags, "interactive", False))
+
+
+def release_exception_frames(exc_type=None, exc_value=None, exc_trace=None, *args, **kwargs):
+    if not lk.release_exception_frames:
+        return
+
+    if exc_trace is None and exc_value is not None:
+        exc_trace = getattr(exc_value, "__traceback__", None)
+
+    # pdb.pm() debugs sys.last_traceback, so its locals are kept in an interactive interpreter
+    if exc_trace is not None and exc_trace is getattr(sys, "last_traceback", None) and is_interactive_session():
+        return
+
+    # python 2 has no way to clear frames, they're freed when the last traceback reference goes away
+    if exc_trace is not None and hasattr(traceback, "clear_frames"):
+        traceback.clear_frames(exc_trace)
+
+
+class RecordRingBuffer(object):
+    """Fixed size buffer, appending to a full buffer overwrites the oldest item"""
+
+    def __init__(self, max_size):
+        self.max_size = max(1, max_size)
+        self.items = [None] * self.max_size
+        self.start = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("record index out of range")
+        return self.items[(self.start + index) % self.max_size]
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self.items[(self.start + index) % self.max_size]
+
+    def is_full(self):
+        return self.length == self.max_size
+
+    def append(self, item):
+        """returns the item that was dropped to make room, if any"""
+        dropped_item = None
+        if self.is_full():
+            dropped_item = self.pop_oldest()
+
+        self.items[(self.start + self.length) % self.max_size] = item
+        self.length += 1
+        return dropped_item
+
+    def pop_oldest(self):
+        if not self.length:
+            raise IndexError("pop from empty buffer")
+
+        item = self.items[self.start]
+        self.items[self.start] = None
+        self.start = (self.start + 1) % self.max_size
+        self.length -= 1
+        return item
+
+
 def exception_triggered(exc_type=None, exc_value=None, exc_trace=None, *args, **kwargs):
+    edm.metrics.increment(edm.MetricNames.exceptions_seen)
+
     if SessionInfo.disabled_for_this_session:
+        edm.metrics.increment(edm.MetricNames.exceptions_suppressed)
         return
 
     if SessionInfo.disable_until_this_time and time.time() < SessionInfo.disable_until_this_time:
+        edm.metrics.increment(edm.MetricNames.exceptions_suppressed)
         return
 
     if not any([exc_trace, exc_value, exc_type]):
         exc_type, exc_value, exc_trace = sys.exc_info()
 
+    rule = get_rule_engine().match(exc_type, exc_value, exc_trace) if lk.rules_path else None
+    if rule is not None and rule.action == "suppress":
+        edm.metrics.increment(edm.MetricNames.exceptions_suppressed)
+        return
+
+    # repeats only bump the counter of the existing occurrence, no formatting
+    occurrence, is_new = coalescer.add(get_exception_fingerprint(exc_type, exc_trace))
+    if not is_new:
+        edm.metrics.increment(edm.MetricNames.exceptions_deduplicated)
+        if occurrence.sampling_key is not None:
+            # the record wasn't passed on, so the sampler holds on to the repeats like it does to the skipped records
+            get_sampler().add_skipped_repeat(occurrence.sampling_key, occurrence.fingerprint, occurrence.last_time)
+        else:
+            if hook_cls.is_headless:
+                get_headless_sink().add_repeat(occurrence)
+            if lk.aggregator_enabled:
+                get_aggregator_client().send_repeat(occurrence)
+            elif lk.store_enabled and not hook_cls.is_headless:
+                get_exception_store().add_repeat(occurrence)
+        if hook_cls.dialog_instance is not None:
+            update_dialog()
+        return
+
+    start_time = edm.timer()
+    record = capture_exception(exc_type, exc_value, exc_trace, occurrence)
+    context_snapshot = None
+    if lk.context_enabled:
+        context_snapshot = get_context_snapshot()
+        record.context_id = context_snapshot.context_id
+        record.context_delta = context_snapshot.get_delta()
+    edm.metrics.observe(edm.MetricNames.format_time, edm.timer() - start_time)
+
+    if action_registry.legacy_actions:
+        record.exc_info = (exc_type, exc_value, exc_trace)
+
+    # only a bounded rate of records reaches the automatic actions and storage, the dialog still shows all of them
+    is_sampled = not lk.sampling_enabled or get_sampler().sample(record)
+
+    start_time = edm.timer()
+    if hook_cls.is_headless:
+        if is_sampled:
+            get_headless_sink().write_record(record, context_snapshot)
+    elif rule is None or rule.action != "silent":
+        update_dialog(record)
+    edm.metrics.observe(edm.MetricNames.ui_update_time, edm.timer() - start_time)
+
+    if not is_sampled:
+        edm.metrics.increment(edm.MetricNames.exceptions_sampled_out)
+        keep_latest_exc_info(record)
+        return
+
+    # headless sessions are often farm jobs, which shouldn't all write to the same database directly
+    if lk.aggregator_enabled:
+        get_aggregator_client().send_record(record, context_snapshot)
+    elif lk.store_enabled and not hook_cls.is_headless:
+        get_exception_store().add_record(record, context_snapshot=context_snapshot)
+
+    for action_cls in action_registry.automatic_actions:
+        trigger_automatic_action(action_cls, record)
+
+    keep_latest_exc_info(record)
+
+
+def keep_latest_exc_info(record):
+    """
+    The automatic legacy actions have run with the exc_info of this record, only the latest record keeps it
+    after that, so the history and the sampler don't pin the exceptions and tracebacks of older records
+    """
+    if record.exc_info is None:
+        return
+
+    with hook_cls.exc_info_lock:
+        previous_record, hook_cls.exc_info_record = hook_cls.exc_info_record, record
+    if previous_record is not None and previous_record is not record:
+        previous_record.exc_info = None
+
+
+def get_sampler():
+    if hook_cls.sampler is None:
+        from . import exception_dialog_sampling
+
+        hook_cls.sampler = exception_dialog_sampling.AdaptiveSampler(
+            rate=lk.sampling_rate,
+            burst=lk.sampling_burst,
+            global_rate=lk.sampling_global_rate,
+            global_burst=lk.sampling_global_burst,
+            reservoir_size=lk.sampling_reservoir_size,
+        )
+
+        # the skipped records are added to the stored counts as repeats, with whatever is left over at exit
+        hook_cls.sampling_flusher = exception_dialog_sampling.SkippedCountFlusher(
+            hook_cls.sampler, add_repeat_counts, interval=lk.sampling_flush_interval)
+        hook_cls.sampling_flusher.start()
+        atexit.register(flush_skipped_counts)
+    return hook_cls.sampler
+
+
+def add_repeat_counts(repeat_counts):
+    """Add {fingerprint: (count, last time)} to the counts wherever the records of this session are written"""
+    for fingerprint, (count, last_time) in repeat_counts.items():
+        if hook_cls.is_headless:
+            get_headless_sink().add_repeat_count(fingerprint, last_time, count)
+        if lk.aggregator_enabled:
+            get_aggregator_client().send_repeat_count(fingerprint, last_time, count)
+        elif lk.store_enabled and not hook_cls.is_headless:
+            get_exception_store().add_repeat_count(fingerprint, last_time, count)
+
+
+def flush_skipped_counts(timeout=5.0):
+    """Pass on the counts the sampler skipped since the last flush interval and wait for them to be written, at exit"""
+    if hook_cls.sampling_flusher is None:
+        return
+
+    try:
+        hook_cls.sampling_flusher.stop()
+        hook_cls.sampling_flusher.flush()
+    except Exception:
+        traceback.print_exc()
+        return
+
+    # the atexit flush of these might have run already
+    for writer in (hook_cls.headless_sink, hook_cls.aggregator_client, hook_cls.exception_store):
+        if writer is not None:
+            writer.flush(timeout)
+
+
+def get_rule_engine():
+    if hook_cls.rule_engine is None:
+        from . import exception_dialog_rules
+
+        dcc_name = "maya" if active_dcc_is_maya else "python"
+        hook_cls.rule_engine = exception_dialog_rules.RuleEngine(lk.rules_path, dcc_name=dcc_name)
+    return hook_cls.rule_engine
+
+
+def get_metrics():
+    """Snapshot of the exception hook counters and latency histograms"""
+    return edm.metrics.snapshot()
+
+
+def start_metrics_export():
+    if hook_cls.metrics_exporter is None and lk.metrics_export_path:
+        hook_cls.metrics_exporter = edm.MetricsExporter(
+            edm.metrics,
+            lk.metrics_export_path,
+            interval=lk.metrics_export_interval,
+            export_format=lk.metrics_export_format,
+        )
+        hook_cls.metrics_exporter.start()
+    return hook_cls.metrics_exporter
+
+
+def get_dialog_window():
+    """The window is built once and then shown / hidden, instead of being rebuilt for every exception"""
     win = hook_cls.dialog_instance
-    if win is None or not win.isVisible():
+    if win is None:
         from . import exception_dialog_ui
+        hook_cls.is_ui_imported = True
 
-        win = exception_dialog_ui.main()  # type: exception_dialog_ui.ExceptionDialogWindow
+        win = exception_dialog_ui.build_window()  # type: exception_dialog_ui.ExceptionDialogWindow
         hook_cls.dialog_instance = win
+    return win
+
+
+def show_dialog_window():
+    win = get_dialog_window()
+    if not win.isVisible():
+        win.main()
+    return win
+
+
+def is_main_thread():
+    if hasattr(threading, "main_thread"):
+        return threading.current_thread() is threading.main_thread()
+    return isinstance(threading.current_thread(), threading._MainThread)
+
+
+def update_dialog(record=None):
+    """
+    Add the record to the dialog, or refresh the repeat counters when there's no record.
+
+    Qt widgets can only be touched from the main thread, so from other threads the record
+    is queued and handed to the main thread through a queued signal.
+    """
+    if is_main_thread():
+        if record is None:
+            hook_cls.dialog_instance.mark_records_updated()
+        else:
+            show_dialog_window().set_latest_exception(record)
+        return
+
+    if record is None:
+        hook_cls.has_main_thread_repeats = True
+    else:
+        hook_cls.main_thread_records.append(record)
+
+    if not hook_cls.is_ui_imported:
+        # the UI module can't be imported here, the queued records are shown once it's loaded on the main thread
+        request_main_thread_load()
+        return
+
+    if not hook_cls.is_main_thread_drain_pending:
+        hook_cls.is_main_thread_drain_pending = True
+
+        from . import exception_dialog_ui
+        exception_dialog_ui.invoke_in_main_thread(drain_main_thread_records)
+
+
+def drain_main_thread_records():
+    hook_cls.is_main_thread_drain_pending = False
+
+    while hook_cls.main_thread_records:
+        show_dialog_window().set_latest_exception(hook_cls.main_thread_records.popleft())
+
+    if hook_cls.has_main_thread_repeats:
+        hook_cls.has_main_thread_repeats = False
+        if hook_cls.dialog_instance is not None:
+            hook_cls.dialog_instance.mark_records_updated()
+
+
+def prewarm_dialog_window():
+    """Build the (hidden) window ahead of the first exception"""
+    load_exception_dialog()
+    get_dialog_window()
+
+
+def get_headless_sink():
+    # a forked child doesn't have the writer thread of its parent's sink, and gets a log file of its own
+    if hook_cls.headless_sink is None or hook_cls.headless_sink.pid != os.getpid():
+        from . import exception_dialog_headless
+
+        hook_cls.headless_sink = exception_dialog_headless.create_sink(
+            lk.headless_log_path,
+            max_bytes=lk.headless_log_max_bytes,
+            backup_count=lk.headless_log_backup_count,
+            max_old_files=lk.headless_log_max_old_files,
+            max_old_file_age=lk.headless_log_max_old_file_age,
+        )
+    return hook_cls.headless_sink
+
+
+def get_context_snapshot():
+    if hook_cls.context_snapshot is None:
+        from . import exception_dialog_dcc_core
+
+        hook_cls.context_snapshot = exception_dialog_dcc_core.ContextSnapshot(get_dcc().get_context_providers())
+    elif hook_cls.context_snapshot.unavailable_names and is_main_thread():
+        # taken for an exception on another thread, the DCC parts of it can only be taken on the main thread
+        hook_cls.context_snapshot = hook_cls.context_snapshot.retake()
+    return hook_cls.context_snapshot
+
+
+def get_exception_store():
+    if hook_cls.exception_store is None:
+        from . import exception_dialog_store
+
+        hook_cls.exception_store = exception_dialog_store.create_store(lk.store_path)
+    return hook_cls.exception_store
 
-    win.set_latest_exception(exc_type, exc_value, exc_trace)
 
-    for action_cls in get_exception_action_classes():
-        if action_cls.is_automatic:
-            action_cls.trigger_action(exc_type, exc_value, exc_trace)
+def get_aggregator_client():
+    if hook_cls.aggregator_client is None:
+        from . import exception_dialog_aggregator
 
+        hook_cls.aggregator_client = exception_dialog_aggregator.AggregatorClient(lk.aggregator_address)
+    return hook_cls.aggregator_client
+
+
+def get_action_dispatcher():
+    if hook_cls.action_dispatcher is None:
+        from . import exception_dialog_dispatcher
+
+        hook_cls.action_dispatcher = exception_dialog_dispatcher.create_dispatcher(
+            worker_count=lk.action_worker_count,
+            queue_size=lk.action_queue_size,
+            policy=lk.action_queue_policy,
+            flush_timeout=lk.action_flush_timeout,
+        )
+    return hook_cls.action_dispatcher
+
+
+def trigger_automatic_action(action_cls, exc_record):
+    # actions with the old arguments get the real traceback, so they have to run before the frames are released
+    if action_cls.run_on_worker and action_cls not in action_registry.legacy_actions:
+        get_action_dispatcher().submit(action_cls, exc_record)  # counts the jobs it drops
+    else:
+        start_time = edm.timer()
+        call_trigger_action(action_cls, exc_record)
+        edm.metrics.observe_action(action_cls, edm.timer() - start_time)
+
+
+def call_trigger_action(action_cls, exc_record):
+    """Call the action with the record, or with (exc_type, exc_value, exc_trace) for actions that still take those"""
+    if action_cls not in action_registry.legacy_actions:
+        return action_cls.trigger_action(exc_record)
+
+    if exc_record.exc_info is None:
+        logging.warning("{} takes the exception traceback, which isn't available for this record".format(action_cls.__name__))
+        return None
+    return action_cls.trigger_action(*exc_record.exc_info)
+
+
+def get_positional_arg_count(func):
+    try:
+        if hasattr(inspect, "signature"):
+            parameters = inspect.signature(func).parameters.values()
+            return len([
+                parameter for parameter in parameters
+                if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD)
+            ])
+
+        arg_count = len(inspect.getargspec(func).args)
+        if inspect.ismethod(func) and func.__self__ is not None:
+            arg_count -= 1  # classmethod
+        return arg_count
+    except (TypeError, ValueError):
+        return 1
+
+
+def uses_legacy_arguments(action_cls):
+    """trigger_action overrides from before ExceptionRecord take (exc_type, exc_value, exc_trace)"""
+    return get_positional_arg_count(action_cls.trigger_action) >= 3
+
+
+class ExceptionActionRegistry(object):
+    """
+    Every subclass of BaseExceptionAction, registered when the class is defined.
+
+    The automatic and button actions are split into tuples up front, so the exception hook just loops over them.
+    """
+
+    def __init__(self):
+        self.action_classes = []
+        self.all_actions = ()
+        self.automatic_actions = ()
+        self.button_actions = ()
+        self.legacy_actions = frozenset()  # trigger_action takes (exc_type, exc_value, exc_trace)
+
+        # while a module is reloaded, its classes are collected here and only swapped in once it imported fine
+        self.staged_classes = None
+
+    def register(self, action_cls):
+        # abstract base classes only set the flag in their own class body, so it isn't inherited
+        if action_cls.__dict__.get("is_abstract", False):
+            return
+
+        if uses_legacy_arguments(action_cls):
+            warnings.warn(
+                "{}.trigger_action takes (exc_type, exc_value, exc_trace), "
+                "override it as trigger_action(exc_record) instead".format(action_cls.__name__),
+                DeprecationWarning,
+                stacklevel=3,  # the class statement
+            )
+
+        if self.staged_classes is not None:
+            self.staged_classes.append(action_cls)
+            return
+
+        action_key = get_action_key(action_cls)
+        action_classes = [cls for cls in self.action_classes if get_action_key(cls) != action_key]
+        action_classes.append(action_cls)
+        self.set_action_classes(action_classes)
+
+    def begin_staging(self):
+        self.staged_classes = []
+
+    def commit_staged(self, module_names):
+        """Replace every action class of these modules with the staged classes, in one swap"""
+        staged_classes, self.staged_classes = self.staged_classes or [], None
+
+        staged_keys = set(get_action_key(cls) for cls in staged_classes)
+        action_classes = [
+            cls for cls in self.action_classes
+            if cls.__module__ not in module_names and get_action_key(cls) not in staged_keys
+        ]
+        self.set_action_classes(action_classes + staged_classes)
+
+    def discard_staged(self):
+        self.staged_classes = None
+
+    def set_action_classes(self, action_classes):
+        self.action_classes = action_classes
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the cached lists, for when is_automatic or show_button get changed after class definition"""
+        # each list is built before it's assigned, so the exception hook never sees a half built one
+        self.all_actions = tuple(self.action_classes)
+        self.automatic_actions = tuple(cls for cls in self.action_classes if cls.is_automatic)
+        self.button_actions = tuple(cls for cls in self.action_classes if not cls.is_automatic and cls.show_button)
+        self.legacy_actions = frozenset(cls for cls in self.action_classes if uses_legacy_arguments(cls))
+
+
+def get_action_key(action_cls):
+    return action_cls.__module__, action_cls.__name__
+
+
+action_registry = ExceptionActionRegistry()
+
+
+class ExceptionActionMeta(type):
+    def __init__(cls, name, bases, attrs):
+        super(ExceptionActionMeta, cls).__init__(name, bases, attrs)
+        action_registry.register(cls)
+
+
+# python 2 and 3 compatible way of using a metaclass
+_ExceptionActionBase = ExceptionActionMeta("_ExceptionActionBase", (object,), {"is_abstract": True})
+
+
+class BaseExceptionAction(_ExceptionActionBase):
+    is_abstract = True
 
-class BaseExceptionAction(object):
     label = "[EXAMPLE]"
     icon_name = "default_icon"
     is_automatic = False
     show_button = True
     tool_tip = ""
 
+    # run automatic triggers of this action on a background thread. only for actions that are thread safe,
+    # so no maya.cmds or Qt, they run on the thread that raised the exception by default
+    run_on_worker = False
+    timeout = None  # seconds before a background run of this action is given up on
+
     @staticmethod
-    def trigger_action(exc_type, exc_value, exc_trace):
+    def trigger_action(exc_record):
+        """
+        exc_record: ExceptionRecord with the traceback as text and frame summaries, the real frames are not kept
+        """
         logging.warning("trigger_action needs implementation for this class")
 
 
 class AutomaticExceptionAction(BaseExceptionAction):
+    is_abstract = True
     is_automatic = True
 
     @staticmethod
-    def trigger_action(exc_type, exc_value, exc_trace):
+    def trigger_action(exc_record):
         pass
 
 
-class SlackExceptionAction(BaseExceptionAction):
+class DeliveryExceptionAction(BaseExceptionAction):
+    """
+    Sends a report of the exception to a delivery endpoint, see exception_dialog_delivery.register_endpoint
+
+    The report is spooled to disk and sent in the background, so a slow or unreachable endpoint never blocks this.
+    """
+    is_abstract = True
+    endpoint_name = None
+    run_on_worker = True  # only spools the report, which is safe on any thread
+    include_context = True  # add the environment context to the first report that refers to it
+
+    @classmethod
+    def get_report(cls, exc_record):
+        """json compatible report of the exception, sent to the endpoint"""
+        return exc_record.to_dict()
+
+    @classmethod
+    def get_endpoint_options(cls):
+        """Endpoint arguments the reports of this action need, register_endpoint uses them unless they're passed"""
+        return {}
+
+    @classmethod
+    def trigger_action(cls, exc_record):
+        from . import exception_dialog_delivery
+
+        delivery = exception_dialog_delivery.get_delivery(cls.endpoint_name)
+        if delivery is None:
+            logging.warning("No '{}' delivery endpoint registered for {}".format(cls.endpoint_name, cls.__name__))
+            return
+
+        report = cls.get_report(exc_record)
+        context_snapshot = hook_cls.context_snapshot
+        if (cls.include_context and context_snapshot is not None and exc_record.context_id == context_snapshot.context_id
+                and delivery.add_context_id(context_snapshot.context_id)):
+            report["context"] = context_snapshot.to_dict()
+        delivery.deliver(report)
+
+
+class SlackExceptionAction(DeliveryExceptionAction):
     label = "Get Help in Slack"
     icon_name = "slack_icon"
     show_button = False
+    endpoint_name = "slack"
+    include_context = False  # webhook messages only have the text
+
+    @classmethod
+    def get_report(cls, exc_record):
+        return {"text": "```{}```".format(exc_record.text)}
 
+    @classmethod
+    def format_batch(cls, reports):
+        return {"text": "\n".join(report["text"] for report in reports)}
 
-class JiraExceptionAction(BaseExceptionAction):
+    @classmethod
+    def get_endpoint_options(cls):
+        # webhooks take one uncompressed {"text": ...} message per request, they reject gzip and {"reports": [...]}
+        return {"format_batch": cls.format_batch, "compress": False, "batch_size": 1}
+
+
+class JiraExceptionAction(DeliveryExceptionAction):
     label = "Create Jira"
     icon_name = "jira_icon"
     show_button = False
+    endpoint_name = "jira"
+
+    @classmethod
+    def get_report(cls, exc_record):
+        return {
+            "summary": "{}: {}".format(exc_record.exc_type_name, exc_record.message.split("\n", 1)[0])[:250],
+            "description": exc_record.text,
+            "fingerprint": exc_record.fingerprint,
+            "context_id": exc_record.context_id,
+            "context_delta": exc_record.context_delta,
+        }
 
 
 def get_exception_action_classes():
-    return BaseExceptionAction.__subclasses__()
+    return action_registry.all_actions
+
+
+def report_exception(*args, **kwargs):
+    """exception_triggered for the hooks, a failure in it must not keep the original hook from running"""
+    try:
+        exception_triggered(*args, **kwargs)
+    except Exception:
+        traceback.print_exc()
 
 
 def dcc_exception_triggered(*args, **kwargs):
-    exception_triggered(*args, **kwargs)
+    report_exception(*args, **kwargs)
 
-    # call original DCC exception hook
-    if hook_cls.previous_dcc_except_hook:
-        return hook_cls.previous_dcc_except_hook(*args, **kwargs)
+    try:
+        # call original DCC exception hook
+        if hook_cls.previous_dcc_except_hook:
+            return hook_cls.previous_dcc_except_hook(*args, **kwargs)
+    finally:
+        release_exception_frames(*args)
 
 
 def normal_exception_triggered(*args, **kwargs):
-    exception_triggered(*args, **kwargs)
+    report_exception(*args, **kwargs)
 
-    # call original exception hook
-    if hook_cls.previous_except_hook:
-        return hook_cls.previous_except_hook(*args, **kwargs)
+    try:
+        # call original exception hook
+        if hook_cls.previous_except_hook:
+            return hook_cls.previous_except_hook(*args, **kwargs)
+    finally:
+        release_exception_frames(*args)
+
+
+def threading_exception_triggered(hook_args):
+    """threading.excepthook, for exceptions in threading.Thread workers"""
+    load_from_hook()
+    report_exception(hook_args.exc_type, hook_args.exc_value, hook_args.exc_traceback)
+
+    try:
+        if hook_cls.previous_threading_except_hook:
+            return hook_cls.previous_threading_except_hook(hook_args)
+    finally:
+        release_exception_frames(hook_args.exc_type, hook_args.exc_value, hook_args.exc_traceback)
+
+
+def install_asyncio_exception_handler(loop=None):
+    """Report exceptions of asyncio tasks and callbacks that nothing else handled"""
+    import asyncio
+
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    previous_handler = loop.get_exception_handler()
+
+    def asyncio_exception_triggered(event_loop, context):
+        exc_value = context.get("exception")
+        if exc_value is not None:
+            load_from_hook()
+            report_exception(type(exc_value), exc_value, exc_value.__traceback__)
+
+        try:
+            if previous_handler:
+                previous_handler(event_loop, context)
+            else:
+                event_loop.default_exception_handler(context)
+        finally:
+            if exc_value is not None:
+                release_exception_frames(type(exc_value), exc_value, exc_value.__traceback__)
+
+    loop.set_exception_handler(asyncio_exception_triggered)
+    return loop
+
+
+def lazy_exception_triggered(*args, **kwargs):
+    load_from_hook()
+    return normal_exception_triggered(*args, **kwargs)
+
+
+def lazy_dcc_exception_triggered(*args, **kwargs):
+    load_from_hook()
+    return dcc_exception_triggered(*args, **kwargs)
+
+
+def load_from_hook():
+    """
+    Load the extensions and the UI for the first exception.
+
+    Importing the UI creates Qt objects, which have to live on the main thread.
+    On other threads the load is queued onto the main thread instead, and their records are shown after it.
+    """
+    if hook_cls.is_loaded and (hook_cls.is_headless or hook_cls.is_ui_imported):
+        return
+
+    if not hook_cls.is_headless and not is_main_thread():
+        request_main_thread_load()
+        return
+
+    try:
+        load_exception_dialog()
+    except Exception:
+        traceback.print_exc()
+
+
+def request_main_thread_load():
+    if hook_cls.is_load_pending:
+        return
+    hook_cls.is_load_pending = True
+
+    # without an idle callback, the next exception on the main thread loads it
+    if not get_dcc().execute_deferred(load_pending_exception_dialog):
+        hook_cls.is_load_pending = False
+
+
+def load_pending_exception_dialog():
+    hook_cls.is_load_pending = False
+    load_from_hook()
+
+
+def load_exception_dialog():
+    """Import the extensions and the UI module, and swap the lazy hooks out for the real ones"""
+    if hook_cls.is_loaded and (hook_cls.is_headless or hook_cls.is_ui_imported):
+        return
+
+    with hook_cls.load_lock:
+        if hook_cls.is_loaded:
+            # registered without the lazy hooks, only the UI module is left to import
+            import_dialog_ui()
+        else:
+            start_time = time.time()
+            import_extensions()
+            import_dialog_ui()
+
+            if sys.excepthook == lazy_exception_triggered:
+                sys.excepthook = normal_exception_triggered
+
+            if hook_cls.previous_dcc_except_hook:
+                # the return value is the lazy hook, the previous DCC hook stays the same
+                get_dcc().register_exception_hook(dcc_exception_triggered)
+
+            SessionInfo.load_duration = time.time() - start_time
+
+            # only once everything is loaded, other threads go straight to the dialog after this
+            hook_cls.is_loaded = True
+
+    # the context of an exception on another thread is missing the parts that are only available on the main thread
+    if lk.context_enabled and hook_cls.context_snapshot is not None and is_main_thread():
+        get_context_snapshot()
+
+    # records from other threads that came in before the dialog was loaded
+    if not hook_cls.is_headless and is_main_thread():
+        if hook_cls.main_thread_records or hook_cls.has_main_thread_repeats:
+            drain_main_thread_records()
+
+
+def import_dialog_ui():
+    """On the main thread only, the UI module makes the Qt objects that other threads hand their records to"""
+    if not hook_cls.is_headless:
+        from . import exception_dialog_ui
+        hook_cls.is_ui_imported = True
 
 
-def register_exception_hook():
-    if sys.excepthook == normal_exception_triggered:
+def register_exception_hook(lazy=False, load_on_idle=False, prewarm=False):
+    if sys.excepthook in (normal_exception_triggered, lazy_exception_triggered):
         print("Exception hook(s) already registered: {} - {}".format(__file__, normal_exception_triggered.__name__))
         return
 
-    if not dcc.ui_available():
+    dcc = get_dcc()
+    is_headless = not dcc.ui_available()
+    if is_headless and not lk.headless_enabled:
         print("Exception hook(s) did not register, due to UI not being available.")
         return
+    hook_cls.is_headless = is_headless
+    start_metrics_export()
+
+    if lazy:
+        except_hook, dcc_except_hook = lazy_exception_triggered, lazy_dcc_exception_triggered
+    else:
+        except_hook, dcc_except_hook = normal_exception_triggered, dcc_exception_triggered
+        hook_cls.is_loaded = True
 
     hook_cls.previous_except_hook = sys.excepthook
-    hook_cls.previous_dcc_except_hook = dcc.register_exception_hook(dcc_exception_triggered)
-    sys.excepthook = normal_exception_triggered
-    print("Registered Exception hook(s): {} - {}".format(__file__, normal_exception_triggered.__name__))
+    hook_cls.previous_dcc_except_hook = dcc.register_exception_hook(dcc_except_hook)
+    sys.excepthook = except_hook
+
+    # python 3.8+
+    if hasattr(threading, "excepthook"):
+        hook_cls.previous_threading_except_hook = threading.excepthook
+        threading.excepthook = threading_exception_triggered
+    print("Registered Exception hook(s): {} - {}{}".format(
+        __file__, except_hook.__name__, " (headless)" if is_headless else ""))
+
+    if prewarm and not is_headless:
+        # the DCC has no idle callback, so build it right away
+        if not dcc.execute_deferred(prewarm_dialog_window):
+            prewarm_dialog_window()
+
+    elif lazy and load_on_idle:
+        dcc.execute_deferred(load_exception_dialog)
 
 
 def unregister_exception_hook():
     if hook_cls.previous_except_hook:
         sys.excepthook = hook_cls.previous_except_hook
     if hook_cls.previous_dcc_except_hook:
-        dcc.unregister_exception_hook(hook_cls.previous_dcc_except_hook)
+        get_dcc().unregister_exception_hook(hook_cls.previous_dcc_except_hook)
+    if hook_cls.previous_threading_except_hook:
+        threading.excepthook = hook_cls.previous_threading_except_hook
+
+    logging_module = sys.modules.get(__package__ + ".exception_dialog_logging")
+    if logging_module is not None:
+        logging_module.uninstall_logging_handler()
     print("Unregistered Exception hook(s)")
 
 
@@ -140,6 +1298,138 @@ def test_exception():
     blargh
 
 
+def write_json_file(file_path, data):
+    exception_dialog_files.write_file_atomic(file_path, json.dumps(data))
+
+
+class ExtensionDiscoveryIndex(object):
+    """
+    Cache of the extension modules found in each sys.path folder, keyed by the folder mtime.
+
+    Adding or removing a file changes the mtime of the folder it's in,
+    so an unchanged mtime means the folder does not need to be listed again.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path or lk.discovery_index_path
+        self.entries = {}
+        self.is_dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, "r") as fp:
+                self.entries = json.load(fp)
+        except (IOError, OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        if not self.is_dirty:
+            return
+
+        try:
+            write_json_file(self.index_path, self.entries)
+            self.is_dirty = False
+        except (IOError, OSError) as e:
+            logging.warning("Failed to save extension discovery index: {}".format(e))
+
+    def get_folder_extensions(self, folder_path):
+        try:
+            folder_stat = os.stat(folder_path)
+        except OSError:
+            return []
+
+        if not stat.S_ISDIR(folder_stat.st_mode):
+            return []
+
+        entry = self.entries.get(folder_path)
+        if entry and entry.get("mtime") == folder_stat.st_mtime:
+            return entry.get("modules", [])
+
+        module_names = list_folder_extensions(folder_path)
+        self.entries[folder_path] = {"mtime": folder_stat.st_mtime, "modules": module_names}
+        self.is_dirty = True
+        return module_names
+
+
+discovery_index = None  # type: ExtensionDiscoveryIndex
+
+
+def get_discovery_index():
+    global discovery_index
+    if discovery_index is None:
+        discovery_index = ExtensionDiscoveryIndex()
+    return discovery_index
+
+
+def list_folder_extensions(folder_path):
+    module_names = set()
+    for file_name in os.listdir(folder_path):
+        if not file_name.startswith(lk.extension_file_prefix):
+            continue
+
+        module_name = os.path.splitext(file_name)[0]
+        if module_name:
+            module_names.add(module_name)
+
+    return sorted(module_names)
+
+
+def scan_extension_modules(search_paths=None, index=None):
+    if search_paths is None:
+        search_paths = sys.path
+
+    if index is None:
+        index = get_discovery_index()
+
+    module_names = set()
+    for sys_path in search_paths:
+        module_names.update(index.get_folder_extensions(sys_path))
+
+    index.save()
+    return sorted(module_names)
+
+
+def get_entry_point_extension_modules():
+    group = lk.extension_entry_point_group
+
+    try:
+        from importlib import metadata
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return sorted(set(ep.module_name for ep in pkg_resources.iter_entry_points(group)))
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        entry_points = entry_points.select(group=group)
+    else:
+        entry_points = entry_points.get(group, [])
+
+    return sorted(set(ep.value.split(":")[0].strip() for ep in entry_points))
+
+
+def get_explicit_extension_modules():
+    env_value = os.environ.get(lk.extension_modules_env_var)
+    if env_value is None:
+        return None
+
+    return [module_name.strip() for module_name in env_value.split(",") if module_name.strip()]
+
+
+def find_extension_modules():
+    explicit_modules = get_explicit_extension_modules()
+    if explicit_modules is not None:
+        return explicit_modules
+
+    if lk.extension_discovery_mode == "entry_points":
+        return get_entry_point_extension_modules()
+
+    return scan_extension_modules()
+
+
 def import_extensions(refresh=False):
     if refresh:
         modules_to_pop = []
@@ -149,29 +1439,111 @@ def import_extensions(refresh=False):
 
         for mod_key in modules_to_pop:
             sys.modules.pop(mod_key)
+        extension_states.clear()
 
-    # look through sys.path for extension modules
-    modules_to_import = list()
-    for sys_path in sys.path:
-        if not os.path.isdir(sys_path):
-            continue
+    for module_import_str in find_extension_modules():
+        try:
+            module = importlib.import_module(module_import_str)
+            extension_states[module_import_str] = ExtensionFileState(get_module_source_path(module))
+            print("Imported extension: {}".format(module_import_str))
+        except Exception:
+            traceback.print_exc()
 
-        # for every .py file with the proper prefix, import it
-        for sys_path_name in os.listdir(sys_path):
-            if not sys_path_name.startswith(lk.extension_file_prefix):
-                continue
+    action_registry.refresh()
 
-            module_name = os.path.splitext(sys_path_name)[0]
-            modules_to_import.append(module_name)
 
-    modules_to_import = list(set(modules_to_import))
+class ExtensionFileState(object):
+    """mtime, size and content hash of an extension file, to tell if it changed since it was imported"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.mtime, self.size = get_file_stat(file_path)
+        self.content_hash = None  # only hashed once the mtime changes, to keep startup free of file reads
+
+    def is_changed(self):
+        mtime, size = get_file_stat(self.file_path)
+        if (mtime, size) == (self.mtime, self.size):
+            return False
+
+        content_hash = get_file_hash(self.file_path)
+        if self.content_hash is not None and content_hash == self.content_hash:
+            # touched (by a checkout or sync), but the content is the same
+            self.mtime, self.size = mtime, size
+            return False
+        return True
+
+    def update(self):
+        self.mtime, self.size = get_file_stat(self.file_path)
+        self.content_hash = get_file_hash(self.file_path)
+
+
+extension_states = {}  # {module name: ExtensionFileState} of the imported extensions
+
+
+def get_file_stat(file_path):
+    try:
+        file_stat = os.stat(file_path)
+    except (OSError, TypeError):
+        return None, None
+    return file_stat.st_mtime, file_stat.st_size
+
+
+def get_file_hash(file_path):
+    try:
+        with open(file_path, "rb") as fp:
+            return hashlib.sha1(fp.read()).hexdigest()
+    except (IOError, OSError, TypeError):
+        return None
 
-    for module_import_str in modules_to_import:
-        if not module_import_str:
-            continue
 
+def get_module_source_path(module):
+    file_path = getattr(module, "__file__", None)
+    if file_path and file_path.endswith((".pyc", ".pyo")) and os.path.exists(file_path[:-1]):
+        file_path = file_path[:-1]
+    return file_path
+
+
+def reload_extensions():
+    """
+    Re-import the extensions whose file changed since they were imported, and import new ones.
+
+    The action classes of each reloaded module are swapped into the registry once the module imported without errors,
+    a module that fails to import keeps its previous action classes. The exception hook stays installed the whole time.
+    Returns the names of the (re)imported modules.
+    """
+    changed_module_names = [
+        module_name for module_name, extension_state in sorted(extension_states.items())
+        if extension_state.is_changed()
+    ]
+    new_module_names = [module_name for module_name in find_extension_modules() if module_name not in extension_states]
+
+    reloaded_module_names = []
+    for module_name in changed_module_names + new_module_names:
+        action_registry.begin_staging()
         try:
-            importlib.import_module(module_import_str)
-            print("Imported extension: {}".format(module_import_str))
-        except Exception as e:
+            module = sys.modules.get(module_name)
+            if module is not None and module_name in extension_states:
+                module = reload_module(module)
+            else:
+                module = importlib.import_module(module_name)
+        except Exception:
+            action_registry.discard_staged()
             traceback.print_exc()
+            continue
+
+        action_registry.commit_staged({module_name})
+        extension_state = extension_states.get(module_name) or ExtensionFileState(get_module_source_path(module))
+        extension_state.update()
+        extension_states[module_name] = extension_state
+
+        reloaded_module_names.append(module_name)
+        print("Reloaded extension: {}".format(module_name))
+
+    if reloaded_module_names and hook_cls.dialog_instance is not None:
+        if is_main_thread():
+            hook_cls.dialog_instance.build_action_buttons()
+        else:
+            from . import exception_dialog_ui
+            exception_dialog_ui.invoke_in_main_thread(hook_cls.dialog_instance.build_action_buttons)
+
+    return reloaded_module_names
@@ -1,8 +1,11 @@
+import bisect
+import collections
+import os
 import sys
-import traceback
 import time
 from functools import partial
 
+from . import exception_dialog_search
 from . import exception_dialog_system as eds
 from . import resources
 from . import ui_utils
@@ -20,42 +23,36 @@ class ExceptionDialogWindow(ui_utils.CoreToolWindow):
     def __init__(self):
         super(ExceptionDialogWindow, self).__init__()
 
-        self._latest_exc_info = None
+        # exceptions are queued up and added to the history in batches, at most once per update interval
+        self._pending_records = collections.deque()
+        self._has_updated_records = False
+        self._update_timer = QtCore.QTimer(self)
+        self._update_timer.setSingleShot(True)
+        self._update_timer.setInterval(eds.lk.ui_update_interval_ms)
+        self._update_timer.timeout.connect(self.flush_pending_records)
+
+        # the history is filtered once typing pauses, not on every key press
+        self._search_timer = QtCore.QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(eds.lk.search_delay_ms)
+        self._search_timer.timeout.connect(self.apply_search)
+
+        # {item key: frame locals list or LocalValue} of the locals tree items that haven't been expanded yet
+        self._locals_item_values = {}
 
         self.ui = ExceptionDialogUI()
         self.setCentralWidget(self.ui)
         self.setWindowTitle("Exception Dialog")
-        self.setWindowIcon(QtGui.QIcon(resources.get_image_path("warning_icon")))
-
-        for sub_cls in eds.get_exception_action_classes():  # type: eds.BaseExceptionAction
-            if sub_cls.is_automatic:
-                continue
-            if not sub_cls.show_button:
-                continue
-            self.add_action_button(
-                sub_cls.label,
-                icon=resources.get_image_path(sub_cls.icon_name),
-                command=partial(self.trigger_exception_class, sub_cls),
-                tool_tip=sub_cls.tool_tip,
-            )
+        self.setWindowIcon(resources.get_icon("warning_icon"))
 
-        self.add_action_button(
-            "Copy to Clipboard",
-            icon=resources.get_image_path("copy_icon"),
-            command=self.copy_exception_to_clipboard,
-        )
-        self.add_action_button(
-            "Close",
-            icon=resources.get_image_path("close_icon"),
-            command=self.close,
-        )
+        self.build_action_buttons()
 
         menu_bar = QtWidgets.QMenuBar()
 
         file_menu = menu_bar.addMenu("File")  # type: QtWidgets.QMenu
 
         file_menu.addAction(
-            QtGui.QIcon(resources.get_image_path("close_icon")),
+            resources.get_icon("close_icon"),
             "Exit",
             self.close,
             QtGui.QKeySequence("ESC")
@@ -64,25 +61,64 @@ class ExceptionDialogWindow(ui_utils.CoreToolWindow):
         disable_dialog_menu = menu_bar.addMenu("Disable Dialog")  # type: QtWidgets.QMenu
 
         disable_dialog_menu.addAction(
-            QtGui.QIcon(resources.get_image_path("clock_icon")),
+            resources.get_icon("clock_icon"),
             "Disable Dialog - 1 Hour",
             partial(self.disable_dialog, 3600),  # time in seconds
         )
 
         disable_dialog_menu.addAction(
-            QtGui.QIcon(resources.get_image_path("clock_icon")),
+            resources.get_icon("clock_icon"),
             "Disable Dialog - This Session",
             partial(self.disable_dialog, "session")
         )
 
         self.setMenuBar(menu_bar)
 
+        self.ui.history_view.selectionModel().currentChanged.connect(self.show_selected_record)
+        self.ui.locals_tree.itemExpanded.connect(self.expand_locals_item)
+
+        for search_line_edit in (self.ui.search_type_line_edit, self.ui.search_module_line_edit, self.ui.search_text_line_edit):
+            search_line_edit.textChanged.connect(self.schedule_search)
+        self.ui.search_time_combo_box.currentIndexChanged.connect(self.apply_search)
+
+        find_shortcut = QtWidgets.QShortcut(QtGui.QKeySequence.Find, self)
+        find_shortcut.activated.connect(self.ui.search_text_line_edit.setFocus)
+
+    def build_action_buttons(self):
+        """(Re)build the buttons, for when the registered actions changed"""
+        action_buttons_layout = self.ui.action_buttons_layout
+        while action_buttons_layout.count():
+            btn = action_buttons_layout.takeAt(0).widget()
+            if btn is not None:
+                btn.deleteLater()
+
+        for sub_cls in eds.action_registry.button_actions:  # type: eds.BaseExceptionAction
+            self.add_action_button(
+                sub_cls.label,
+                icon=resources.get_icon(sub_cls.icon_name),
+                command=partial(self.trigger_exception_class, sub_cls),
+                tool_tip=sub_cls.tool_tip,
+            )
+
+        self.add_action_button(
+            "Copy to Clipboard",
+            icon=resources.get_icon("copy_icon"),
+            command=self.copy_exception_to_clipboard,
+        )
+        self.add_action_button(
+            "Close",
+            icon=resources.get_icon("close_icon"),
+            command=self.close,
+        )
+
     def add_action_button(self, label="[EXAMPLE]", icon=None, command=None, tool_tip=""):
         btn = QtWidgets.QPushButton(label)
         btn.setMinimumHeight(40)
 
-        if icon:
-            btn.setIcon(QtGui.QIcon(icon))
+        if icon is not None:
+            if not isinstance(icon, QtGui.QIcon):
+                icon = QtGui.QIcon(icon)  # image path
+            btn.setIcon(icon)
 
         if command:
             btn.clicked.connect(command)
@@ -94,21 +130,148 @@ class ExceptionDialogWindow(ui_utils.CoreToolWindow):
 
     def trigger_exception_class(self, cls):
         cls = cls  # type: eds.BaseExceptionAction
-        cls.trigger_action(*self._latest_exc_info)
+        record = self.get_selected_record()
+        if record is None:
+            return
+        eds.call_trigger_action(cls, record)
+
+    def set_latest_exception(self, record):
+        record = record  # type: eds.ExceptionRecord
+        self._pending_records.append(record)
+        self.schedule_update()
+
+    def mark_records_updated(self):
+        """The occurrence count of a record in the history went up"""
+        self._has_updated_records = True
+        self.schedule_update()
+
+    def schedule_update(self):
+        if not self._update_timer.isActive():
+            self._update_timer.start()
+
+    def flush_pending_records(self):
+        history_model = self.ui.history_model
+        filter_model = self.ui.history_filter_model
+        history_view = self.ui.history_view
+
+        if self._has_updated_records:
+            self._has_updated_records = False
+            history_model.refresh_records()
+
+        if not self._pending_records:
+            return
+
+        pending_records = list(self._pending_records)
+        self._pending_records.clear()
+
+        selected_row = history_view.currentIndex().row()
+        follow_latest = selected_row == -1 or selected_row == filter_model.rowCount() - 1
+
+        history_model.add_records(pending_records)
+        self.update_search_count()
+
+        # keep following the newest exception, unless the user is looking at an older one
+        if follow_latest and filter_model.rowCount():
+            latest_index = filter_model.index(filter_model.rowCount() - 1)
+            history_view.setCurrentIndex(latest_index)
+            history_view.scrollTo(latest_index)
 
-    def set_latest_exception(self, exc_type, exc_value, exc_trace):
-        self._latest_exc_info = (exc_type, exc_value, exc_trace)
+    def get_selected_record(self):
+        return self.ui.history_filter_model.get_record(self.ui.history_view.currentIndex())
 
-        full_exception_info = list()
-        full_exception_info.append("--- Exception at: {}\n".format(time.strftime("%H:%M:%S", time.localtime())))
-        full_exception_info.extend(traceback.format_exception(exc_type, exc_value, exc_trace))
-        full_exception_info.append("-" * 50)
-        full_exception_info.append("\n")
-        exc_text = "".join(full_exception_info)
+    def schedule_search(self, *args):
+        self._search_timer.start()
 
-        self.ui.exception_text_edit.moveCursor(QtGui.QTextCursor.End)
-        self.ui.exception_text_edit.insertPlainText(exc_text)
-        self.ui.exception_text_edit.moveCursor(QtGui.QTextCursor.End)
+    def get_search_query(self):
+        since = None
+        search_seconds = self.ui.search_time_combo_box.currentData()
+        if search_seconds:
+            since = time.time() - search_seconds
+
+        return exception_dialog_search.RecordQuery(
+            exc_type=self.ui.search_type_line_edit.text(),
+            module=self.ui.search_module_line_edit.text(),
+            text=self.ui.search_text_line_edit.text(),
+            since=since,
+        )
+
+    def apply_search(self, *args):
+        self._search_timer.stop()
+        filter_model = self.ui.history_filter_model
+        selected_record_id = filter_model.get_record_id(self.ui.history_view.currentIndex())
+
+        filter_model.set_query(self.get_search_query())
+        self.update_search_count()
+
+        # keep the selected record selected if it still matches, otherwise select the newest match
+        selected_index = filter_model.get_index(selected_record_id)
+        if not selected_index.isValid() and filter_model.rowCount():
+            selected_index = filter_model.index(filter_model.rowCount() - 1)
+        self.ui.history_view.setCurrentIndex(selected_index)
+        self.ui.history_view.scrollTo(selected_index)
+        if not selected_index.isValid():
+            self.show_selected_record()
+
+    def update_search_count(self):
+        if self.ui.history_filter_model.query is None:
+            self.ui.search_count_label.setText("")
+            return
+        self.ui.search_count_label.setText("{} / {}".format(
+            self.ui.history_filter_model.rowCount(), self.ui.history_model.rowCount()))
+
+    def show_selected_record(self, *args):
+        record = self.get_selected_record()
+        self.ui.exception_text_edit.setPlainText(record.text if record else "")
+        self.show_record_locals(record)
+
+    def show_record_locals(self, record):
+        """Only adds an item per frame, locals are added and repr'd when their item is expanded"""
+        locals_tree = self.ui.locals_tree
+        locals_tree.clear()
+        self._locals_item_values = {}
+
+        has_locals = bool(record and record.frame_locals)
+        locals_tree.setVisible(has_locals)
+        if not has_locals:
+            return
+
+        # innermost frame first, that's where the interesting locals usually are
+        for frame, local_values in reversed(list(zip(record.frames, record.frame_locals))):
+            frame_item = QtWidgets.QTreeWidgetItem(locals_tree, [
+                "{}  line {}".format(frame[2], frame[1]),
+                os.path.basename(frame[0]),
+            ])
+            frame_item.setToolTip(1, frame[0])
+            self.set_locals_item_value(frame_item, local_values)
+
+    def set_locals_item_value(self, item, item_value):
+        item_key = len(self._locals_item_values)
+        self._locals_item_values[item_key] = item_value
+        item.setData(0, QtCore.Qt.UserRole, item_key)
+        item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.ShowIndicator)
+
+    def expand_locals_item(self, item):
+        item_value = self._locals_item_values.pop(item.data(0, QtCore.Qt.UserRole), None)
+        if item_value is None:
+            return
+
+        if isinstance(item_value, list):
+            local_values = item_value
+        else:
+            value_repr = item_value.get_repr()
+            repr_item = QtWidgets.QTreeWidgetItem(item, ["repr", value_repr])
+            repr_item.setToolTip(1, value_repr)
+            local_values = item_value.children
+
+        for local_value in local_values:
+            value_item = QtWidgets.QTreeWidgetItem(item, [
+                local_value.name,
+                "{}  {}".format(local_value.type_name, local_value.summary).strip(),
+            ])
+            if local_value.type_name:
+                self.set_locals_item_value(value_item, local_value)
+
+        item.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.DontShowIndicatorWhenChildless)
 
     def copy_exception_to_clipboard(self):
         clipboard = QtWidgets.QApplication.clipboard()  # type: QtGui.QClipboard
@@ -129,12 +292,21 @@ class ExceptionDialogWindow(ui_utils.CoreToolWindow):
             eds.SessionInfo.disable_until_this_time = time.time() + disable_time_amount
 
 
+SEARCH_TIME_RANGES = (
+    ("Any time", 0),
+    ("Last 5 minutes", 5 * 60),
+    ("Last 15 minutes", 15 * 60),
+    ("Last hour", 60 * 60),
+    ("Last 24 hours", 24 * 60 * 60),
+)
+
+
 class ExceptionDialogUI(QtWidgets.QWidget):
     def __init__(self, *args, **kwargs):
         super(ExceptionDialogUI, self).__init__(*args, **kwargs)
 
         warning_icon_label = QtWidgets.QLabel(self)
-        warning_icon_label.setPixmap(QtGui.QPixmap(resources.get_image_path("warning_icon")).scaled(64, 64))
+        warning_icon_label.setPixmap(resources.get_pixmap("warning_icon", size=(64, 64)))
 
         warning_label = QtWidgets.QLabel(self)
         warning_label.setAlignment(QtCore.Qt.AlignCenter)
@@ -142,9 +314,59 @@ class ExceptionDialogUI(QtWidgets.QWidget):
         warning_label.setSizePolicy(QtWidgets.QSizePolicy.MinimumExpanding, QtWidgets.QSizePolicy.Minimum)
         warning_label.setStyleSheet("font-size: 28px;")
 
+        # only the visible rows of the history are ever rendered
+        self.history_model = ExceptionHistoryModel(parent=self)
+        self.history_filter_model = ExceptionHistoryFilterModel(self.history_model, parent=self)
+        self.history_view = QtWidgets.QListView(self)
+        self.history_view.setModel(self.history_filter_model)
+        self.history_view.setUniformItemSizes(True)
+        self.history_view.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+
         self.exception_text_edit = QtWidgets.QTextEdit(self)
+        self.exception_text_edit.setReadOnly(True)
         self.exception_text_edit.setWordWrapMode(QtGui.QTextOption.NoWrap)
 
+        # only shown for records with captured locals
+        self.locals_tree = QtWidgets.QTreeWidget(self)
+        self.locals_tree.setHeaderLabels(["Local", "Value"])
+        self.locals_tree.setUniformRowHeights(True)
+        self.locals_tree.setVisible(False)
+
+        self.detail_splitter = QtWidgets.QSplitter(QtCore.Qt.Horizontal, self)
+        self.detail_splitter.addWidget(self.exception_text_edit)
+        self.detail_splitter.addWidget(self.locals_tree)
+        self.detail_splitter.setStretchFactor(0, 1)
+
+        self.search_type_line_edit = QtWidgets.QLineEdit(self)
+        self.search_type_line_edit.setPlaceholderText("Type")
+        self.search_module_line_edit = QtWidgets.QLineEdit(self)
+        self.search_module_line_edit.setPlaceholderText("Module")
+        self.search_text_line_edit = QtWidgets.QLineEdit(self)
+        self.search_text_line_edit.setPlaceholderText("Search messages")
+        self.search_time_combo_box = QtWidgets.QComboBox(self)
+        for label, seconds in SEARCH_TIME_RANGES:
+            self.search_time_combo_box.addItem(label, seconds)
+        self.search_count_label = QtWidgets.QLabel(self)
+
+        search_layout = QtWidgets.QHBoxLayout()
+        search_layout.setContentsMargins(0, 0, 0, 0)
+        search_layout.addWidget(self.search_type_line_edit)
+        search_layout.addWidget(self.search_module_line_edit)
+        search_layout.addWidget(self.search_text_line_edit, 2)
+        search_layout.addWidget(self.search_time_combo_box)
+        search_layout.addWidget(self.search_count_label)
+
+        history_widget = QtWidgets.QWidget(self)
+        history_layout = QtWidgets.QVBoxLayout(history_widget)
+        history_layout.setContentsMargins(0, 0, 0, 0)
+        history_layout.addLayout(search_layout)
+        history_layout.addWidget(self.history_view)
+
+        self.history_splitter = QtWidgets.QSplitter(QtCore.Qt.Vertical, self)
+        self.history_splitter.addWidget(history_widget)
+        self.history_splitter.addWidget(self.detail_splitter)
+        self.history_splitter.setStretchFactor(1, 1)
+
         self.action_buttons_layout = QtWidgets.QHBoxLayout()
 
         self.main_layout = QtWidgets.QVBoxLayout()
@@ -153,10 +375,232 @@ class ExceptionDialogUI(QtWidgets.QWidget):
         warning_layout.addWidget(warning_label)
         self.main_layout.addLayout(warning_layout)
         self.main_layout.addLayout(self.action_buttons_layout)
-        self.main_layout.addWidget(self.exception_text_edit)
+        self.main_layout.addWidget(self.history_splitter)
         self.setLayout(self.main_layout)
 
 
+class ExceptionHistoryModel(QtCore.QAbstractListModel):
+    """List model over a bounded ring buffer of exception records, the oldest records are dropped when full"""
+
+    def __init__(self, max_records=None, parent=None):
+        super(ExceptionHistoryModel, self).__init__(parent)
+        self.records = eds.RecordRingBuffer(max_records or eds.lk.history_max_records)
+
+        # records are indexed by an id that keeps counting up, the row of a record is its id - first_record_id
+        self.search_index = exception_dialog_search.RecordIndex()
+        self.first_record_id = 0
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        record = self.get_record(index)
+        if record is None:
+            return None
+
+        if role == QtCore.Qt.DisplayRole:
+            display_text = "{}  {}: {}".format(
+                time.strftime("%H:%M:%S", time.localtime(record.timestamp)),
+                record.exc_type_name,
+                record.message.split("\n", 1)[0],
+            )
+            if record.count > 1:
+                last_time = time.strftime("%H:%M:%S", time.localtime(record.occurrence.last_time))
+                display_text += "  (x{}, last at {})".format(record.count, last_time)
+            return display_text
+
+        if role == QtCore.Qt.ToolTipRole:
+            return record.message
+
+        return None
+
+    def get_record(self, index):
+        if not index.isValid() or index.row() >= len(self.records):
+            return None
+        return self.records[index.row()]
+
+    def add_records(self, records):
+        records = records[-self.records.max_size:]
+        if not records:
+            return
+
+        overflow_count = len(self.records) + len(records) - self.records.max_size
+        if overflow_count > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow_count - 1)
+            for _ in range(overflow_count):
+                self.records.pop_oldest()
+                self.search_index.remove(self.first_record_id)
+                self.first_record_id += 1
+            self.endRemoveRows()
+
+        first_row = len(self.records)
+        self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + len(records) - 1)
+        for record in records:
+            self.search_index.add(self.first_record_id + len(self.records), record)
+            self.records.append(record)
+        self.endInsertRows()
+
+    def refresh_records(self):
+        """Redraw the rows, the view only repaints the visible ones"""
+        if len(self.records):
+            self.dataChanged.emit(self.index(0), self.index(len(self.records) - 1))
+
+
+class ExceptionHistoryFilterModel(QtCore.QAbstractListModel):
+    """
+    The records of an ExceptionHistoryModel that match a search query, or all of them without one.
+
+    Matches come from the history's search index, records added while searching are checked one by one.
+    """
+
+    def __init__(self, history_model, parent=None):
+        super(ExceptionHistoryFilterModel, self).__init__(parent)
+        self.history_model = history_model  # type: ExceptionHistoryModel
+        self.query = None  # type: exception_dialog_search.RecordQuery
+        self.record_ids = []  # sorted ids of the matching records, while there's a query
+        self._removed_count = 0
+
+        history_model.rowsAboutToBeInserted.connect(self.on_rows_about_to_be_inserted)
+        history_model.rowsInserted.connect(self.on_rows_inserted)
+        history_model.rowsAboutToBeRemoved.connect(self.on_rows_about_to_be_removed)
+        history_model.rowsRemoved.connect(self.on_rows_removed)
+        history_model.dataChanged.connect(self.on_data_changed)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        if self.query is None:
+            return self.history_model.rowCount()
+        return len(self.record_ids)
+
+    def get_history_row(self, row):
+        if self.query is None:
+            return row
+        return self.record_ids[row] - self.history_model.first_record_id
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.rowCount():
+            return None
+        return self.history_model.data(self.history_model.index(self.get_history_row(index.row())), role)
+
+    def get_record(self, index):
+        if not index.isValid() or index.row() >= self.rowCount():
+            return None
+        return self.history_model.records[self.get_history_row(index.row())]
+
+    def get_record_id(self, index):
+        if not index.isValid() or index.row() >= self.rowCount():
+            return None
+        return self.get_history_row(index.row()) + self.history_model.first_record_id
+
+    def get_index(self, record_id):
+        """Index of the row that shows the record, invalid if it's not shown"""
+        if record_id is None:
+            return QtCore.QModelIndex()
+
+        if self.query is None:
+            row = record_id - self.history_model.first_record_id
+        else:
+            row = bisect.bisect_left(self.record_ids, record_id)
+            if row >= len(self.record_ids) or self.record_ids[row] != record_id:
+                return QtCore.QModelIndex()
+
+        if not 0 <= row < self.rowCount():
+            return QtCore.QModelIndex()
+        return self.index(row)
+
+    def set_query(self, query):
+        """query: RecordQuery, None or an empty query shows all records"""
+        self.beginResetModel()
+        if query is None or query.is_empty():
+            self.query = None
+            self.record_ids = []
+        else:
+            self.query = query
+            self.record_ids = self.history_model.search_index.search(query)
+        self.endResetModel()
+
+    def on_rows_about_to_be_inserted(self, parent, first, last):
+        if self.query is None:
+            self.beginInsertRows(QtCore.QModelIndex(), first, last)
+
+    def on_rows_inserted(self, parent, first, last):
+        if self.query is None:
+            self.endInsertRows()
+            return
+
+        search_index = self.history_model.search_index
+        first_record_id = self.history_model.first_record_id
+        new_record_ids = [
+            record_id for record_id in range(first_record_id + first, first_record_id + last + 1)
+            if search_index.matches(record_id, self.query)
+        ]
+        if new_record_ids:
+            first_row = len(self.record_ids)
+            self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + len(new_record_ids) - 1)
+            self.record_ids.extend(new_record_ids)
+            self.endInsertRows()
+
+    def on_rows_about_to_be_removed(self, parent, first, last):
+        # the history only ever drops its oldest records
+        if self.query is None:
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            return
+
+        removed_count = bisect.bisect_right(self.record_ids, self.history_model.first_record_id + last)
+        self._removed_count = removed_count
+        if removed_count:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, removed_count - 1)
+
+    def on_rows_removed(self, parent, first, last):
+        if self.query is None:
+            self.endRemoveRows()
+            return
+
+        if self._removed_count:
+            del self.record_ids[:self._removed_count]
+            self.endRemoveRows()
+        self._removed_count = 0
+
+    def on_data_changed(self, top_left, bottom_right, *args):
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0), self.index(self.rowCount() - 1))
+
+
+class MainThreadInvoker(QtCore.QObject):
+    """Runs functions on the main thread, queued from any thread through a queued signal"""
+    invoke_requested = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super(MainThreadInvoker, self).__init__(parent)
+        self.pending_funcs = collections.deque()
+        self.invoke_requested.connect(self.run_pending_funcs, QtCore.Qt.QueuedConnection)
+
+    def invoke(self, func):
+        self.pending_funcs.append(func)
+        self.invoke_requested.emit()
+
+    def run_pending_funcs(self):
+        while self.pending_funcs:
+            self.pending_funcs.popleft()()
+
+
+# this module might be imported from a worker thread, the invoker has to live on the main thread
+main_thread_invoker = MainThreadInvoker()
+main_thread_invoker.moveToThread(QtWidgets.QApplication.instance().thread())
+
+
+def invoke_in_main_thread(func):
+    main_thread_invoker.invoke(func)
+
+
+def build_window():
+    """Build the window without showing it"""
+    return ExceptionDialogWindow()
+
+
 def main(refresh=False):
     win = ExceptionDialogWindow()
     win.main(refresh=refresh)
@@ -0,0 +1,148 @@
+"""
+Queueing shared by the modules that write exception records in the background (the store, the headless sink,
+the aggregator client).
+
+Repeats of a record are added up per fingerprint instead of being queued one by one, so a storm of them
+can't fill the queue, and they're only passed on once the record of their fingerprint has been written.
+"""
+import sys
+import threading
+
+if sys.version_info.major >= 3:
+    import queue
+else:
+    import Queue as queue
+
+from . import exception_dialog_metrics as edm
+
+
+class RepeatCounter(object):
+    """Added up repeats per fingerprint, held back while a record of that fingerprint is still queued"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending_repeats = {}  # {fingerprint: (count, last time)}
+        self.queued_fingerprints = {}  # {fingerprint: records in the queue}
+
+    def __bool__(self):
+        return bool(self.pending_repeats)
+
+    __nonzero__ = __bool__
+
+    def add(self, fingerprint, last_time, count=1):
+        with self.lock:
+            pending_count, pending_last_time = self.pending_repeats.get(fingerprint, (0, 0))
+            self.pending_repeats[fingerprint] = (pending_count + count, max(pending_last_time, last_time))
+
+    def add_counts(self, repeat_counts):
+        """Add {fingerprint: (count, last time)}, like the repeats that were taken but couldn't be written"""
+        for fingerprint, (count, last_time) in repeat_counts.items():
+            self.add(fingerprint, last_time, count)
+
+    def queue_record(self, fingerprint, enqueue_func):
+        """
+        Queue a record with enqueue_func(), the repeats of its fingerprint wait until it's marked as written.
+        returns what enqueue_func returned, False means the record was dropped
+        """
+        with self.lock:
+            if not enqueue_func():
+                return False
+            if fingerprint is not None:
+                self.queued_fingerprints[fingerprint] = self.queued_fingerprints.get(fingerprint, 0) + 1
+            return True
+
+    def mark_written(self, fingerprint):
+        """The record was written (or given up on), the repeats of its fingerprint can be taken from now on"""
+        if fingerprint is None:
+            return
+        with self.lock:
+            queued_count = self.queued_fingerprints.get(fingerprint, 0) - 1
+            if queued_count > 0:
+                self.queued_fingerprints[fingerprint] = queued_count
+            else:
+                self.queued_fingerprints.pop(fingerprint, None)
+
+    def take(self):
+        """The added up repeats of the fingerprints that have no record waiting in the queue"""
+        with self.lock:
+            repeat_counts = {}
+            for fingerprint in list(self.pending_repeats.keys()):
+                if fingerprint not in self.queued_fingerprints:
+                    repeat_counts[fingerprint] = self.pending_repeats.pop(fingerprint)
+            return repeat_counts
+
+    def clear(self):
+        with self.lock:
+            self.pending_repeats.clear()
+            self.queued_fingerprints.clear()
+
+
+class BackgroundWriter(object):
+    """
+    Bounded queue of items, written by a background thread that's started with the first item.
+
+    Subclasses implement _writer_loop, which takes the items from _write_queue and sets the event
+    of the ("flush", event) items once everything before them is written.
+    """
+    thread_name = "ExceptionWriter"
+    dropped_metric_name = None  # MetricNames counter of the items dropped while the queue is full
+
+    def __init__(self, queue_size=10000):
+        self.dropped_count = 0
+        self.repeats = RepeatCounter()
+
+        self._write_queue = queue.Queue(maxsize=queue_size)
+        self._writer_thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._writer_thread is not None:
+                return
+            self._writer_thread = threading.Thread(target=self._writer_loop, name=self.thread_name)
+            self._writer_thread.daemon = True
+            self._writer_thread.start()
+
+    def _writer_loop(self):
+        raise NotImplementedError
+
+    def _enqueue(self, item):
+        if self._writer_thread is None:
+            self.start()
+
+        try:
+            self._write_queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            if self.dropped_metric_name:
+                edm.metrics.increment(self.dropped_metric_name)
+            return False
+
+    def _enqueue_record(self, item, fingerprint):
+        return self.repeats.queue_record(fingerprint, lambda: self._enqueue(item))
+
+    def add_repeat(self, occurrence, count=1):
+        self.add_repeat_count(occurrence.fingerprint, occurrence.last_time, count)
+
+    def add_repeat_count(self, fingerprint, last_time, count=1):
+        if self._writer_thread is None:
+            self.start()
+        self.repeats.add(fingerprint, last_time, count)
+
+    def take_pending_repeats(self):
+        return self.repeats.take()
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written, returns False if the timeout was hit first"""
+        if self._writer_thread is None:
+            return True
+
+        flushed_event = threading.Event()
+        try:
+            self._write_queue.put(("flush", flushed_event), timeout=timeout)
+        except queue.Full:
+            return False
+
+        flushed_event.wait(timeout)
+        return flushed_event.is_set()
@@ -1,8 +1,95 @@
+import base64
 import os
 
 CURRENT_DIR = os.path.dirname(__file__)
 
+# generated by write_embedded_images(), images are loaded from here instead of the .png files when it exists
+EMBEDDED_MODULE_NAME = "embedded_images"
+
+
+class ImageCache:
+    """Process wide cache of decoded images, shared by every window"""
+    pixmaps = {}
+    icons = {}
+    embedded_images = None
+
 
 def get_image_path(image_name, extension=".png"):
     image_path = "{}/{}{}".format(CURRENT_DIR, image_name, extension)
     return image_path
+
+
+def get_embedded_images():
+    if ImageCache.embedded_images is None:
+        try:
+            from . import embedded_images
+            ImageCache.embedded_images = embedded_images.IMAGES
+        except ImportError:
+            ImageCache.embedded_images = {}
+    return ImageCache.embedded_images
+
+
+def get_pixmap(image_name, size=None):
+    """
+    image_name: name of the image in this folder, without extension
+    size: optional (width, height) to scale the pixmap to
+    """
+    cache_key = (image_name, size)
+    pixmap = ImageCache.pixmaps.get(cache_key)
+    if pixmap is not None:
+        return pixmap
+
+    from ..ui_utils import QtGui
+
+    if size:
+        pixmap = get_pixmap(image_name).scaled(*size)
+    else:
+        pixmap = QtGui.QPixmap()
+        embedded_data = get_embedded_images().get(image_name)
+        if embedded_data:
+            pixmap.loadFromData(base64.b64decode(embedded_data), "PNG")
+        else:
+            pixmap.load(get_image_path(image_name))
+
+    ImageCache.pixmaps[cache_key] = pixmap
+    return pixmap
+
+
+def get_icon(image_name):
+    icon = ImageCache.icons.get(image_name)
+    if icon is None:
+        from ..ui_utils import QtGui
+
+        icon = QtGui.QIcon(get_pixmap(image_name))
+        ImageCache.icons[image_name] = icon
+    return icon
+
+
+def clear_image_cache():
+    ImageCache.pixmaps.clear()
+    ImageCache.icons.clear()
+    ImageCache.embedded_images = None
+
+
+def write_embedded_images():
+    """
+    Write every .png in this folder into a single python module,
+    so loading the images is one file read instead of one per image (useful when this folder is on a slow network share)
+    """
+    module_lines = ["# generated by exception_dialog.resources.write_embedded_images()", "IMAGES = {"]
+    for file_name in sorted(os.listdir(CURRENT_DIR)):
+        image_name, extension = os.path.splitext(file_name)
+        if extension.lower() != ".png":
+            continue
+
+        with open(os.path.join(CURRENT_DIR, file_name), "rb") as fp:
+            image_data = base64.b64encode(fp.read()).decode("ascii")
+        module_lines.append("    {!r}: {!r},".format(image_name, image_data))
+    module_lines.append("}")
+
+    module_path = os.path.join(CURRENT_DIR, EMBEDDED_MODULE_NAME + ".py")
+    with open(module_path, "w") as fp:
+        fp.write("\n".join(module_lines) + "\n")
+
+    clear_image_cache()
+    return module_path
@@ -49,6 +49,9 @@ class CoreToolWindow(QtWidgets.QMainWindow):
 
         self.resize(*self.WINDOW_SIZE)
 
+        if self.parent_window is None:
+            return
+
         dcc_window_center = self.parent_window.mapToGlobal(self.parent_window.rect().center())
         window_offset_x = dcc_window_center.x() - self.geometry().width() / 2
         window_offset_y = dcc_window_center.y() - self.geometry().height() / 2
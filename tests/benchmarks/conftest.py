@@ -0,0 +1,199 @@
+"""
+pytest configuration for the benchmarks.
+
+These run on plain python (no Maya needed), with:
+python -m pytest tests/benchmarks -s
+
+Results are compared to tests/benchmarks/baseline.json, a result that's more than
+EXCEPTION_DIALOG_BENCHMARK_TOLERANCE (default 3) times its baseline fails. To record a new baseline:
+python -m pytest tests/benchmarks --update-baseline
+
+Timings depend on the machine, so every run first times a fixed calibration loop, and the baseline timings
+are scaled by how much slower or faster that loop ran than when the baseline was recorded.
+
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+# Add repository base path to system paths, same as tests/base.py
+benchmarks_path = os.path.dirname(os.path.realpath(__file__))
+base_path = os.path.dirname(os.path.dirname(benchmarks_path))
+if base_path not in sys.path:
+    sys.path.insert(0, base_path)
+
+# UI benchmarks run without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import pytest
+
+import exception_dialog.exception_dialog_dcc_core as dcc_core
+import exception_dialog.exception_dialog_system as system
+
+
+class StubDCC(dcc_core.ExceptionDialogCoreInterface):
+    """DCC backend with a UI available, that doesn't hook into anything"""
+
+    def ui_available(self):
+        return True
+
+    def register_exception_hook(self, hook_func):
+        return None
+
+    def unregister_exception_hook(self, previous_hook):
+        pass
+
+
+def pytest_addoption(parser):
+    parser.addoption("--update-baseline", action="store_true", help="write the results of this run as the new baseline")
+
+
+CALIBRATION_NAME = "calibration_loop"
+
+
+def run_calibration_loop(run_count=5):
+    """Milliseconds of a fixed pure python workload (the fastest of run_count runs), to compare machines with"""
+    run_times = []
+    for _ in range(run_count):
+        start = time.perf_counter()
+        counts = {}
+        for index in range(100000):
+            key = "key_{}".format(index % 1000)
+            counts[key] = counts.get(key, 0) + 1
+        run_times.append(time.perf_counter() - start)
+    return min(run_times) * 1000
+
+
+class BenchmarkBaseline(object):
+    def __init__(self, baseline_path, tolerance=3.0, is_updating=False, calibration_time=None):
+        self.baseline_path = baseline_path
+        self.tolerance = tolerance
+        self.is_updating = is_updating
+        self.results = {}
+
+        self.baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path, "r") as fp:
+                self.baseline = json.load(fp)
+
+        # timings of this run compared to the machine the baseline was recorded on
+        self.speed_ratio = 1.0
+        if calibration_time is not None:
+            self.results[CALIBRATION_NAME] = {"value": calibration_time, "unit": "ms"}
+            baseline_calibration = self.baseline.get(CALIBRATION_NAME)
+            if baseline_calibration is not None:
+                self.speed_ratio = calibration_time / baseline_calibration["value"]
+
+    def check(self, name, value, unit="ms", min_slack=0.0):
+        """
+        Record a result, and fail if it regressed compared to the baseline
+        min_slack: allowed difference on top of the tolerance, for results that are too small to be stable
+        """
+        self.results[name] = {"value": value, "unit": unit}
+        print("\n{}: {:.4f} {}".format(name, value, unit))
+
+        baseline_result = self.baseline.get(name)
+        if self.is_updating or baseline_result is None:
+            return
+
+        limit = baseline_result["value"] * self.tolerance + min_slack
+        if unit == "ms":
+            limit *= self.speed_ratio
+        assert value <= limit, "{} regressed: {:.4f} {} (baseline {:.4f} {}, this machine is {:.2f}x as slow)".format(
+            name, value, unit, baseline_result["value"], baseline_result["unit"], self.speed_ratio)
+
+    def save(self):
+        if not self.is_updating or list(self.results.keys()) == [CALIBRATION_NAME]:
+            return
+
+        # benchmarks that were skipped in this run keep their previous baseline
+        baseline = dict(self.baseline)
+        baseline.update(self.results)
+        with open(self.baseline_path, "w") as fp:
+            json.dump(baseline, fp, indent=2, sort_keys=True)
+
+
+@pytest.fixture(scope="session")
+def benchmark_baseline(request):
+    baseline = BenchmarkBaseline(
+        os.path.join(benchmarks_path, "baseline.json"),
+        tolerance=float(os.environ.get("EXCEPTION_DIALOG_BENCHMARK_TOLERANCE", 3.0)),
+        is_updating=request.config.getoption("--update-baseline"),
+        calibration_time=run_calibration_loop(),
+    )
+    print("\n{}: {:.4f} ms ({:.2f}x the baseline)".format(
+        CALIBRATION_NAME, baseline.results[CALIBRATION_NAME]["value"], baseline.speed_ratio))
+    yield baseline
+    baseline.save()
+
+
+# hook state that startup() and the first exception set, restored after every test
+HOOK_STATE_ATTRIBUTES = (
+    "previous_except_hook", "previous_dcc_except_hook", "previous_threading_except_hook",
+    "dialog_instance", "action_dispatcher", "exception_store", "aggregator_client",
+    "is_loaded", "is_load_pending", "is_headless", "is_ui_imported", "headless_sink", "metrics_exporter",
+    "rule_engine", "sampler", "sampling_flusher", "context_snapshot", "exc_info_record",
+)
+
+
+@pytest.fixture
+def stub_dcc(monkeypatch, tmp_path):
+    """StubDCC backend, with every file the hook writes in tmp_path and the hooks restored afterwards"""
+    monkeypatch.setattr(system, "dcc", StubDCC())
+    for attribute_name in HOOK_STATE_ATTRIBUTES:
+        monkeypatch.setattr(system.hook_cls, attribute_name, getattr(system.hook_cls, attribute_name))
+    monkeypatch.setattr(system.hook_cls, "is_loaded", False)
+
+    # the paths are resolved when the module is imported, so HOME alone isn't enough
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    monkeypatch.setattr(system.lk, "discovery_index_path", str(tmp_path / "discovery_index.json"))
+    monkeypatch.setattr(system.lk, "delivery_spool_path", str(tmp_path / "spool"))
+    monkeypatch.setattr(system.lk, "store_path", str(tmp_path / "exceptions.db"))
+    monkeypatch.setattr(system.lk, "headless_log_path", str(tmp_path / "logs" / "exceptions.jsonl"))
+    monkeypatch.setattr(system.lk, "rules_path", str(tmp_path / "rules.json"))
+    monkeypatch.setattr(system.lk, "metrics_export_path", None)
+
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+    if hasattr(threading, "excepthook"):
+        monkeypatch.setattr(threading, "excepthook", threading.excepthook)
+
+    # event loops that got the asyncio handler get the default handler back
+    asyncio_loops = []
+    install_asyncio_exception_handler = system.install_asyncio_exception_handler
+
+    def tracked_install_asyncio_exception_handler(loop=None):
+        loop = install_asyncio_exception_handler(loop)
+        asyncio_loops.append(loop)
+        return loop
+    monkeypatch.setattr(system, "install_asyncio_exception_handler", tracked_install_asyncio_exception_handler)
+
+    sampling_flusher = system.hook_cls.sampling_flusher
+    yield system.dcc
+
+    for loop in asyncio_loops:
+        loop.set_exception_handler(None)
+
+    # a flusher thread started by the test would keep flushing into the restored (default) store
+    if system.hook_cls.sampling_flusher not in (None, sampling_flusher):
+        system.hook_cls.sampling_flusher.stop()
+
+
+@pytest.fixture
+def headless_session(stub_dcc, monkeypatch, tmp_path):
+    """Loaded hook in headless mode, writing to a temp folder, with the store and aggregator off"""
+    monkeypatch.setattr(system.hook_cls, "is_loaded", True)
+    monkeypatch.setattr(system.hook_cls, "is_headless", True)
+    monkeypatch.setattr(system.hook_cls, "headless_sink", None)
+    monkeypatch.setattr(system.hook_cls, "sampler", None)
+    monkeypatch.setattr(system.lk, "headless_log_path", str(tmp_path / "exceptions.jsonl"))
+    monkeypatch.setattr(system.lk, "store_enabled", False)
+    monkeypatch.setattr(system.lk, "aggregator_enabled", False)
+    monkeypatch.setattr(system.lk, "rules_path", None)
+    monkeypatch.setattr(system, "coalescer", system.ExceptionCoalescer())
+    yield
+    if system.hook_cls.headless_sink is not None:
+        system.hook_cls.headless_sink.close()
+
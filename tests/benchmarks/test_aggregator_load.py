@@ -0,0 +1,129 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+import exception_dialog.exception_dialog_aggregator as aggregator_module
+import exception_dialog.exception_dialog_store as store_module
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs unix domain sockets")
+
+CLIENT_COUNT = 10
+TARGET_EVENTS_PER_SECOND = 10000
+DURATION = 2.0
+FINGERPRINT_COUNT = 25
+
+# the aggregator has to take in at least this part of the target rate
+MIN_RATE_RATIO = 0.8
+
+# every client is a separate python process, like the DCC sessions on a workstation or farm node
+CLIENT_SCRIPT = """
+import sys
+import time
+
+import exception_dialog.exception_dialog_aggregator as aggregator_module
+import exception_dialog.exception_dialog_system as system
+
+address, event_count, interval, fingerprint_count = sys.argv[1], int(sys.argv[2]), float(sys.argv[3]), int(sys.argv[4])
+client = aggregator_module.AggregatorClient(address)
+
+sys.stdout.write("ready\\n")
+sys.stdout.flush()
+sys.stdin.readline()  # start all clients at the same time
+
+next_time = time.time()
+for event_index in range(event_count):
+    fingerprint_index = event_index % fingerprint_count
+    occurrence = system.ExceptionOccurrence("fingerprint_{}".format(fingerprint_index), time.time())
+    client.send_record(system.ExceptionRecord(
+        exc_type_name="RuntimeError",
+        message="load test exception {}".format(fingerprint_index),
+        text="Traceback (most recent call last):\\n  ...\\nRuntimeError: load test\\n",
+        occurrence=occurrence,
+        timestamp=occurrence.first_time,
+    ))
+
+    # pace every client, so the clients together hit the target rate
+    next_time += interval
+    sleep_time = next_time - time.time()
+    if sleep_time > 0:
+        time.sleep(sleep_time)
+
+sys.exit(0 if client.flush(10) else 1)
+"""
+
+
+@pytest.fixture
+def aggregator_server(tmp_path):
+    # unix socket paths have a short length limit, so don't use the (long) pytest tmp_path for it
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="eda_"), "aggregator.sock")
+    store = store_module.ExceptionStore(str(tmp_path / "exceptions.db"))
+    aggregator = aggregator_module.Aggregator(store, flush_interval=0.2)
+    aggregator.start()
+
+    server = aggregator_module.AggregatorServer(socket_path, aggregator)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    yield socket_path, aggregator, store
+
+    server.shutdown()
+    server.server_close()
+    aggregator.stop()
+
+
+def test_aggregator_load(aggregator_server, tmp_path):
+    socket_path, aggregator, store = aggregator_server
+
+    events_per_client = int(TARGET_EVENTS_PER_SECOND * DURATION / CLIENT_COUNT)
+    client_interval = CLIENT_COUNT / float(TARGET_EVENTS_PER_SECOND)
+    total_events = events_per_client * CLIENT_COUNT
+
+    package_parent_path = os.path.dirname(os.path.dirname(os.path.realpath(aggregator_module.__file__)))
+    environment = dict(os.environ, PYTHONPATH=package_parent_path, HOME=str(tmp_path), USERPROFILE=str(tmp_path))
+    client_args = [socket_path, str(events_per_client), str(client_interval), str(FINGERPRINT_COUNT)]
+    client_processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", CLIENT_SCRIPT] + client_args,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=environment, universal_newlines=True,
+        )
+        for _ in range(CLIENT_COUNT)
+    ]
+    try:
+        for client_process in client_processes:
+            assert client_process.stdout.readline().strip() == "ready"
+
+        start = time.time()
+        for client_process in client_processes:
+            client_process.stdin.write("go\n")
+            client_process.stdin.flush()
+
+        while aggregator.received_count < total_events and time.time() - start < DURATION + 10:
+            time.sleep(0.01)
+        duration = time.time() - start
+
+        client_exit_codes = [client_process.wait() for client_process in client_processes]
+    finally:
+        for client_process in client_processes:
+            if client_process.poll() is None:
+                client_process.kill()
+                client_process.wait()
+
+    assert aggregator.stop()
+    top_fingerprints = store.top_fingerprints(limit=FINGERPRINT_COUNT)
+
+    events_per_second = aggregator.received_count / duration
+    print("\naggregated {} events from {} client processes in {:.2f} s ({:.0f} events/s)".format(
+        aggregator.received_count, CLIENT_COUNT, duration, events_per_second))
+
+    assert client_exit_codes == [0] * CLIENT_COUNT
+    assert aggregator.received_count == total_events
+    assert len(top_fingerprints) == FINGERPRINT_COUNT
+    assert sum(info["count"] for info in top_fingerprints) == total_events
+    assert events_per_second >= TARGET_EVENTS_PER_SECOND * MIN_RATE_RATIO
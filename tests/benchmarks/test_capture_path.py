@@ -0,0 +1,74 @@
+import sys
+import time
+import tracemalloc
+
+import exception_dialog.exception_dialog_system as system
+
+TRACEBACK_DEPTH = 10
+
+
+def raise_nested(exc_type, depth):
+    if depth:
+        raise_nested(exc_type, depth - 1)
+    raise exc_type("benchmark exception")
+
+
+def make_exc_infos(count):
+    """exc_info of count exceptions, each with its own fingerprint"""
+    exc_infos = []
+    for exc_index in range(count):
+        exc_type = type("BenchmarkError{}".format(exc_index), (RuntimeError,), {})
+        try:
+            raise_nested(exc_type, TRACEBACK_DEPTH)
+        except RuntimeError:
+            exc_infos.append(sys.exc_info())
+    return exc_infos
+
+
+def test_exception_triggered_latency(headless_session, benchmark_baseline):
+    exc_infos = make_exc_infos(201)
+
+    # first exception of the session, creates the sampler and the headless sink
+    start = time.perf_counter()
+    system.exception_triggered(*exc_infos[0])
+    cold_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for exc_info in exc_infos[1:]:
+        system.exception_triggered(*exc_info)
+    warm_time = (time.perf_counter() - start) / (len(exc_infos) - 1)
+
+    repeat_count = 1000
+    start = time.perf_counter()
+    for _ in range(repeat_count):
+        system.exception_triggered(*exc_infos[-1])
+    repeat_time = (time.perf_counter() - start) / repeat_count
+
+    exc_type, _, exc_trace = exc_infos[-1]
+    assert system.coalescer.occurrences[system.get_exception_fingerprint(exc_type, exc_trace)].count == repeat_count + 1
+
+    benchmark_baseline.check("exception_triggered_cold", cold_time * 1000, min_slack=1.0)
+    benchmark_baseline.check("exception_triggered_warm", warm_time * 1000, min_slack=0.05)
+    benchmark_baseline.check("exception_triggered_repeat", repeat_time * 1000, min_slack=0.02)
+
+
+def test_memory_growth(headless_session, benchmark_baseline):
+    exc_infos = make_exc_infos(6000)
+
+    # fill the coalescer, sampler and file buffers first, after that memory use should stay flat
+    for exc_info in exc_infos[:1000]:
+        system.exception_triggered(*exc_info)
+
+    tracemalloc.start()
+    try:
+        start_size = tracemalloc.get_traced_memory()[0]
+        for exc_info in exc_infos[1000:]:
+            system.exception_triggered(*exc_info)
+        for _ in range(5000):
+            system.exception_triggered(*exc_infos[-1])
+        growth = tracemalloc.get_traced_memory()[0] - start_size
+    finally:
+        tracemalloc.stop()
+
+    benchmark_baseline.check("memory_growth_10k_exceptions", growth / 1024.0, unit="KiB", min_slack=256)
+    assert growth < 16 * 1024 * 1024
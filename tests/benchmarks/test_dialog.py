@@ -0,0 +1,74 @@
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("PySide2")
+
+import exception_dialog.exception_dialog_system as system
+
+
+def raise_exception():
+    try:
+        raise RuntimeError("benchmark exception")
+    except RuntimeError:
+        return sys.exc_info()
+
+
+@pytest.fixture
+def dialog_session(stub_dcc, monkeypatch):
+    monkeypatch.setattr(system.hook_cls, "dialog_instance", None)
+    monkeypatch.setattr(system, "coalescer", system.ExceptionCoalescer(window=0))
+    yield
+    win = system.hook_cls.dialog_instance
+    if win is not None:
+        win.close()
+        win.deleteLater()
+
+
+def time_to_visible(exc_info):
+    start = time.perf_counter()
+    system.exception_triggered(*exc_info)
+    assert system.hook_cls.dialog_instance.isVisible()
+    return time.perf_counter() - start
+
+
+@pytest.mark.parametrize("prewarm", [False, True])
+def test_time_to_visible(dialog_session, benchmark_baseline, prewarm):
+    if prewarm:
+        system.prewarm_dialog_window()
+
+    first_time = time_to_visible(raise_exception())
+
+    # closing only hides the window, later exceptions show the same one again
+    system.hook_cls.dialog_instance.close()
+    later_times = []
+    for _ in range(10):
+        later_times.append(time_to_visible(raise_exception()))
+        system.hook_cls.dialog_instance.close()
+
+    name_suffix = "_prewarmed" if prewarm else ""
+    benchmark_baseline.check("time_to_visible_first" + name_suffix, first_time * 1000, min_slack=20.0)
+    benchmark_baseline.check(
+        "time_to_visible_later" + name_suffix, sum(later_times) / len(later_times) * 1000, min_slack=2.0)
+
+
+@pytest.mark.parametrize("record_count", [1, 100, 10000])
+def test_set_latest_exception_throughput(dialog_session, benchmark_baseline, record_count):
+    from exception_dialog.ui_utils import QtWidgets
+
+    win = system.get_dialog_window()
+    exc_info = raise_exception()
+    records = [system.capture_exception(*exc_info) for _ in range(record_count)]
+
+    start = time.perf_counter()
+    for record in records:
+        win.set_latest_exception(record)
+    win.flush_pending_records()
+    QtWidgets.QApplication.instance().processEvents()
+    duration = time.perf_counter() - start
+
+    assert win.ui.history_model.rowCount() == min(record_count, system.lk.history_max_records)
+    benchmark_baseline.check(
+        "set_latest_exception_{}".format(record_count), duration / record_count * 1000, min_slack=0.05)
+
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+
+import exception_dialog.exception_dialog_system as system
+
+FOLDER_COUNT = 80
+FILES_PER_FOLDER = 200
+EXTENSION_COUNT = 20
+
+
+def create_sys_path_tree(root_path):
+    folder_paths = []
+    for folder_index in range(FOLDER_COUNT):
+        folder_path = os.path.join(str(root_path), "path_{}".format(folder_index))
+        os.makedirs(folder_path)
+        for file_index in range(FILES_PER_FOLDER):
+            open(os.path.join(folder_path, "module_{}.py".format(file_index)), "w").close()
+        folder_paths.append(folder_path)
+
+    extension_path = os.path.join(folder_paths[-1], "exception_dialog_ext_benchmark.py")
+    open(extension_path, "w").close()
+    return folder_paths
+
+
+def test_cold_vs_warm_scan(tmp_path, benchmark_baseline):
+    folder_paths = create_sys_path_tree(tmp_path / "sys_path")
+    index_path = str(tmp_path / "discovery_index.json")
+
+    start = time.perf_counter()
+    cold_modules = system.scan_extension_modules(folder_paths, system.ExtensionDiscoveryIndex(index_path))
+    cold_time = time.perf_counter() - start
+
+    # a new index object, to make sure it's the on-disk index doing the work
+    start = time.perf_counter()
+    warm_modules = system.scan_extension_modules(folder_paths, system.ExtensionDiscoveryIndex(index_path))
+    warm_time = time.perf_counter() - start
+
+    print("\nextension scan of {} folders - cold: {:.2f} ms, warm: {:.2f} ms".format(
+        FOLDER_COUNT, cold_time * 1000, warm_time * 1000))
+
+    assert cold_modules == ["exception_dialog_ext_benchmark"]
+    assert warm_modules == cold_modules
+
+    benchmark_baseline.check("extension_scan_cold", cold_time * 1000, min_slack=5.0)
+    benchmark_baseline.check("extension_scan_warm", warm_time * 1000, min_slack=1.0)
+
+
+def test_changed_folder_is_rescanned(tmp_path):
+    folder_paths = create_sys_path_tree(tmp_path / "sys_path")
+    index = system.ExtensionDiscoveryIndex(str(tmp_path / "discovery_index.json"))
+    system.scan_extension_modules(folder_paths, index)
+
+    new_extension_path = os.path.join(folder_paths[0], "exception_dialog_ext_new.py")
+    open(new_extension_path, "w").close()
+    os.utime(folder_paths[0], (time.time() + 10, time.time() + 10))
+
+    modules = system.scan_extension_modules(folder_paths, index)
+    assert modules == ["exception_dialog_ext_benchmark", "exception_dialog_ext_new"]
+
+
+def test_import_extensions(tmp_path, monkeypatch, benchmark_baseline):
+    folder_paths = create_sys_path_tree(tmp_path / "sys_path")
+    extension_names = ["exception_dialog_ext_benchmark"]
+    for extension_index in range(EXTENSION_COUNT):
+        extension_name = "exception_dialog_ext_benchmark_{}".format(extension_index)
+        extension_path = os.path.join(folder_paths[extension_index * 3 % FOLDER_COUNT], extension_name + ".py")
+        with open(extension_path, "w") as fp:
+            fp.write("import exception_dialog.exception_dialog_system as eds\n")
+            fp.write("class BenchmarkAction{}(eds.BaseExceptionAction):\n    pass\n".format(extension_index))
+        extension_names.append(extension_name)
+
+    monkeypatch.delenv(system.lk.extension_modules_env_var, raising=False)
+    monkeypatch.setattr(system.lk, "extension_discovery_mode", "scan")
+    monkeypatch.setattr(sys, "path", folder_paths + sys.path)
+    monkeypatch.setattr(system, "discovery_index", system.ExtensionDiscoveryIndex(str(tmp_path / "discovery_index.json")))
+    previous_action_classes = list(system.action_registry.action_classes)
+
+    try:
+        start = time.perf_counter()
+        system.import_extensions()
+        cold_time = time.perf_counter() - start
+
+        # nothing changed, so nothing is imported again
+        start = time.perf_counter()
+        reloaded_module_names = system.reload_extensions()
+        incremental_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        system.import_extensions(refresh=True)
+        refresh_time = time.perf_counter() - start
+
+        action_names = set(cls.__name__ for cls in system.action_registry.all_actions)
+        assert reloaded_module_names == []
+        assert set("BenchmarkAction{}".format(i) for i in range(EXTENSION_COUNT)) <= action_names
+    finally:
+        for extension_name in extension_names:
+            sys.modules.pop(extension_name, None)
+            system.extension_states.pop(extension_name, None)
+        system.action_registry.set_action_classes(previous_action_classes)
+
+    benchmark_baseline.check("import_extensions_cold", cold_time * 1000, min_slack=5.0)
+    benchmark_baseline.check("reload_extensions_unchanged", incremental_time * 1000, min_slack=2.0)
+    benchmark_baseline.check("import_extensions_refresh", refresh_time * 1000, min_slack=5.0)
+
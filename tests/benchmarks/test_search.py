@@ -0,0 +1,45 @@
+import time
+
+import exception_dialog.exception_dialog_search as search
+import exception_dialog.exception_dialog_system as system
+
+RECORD_COUNT = 50000
+
+
+def make_records(count):
+    records = []
+    for record_index in range(count):
+        records.append(system.ExceptionRecord(
+            "Error{}".format(record_index % 50),
+            "Object 'node_{}' was not found in layer_{}".format(record_index, record_index % 200),
+            frames=[("/tools/module_{}.py".format(record_index % 300), 10, "run", None)],
+            timestamp=record_index,
+        ))
+    return records
+
+
+def test_search_while_typing(benchmark_baseline):
+    records = make_records(RECORD_COUNT)
+    index = search.RecordIndex()
+
+    start = time.perf_counter()
+    for record_id, record in enumerate(records):
+        index.add(record_id, record)
+    add_time = (time.perf_counter() - start) / RECORD_COUNT
+
+    # every prefix of the text, as it's typed
+    query_text = "node_4242"
+    start = time.perf_counter()
+    for text_length in range(1, len(query_text) + 1):
+        record_ids = index.search(search.RecordQuery(exc_type="error42", module="module_", text=query_text[:text_length]))
+    keystroke_time = (time.perf_counter() - start) / len(query_text)
+    assert record_ids == [4242]
+
+    start = time.perf_counter()
+    for record_id in range(RECORD_COUNT // 2):
+        index.remove(record_id)
+    remove_time = (time.perf_counter() - start) / (RECORD_COUNT // 2)
+
+    benchmark_baseline.check("search_index_add", add_time * 1000, min_slack=0.01)
+    benchmark_baseline.check("search_keystroke_50k_records", keystroke_time * 1000, min_slack=5.0)
+    benchmark_baseline.check("search_index_remove", remove_time * 1000, min_slack=0.01)
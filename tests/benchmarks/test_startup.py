@@ -0,0 +1,23 @@
+import sys
+import time
+
+import pytest
+
+import exception_dialog
+import exception_dialog.exception_dialog_system as system
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_startup_duration(stub_dcc, lazy):
+    start = time.perf_counter()
+    exception_dialog.startup(lazy=lazy)
+    duration = time.perf_counter() - start
+
+    print("\nstartup(lazy={}) took {:.3f} ms".format(lazy, duration * 1000))
+    assert system.SessionInfo.startup_duration is not None
+
+    if lazy:
+        assert sys.excepthook == system.lazy_exception_triggered
+        assert not system.hook_cls.is_loaded
+    else:
+        assert sys.excepthook == system.normal_exception_triggered
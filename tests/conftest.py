@@ -0,0 +1,12 @@
+"""
+pytest configuration for the unittests.
+
+unittest discover -s ./tests imports the tests with this folder in the system paths,
+so the shared helpers and base.py can be imported the same way when running them with pytest.
+"""
+import os
+import sys
+
+tests_path = os.path.dirname(os.path.realpath(__file__))
+if tests_path not in sys.path:
+    sys.path.insert(0, tests_path)
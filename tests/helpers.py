@@ -0,0 +1,44 @@
+"""
+Shared setup of the unittests that run without Maya.
+
+Importing this adds the repository base path to the system paths, same as base.py does for the Maya tests.
+"""
+import os
+import sys
+import threading
+
+# Add repository base path to system paths
+tests_path = os.path.dirname(os.path.realpath(__file__))
+base_path = tests_path.rsplit(os.sep, 1)[0]
+if base_path not in sys.path:
+    sys.path.insert(0, base_path)
+
+import exception_dialog.exception_dialog_system as system
+
+
+def make_record(message, timestamp=1000.0, exc_type_name="RuntimeError", **kwargs):
+    """ExceptionRecord with its own occurrence, and the message as the traceback text unless frames are given"""
+    occurrence = system.ExceptionOccurrence(message.replace(" ", "_"), timestamp)
+    if "frames" not in kwargs:
+        kwargs["text"] = message
+    return system.ExceptionRecord(exc_type_name, message, occurrence=occurrence, timestamp=timestamp, **kwargs)
+
+
+def get_exc_info(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        return sys.exc_info()
+
+
+def run_in_thread(func, *args):
+    thread = threading.Thread(target=func, args=args)
+    thread.start()
+    thread.join()
+
+
+def set_attributes(test_case, target, values):
+    """Set the attributes on target, they're restored when the test is cleaned up"""
+    for attribute_name, value in values.items():
+        test_case.addCleanup(setattr, target, attribute_name, getattr(target, attribute_name))
+        setattr(target, attribute_name, value)
@@ -0,0 +1,150 @@
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+import unittest
+import warnings
+import weakref
+
+from helpers import set_attributes
+import exception_dialog.exception_dialog_headless as exception_dialog_headless
+import exception_dialog.exception_dialog_system as system
+
+
+class SceneData(object):
+    pass
+
+
+def raise_with_scene_data(weak_refs):
+    scene_data = SceneData()
+    weak_refs.append(weakref.ref(scene_data))
+    raise ValueError("failed to process scene data")
+
+
+def raise_with_other_scene_data(weak_refs):
+    other_scene_data = SceneData()
+    weak_refs.append(weakref.ref(other_scene_data))
+    raise TypeError("failed to process other scene data")
+
+
+def get_exc_info(weak_refs, func=raise_with_scene_data):
+    try:
+        func(weak_refs)
+    except Exception:
+        return sys.exc_info()
+
+
+class TestExceptionDialogActions(unittest.TestCase):
+
+    def tearDown(self):
+        # actions defined by the tests shouldn't stay registered for the rest of the session
+        system.action_registry.set_action_classes([
+            cls for cls in system.action_registry.action_classes if cls.__module__ != __name__
+        ])
+
+    def test_legacy_trigger_action_arguments(self):
+        """Actions that take (exc_type, exc_value, exc_trace) are called with those, and warn when they're defined"""
+        received_args = []
+
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter("always")
+
+            class LegacyAction(system.BaseExceptionAction):
+                is_automatic = True
+
+                @staticmethod
+                def trigger_action(exc_type, exc_value, exc_trace):
+                    received_args.append((exc_type, exc_value, traceback.extract_tb(exc_trace)[-1][2]))
+
+        self.assertTrue(any(issubclass(warning.category, DeprecationWarning) for warning in caught_warnings))
+        self.assertIn(LegacyAction, system.action_registry.legacy_actions)
+
+        exc_info = get_exc_info([])
+        record = system.capture_exception(*exc_info)
+        record.exc_info = exc_info
+
+        # runs right away, not on a worker, since the frames are released after the hook returns
+        system.trigger_automatic_action(LegacyAction, record)
+        self.assertEqual(received_args, [(ValueError, exc_info[1], "raise_with_scene_data")])
+
+    def test_only_the_latest_record_keeps_the_exc_info(self):
+        """Through the hook, legacy actions get the traceback, and older records let go of it afterwards"""
+        folder_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder_path, True)
+        sink = exception_dialog_headless.JsonLinesSink(os.path.join(folder_path, "exceptions.jsonl"))
+        self.addCleanup(sink.close, 5)
+
+        captured_records = []
+        capture_exception = system.capture_exception
+
+        def recording_capture_exception(*args, **kwargs):
+            captured_records.append(capture_exception(*args, **kwargs))
+            return captured_records[-1]
+
+        set_attributes(self, system, {"coalescer": system.ExceptionCoalescer(), "capture_exception": recording_capture_exception})
+        set_attributes(self, system.hook_cls, {"is_loaded": True, "is_headless": True, "headless_sink": sink,
+                                               "previous_except_hook": None, "exc_info_record": None})
+        set_attributes(self, system.lk, {"rules_path": None, "store_enabled": False, "aggregator_enabled": False,
+                                         "sampling_enabled": False, "context_enabled": False,
+                                         "capture_locals": False, "release_exception_frames": False})
+
+        received_type_names = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+
+            class LegacyHookAction(system.AutomaticExceptionAction):
+                @staticmethod
+                def trigger_action(exc_type, exc_value, exc_trace):
+                    received_type_names.append(exc_type.__name__)
+
+        weak_refs = []
+        exc_info = get_exc_info(weak_refs)
+        system.normal_exception_triggered(*exc_info)
+        exc_info = get_exc_info(weak_refs, raise_with_other_scene_data)
+        system.normal_exception_triggered(*exc_info)
+        del exc_info
+        gc.collect()
+
+        self.assertEqual(received_type_names, ["ValueError", "TypeError"])
+        self.assertEqual(len(captured_records), 2)
+        self.assertIsNone(captured_records[0].exc_info)
+        self.assertIs(captured_records[1].exc_info[0], TypeError)
+
+        # the frames of the older exception aren't pinned by its record, only the latest one is kept
+        self.assertIsNone(weak_refs[0]())
+        self.assertIsNotNone(weak_refs[1]())
+
+    def test_record_trigger_action_arguments(self):
+        received_records = []
+
+        class RecordAction(system.BaseExceptionAction):
+            @classmethod
+            def trigger_action(cls, exc_record):
+                received_records.append(exc_record)
+
+        self.assertNotIn(RecordAction, system.action_registry.legacy_actions)
+
+        record = system.capture_exception(*get_exc_info([]))
+        system.call_trigger_action(RecordAction, record)
+        self.assertEqual(received_records, [record])
+
+    @unittest.skipIf(not hasattr(traceback, "clear_frames"), "frames can't be cleared in this python version")
+    def test_release_exception_frames_is_checked_per_call(self):
+        """Frames are only cleared while release_exception_frames is set, so pdb.pm() can be used without it"""
+        release_exception_frames = system.lk.release_exception_frames
+        try:
+            weak_refs = []
+            exc_info = get_exc_info(weak_refs)
+            system.lk.release_exception_frames = False
+            system.release_exception_frames(*exc_info)
+            gc.collect()
+            self.assertIsNotNone(weak_refs[0]())
+
+            system.lk.release_exception_frames = True
+            system.release_exception_frames(*exc_info)
+            gc.collect()
+            self.assertIsNone(weak_refs[0]())
+        finally:
+            system.lk.release_exception_frames = release_exception_frames
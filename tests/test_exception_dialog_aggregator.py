@@ -0,0 +1,140 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from helpers import make_record
+import exception_dialog.exception_dialog_aggregator as aggregator_module
+import exception_dialog.exception_dialog_metrics as edm
+import exception_dialog.exception_dialog_store as exception_dialog_store
+
+
+class FailingSocket(object):
+    def __init__(self):
+        self.send_count = 0
+
+    def sendall(self, data):
+        self.send_count += 1
+        raise socket.error("connection reset")
+
+    def close(self):
+        pass
+
+
+@unittest.skipIf(not hasattr(socket, "AF_UNIX"), "needs unix domain sockets")
+class TestExceptionDialogAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp(prefix="eda_")
+        self.socket_path = os.path.join(self.folder_path, "aggregator.sock")
+        self.store = exception_dialog_store.ExceptionStore(os.path.join(self.folder_path, "exceptions.db"))
+        self.aggregator = aggregator_module.Aggregator(self.store, flush_interval=0.05)
+        self.server = None
+        edm.metrics.reset()
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.aggregator.stop()
+        shutil.rmtree(self.folder_path, ignore_errors=True)
+
+    def start_server(self):
+        self.aggregator.start()
+        self.server = aggregator_module.AggregatorServer(self.socket_path, self.aggregator)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def get_counts(self):
+        self.assertTrue(self.aggregator.stop())
+        return dict(
+            (fingerprint_info["message"], fingerprint_info["count"])
+            for fingerprint_info in self.store.top_fingerprints(since=0)
+        )
+
+    def test_repeats_are_added_up_per_fingerprint(self):
+        client = aggregator_module.AggregatorClient(self.socket_path, reconnect_interval=0.05)
+        client._next_connect_time = time.time() + 60  # hold the messages in the queue
+
+        exc_record = make_record("repeated exception", 1000.0)
+        client.send_record(exc_record)
+        for repeat_index in range(5000):
+            client.send_repeat_count(exc_record.fingerprint, 1000.0 + repeat_index)
+
+        # the repeats are kept as a single count
+        self.assertEqual(len(client._messages), 1)
+        self.assertEqual(client.repeats.pending_repeats[exc_record.fingerprint], (5000, 5999.0))
+
+        self.start_server()
+        client._next_connect_time = 0
+        self.assertTrue(client.flush(5))
+        self.assertEqual(self.aggregator.received_count, 2)
+        self.assertEqual(self.get_counts(), {"repeated exception": 5001})
+
+    def test_full_queue_keeps_earlier_records(self):
+        client = aggregator_module.AggregatorClient(self.socket_path, queue_size=2, reconnect_interval=0.05)
+        client._next_connect_time = time.time() + 60  # hold the messages in the queue
+
+        for record_index in range(3):
+            client.send_record(make_record("exception {}".format(record_index), 1000.0))
+        client.send({"kind": "context", "context_id": "context"})
+
+        self.assertEqual(client.dropped_count, 1)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.aggregator_messages_dropped], 1)
+        self.assertEqual(
+            [message.get("message") for message, exc_record in client._messages],
+            ["exception 0", "exception 1", None],
+        )
+
+    def test_unsent_messages_are_sent_after_reconnecting(self):
+        self.start_server()
+        client = aggregator_module.AggregatorClient(self.socket_path, reconnect_interval=0.05)
+        failing_socket = FailingSocket()
+        client._socket = failing_socket
+
+        exc_record = make_record("reconnect exception", 1000.0)
+        client.send_record(exc_record)
+        client.send_repeat_count(exc_record.fingerprint, 1001.0, count=2)
+
+        end_time = time.time() + 5
+        while not failing_socket.send_count and time.time() < end_time:
+            time.sleep(0.01)
+        self.assertEqual(failing_socket.send_count, 1)
+
+        self.assertTrue(client.flush(5))
+        self.assertEqual(self.get_counts(), {"reconnect exception": 3})
+
+    def test_nothing_is_kept_without_an_aggregator(self):
+        client = aggregator_module.AggregatorClient(self.socket_path, reconnect_interval=60)
+        client.send_record(make_record("unsent exception", 1000.0))
+
+        # the exit flush doesn't wait for an aggregator that isn't running
+        start_time = time.time()
+        self.assertFalse(client.flush(5))
+        self.assertLess(time.time() - start_time, 1.0)
+        self.assertFalse(client.has_pending_messages())
+
+        client.send_record(make_record("later exception", 1000.0))
+        client.send_repeat_count("later_exception", 1001.0)
+        self.assertFalse(client.has_pending_messages())
+        self.assertEqual(client.dropped_count, 3)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.aggregator_messages_dropped], 3)
+
+    def test_encoding_failures_are_counted(self):
+        self.start_server()
+        client = aggregator_module.AggregatorClient(self.socket_path, reconnect_interval=0.05)
+        client.send({"kind": "record", "fingerprint": "unencodable", "value": object()})
+        client.send_record(make_record("encoded exception", 1000.0))
+
+        self.assertTrue(client.flush(5))
+        self.assertEqual(client.failed_count, 1)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.aggregator_messages_failed], 1)
+        self.assertEqual(self.get_counts(), {"encoded exception": 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from helpers import get_exc_info
+import exception_dialog.exception_dialog_headless as exception_dialog_headless
+import exception_dialog.exception_dialog_system as system
+
+
+def raise_value_error():
+    raise ValueError("viewport callback failed")
+
+
+def raise_type_error():
+    raise TypeError("viewport callback failed")
+
+
+class TestExceptionDialogCoalescing(unittest.TestCase):
+
+    def test_fingerprint(self):
+        first_exc_info = get_exc_info(raise_value_error)
+        second_exc_info = get_exc_info(raise_value_error)
+        first_fingerprint = system.get_exception_fingerprint(first_exc_info[0], first_exc_info[2])
+
+        # the message isn't part of it, the type and the frames are
+        self.assertEqual(first_fingerprint, system.get_exception_fingerprint(second_exc_info[0], second_exc_info[2]))
+        type_exc_info = get_exc_info(raise_type_error)
+        self.assertNotEqual(first_fingerprint, system.get_exception_fingerprint(type_exc_info[0], type_exc_info[2]))
+        self.assertNotEqual(first_fingerprint, system.get_exception_fingerprint(ValueError, None))
+
+    def test_repeats_within_the_window(self):
+        coalescer = system.ExceptionCoalescer(window=5.0, max_fingerprints=10)
+
+        first_occurrence, is_new = coalescer.add("fingerprint", timestamp=100.0)
+        self.assertTrue(is_new)
+        for timestamp in (101.0, 102.0, 104.9):
+            occurrence, is_new = coalescer.add("fingerprint", timestamp=timestamp)
+            self.assertFalse(is_new)
+            self.assertIs(occurrence, first_occurrence)
+
+        self.assertEqual(first_occurrence.count, 4)
+        self.assertEqual(first_occurrence.first_time, 100.0)
+        self.assertEqual(first_occurrence.last_time, 104.9)
+
+        # the window starts at the first occurrence
+        later_occurrence, is_new = coalescer.add("fingerprint", timestamp=105.0)
+        self.assertTrue(is_new)
+        self.assertEqual(later_occurrence.count, 1)
+
+    def test_fingerprints_are_bounded(self):
+        coalescer = system.ExceptionCoalescer(window=5.0, max_fingerprints=10)
+        for index in range(5):
+            coalescer.add("expired {}".format(index), timestamp=100.0)
+        for index in range(5):
+            coalescer.add("recent {}".format(index), timestamp=104.0 + index * 0.1)
+
+        # expired fingerprints are pruned first
+        coalescer.add("new", timestamp=106.0)
+        self.assertEqual(len(coalescer.occurrences), 6)
+        self.assertNotIn("expired 0", coalescer.occurrences)
+
+        # when everything is within the window, the oldest half goes
+        for index in range(4):
+            coalescer.add("newer {}".format(index), timestamp=106.5)
+        coalescer.add("newest", timestamp=107.0)
+        self.assertEqual(len(coalescer.occurrences), 6)
+        self.assertNotIn("recent 0", coalescer.occurrences)
+        self.assertIn("newest", coalescer.occurrences)
+
+    def test_threads_share_the_occurrences(self):
+        if hasattr(sys, "setswitchinterval"):
+            # switch threads as often as possible, to make them interleave within add()
+            self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+            sys.setswitchinterval(0.000001)
+
+        coalescer = system.ExceptionCoalescer(window=1000.0, max_fingerprints=20)
+        new_counts = collections.Counter()
+
+        def add_occurrences():
+            for index in range(2000):
+                occurrence, is_new = coalescer.add("fingerprint {}".format(index % 5), timestamp=100.0)
+                if is_new:
+                    new_counts[occurrence.fingerprint] += 1
+
+        threads = [threading.Thread(target=add_occurrences) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(new_counts.values()), [1] * 5)
+        self.assertEqual(sum(occurrence.count for occurrence in coalescer.occurrences.values()), 8 * 2000)
+
+    def test_storm_is_formatted_once(self):
+        folder_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder_path, True)
+        sink = exception_dialog_headless.JsonLinesSink(os.path.join(folder_path, "exceptions.jsonl"), flush_interval=0.05)
+        self.addCleanup(sink.close, 5)
+
+        captured_records = []
+        capture_exception = system.capture_exception
+
+        def counting_capture_exception(*args, **kwargs):
+            captured_records.append(capture_exception(*args, **kwargs))
+            return captured_records[-1]
+
+        module_state = {"coalescer": system.ExceptionCoalescer(), "capture_exception": counting_capture_exception}
+        hook_state = {"is_headless": True, "headless_sink": sink}
+        constants = {"rules_path": None, "store_enabled": False, "aggregator_enabled": False,
+                     "sampling_enabled": False, "context_enabled": False}
+        for target, state in ((system, module_state), (system.hook_cls, hook_state), (system.lk, constants)):
+            for attribute_name, value in state.items():
+                self.addCleanup(setattr, target, attribute_name, getattr(target, attribute_name))
+                setattr(target, attribute_name, value)
+
+        exc_info = get_exc_info(raise_value_error)
+        for _ in range(500):
+            system.exception_triggered(*exc_info)
+
+        self.assertEqual(len(captured_records), 1)
+        self.assertEqual(captured_records[0].occurrence.count, 500)
+
+        self.assertTrue(sink.flush(5))
+        with open(sink.file_path, "r") as fp:
+            lines = [json.loads(line) for line in fp]
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["exc_type_name"], "ValueError")
+        self.assertEqual(lines[1]["kind"], "repeat")
+        self.assertEqual(lines[1]["count"], 499)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import unittest
+
+from helpers import run_in_thread, set_attributes
+import exception_dialog.exception_dialog_dcc_core as dcc_core
+import exception_dialog.exception_dialog_system as system
+
+
+class MainThreadContextProvider(dcc_core.ContextProvider):
+    """Like the DCC providers, only available on the main thread"""
+    name = "main_thread"
+
+    def __init__(self):
+        self.snapshot_count = 0
+
+    def get_snapshot(self):
+        if threading.current_thread().name != "MainThread":
+            raise dcc_core.SnapshotUnavailable("snapshot was taken outside of the main thread")
+        self.snapshot_count += 1
+        return {"scene": "shot_010.ma"}
+
+
+class FailingContextProvider(dcc_core.ContextProvider):
+    name = "failing"
+
+    def get_snapshot(self):
+        raise RuntimeError("no license")
+
+    def get_delta(self, snapshot):
+        raise RuntimeError("no license")
+
+
+class TestExceptionDialogContext(unittest.TestCase):
+
+    def test_same_environment_same_id(self):
+        providers = [dcc_core.PythonContextProvider(), dcc_core.SysPathContextProvider()]
+        snapshot = dcc_core.ContextSnapshot(providers)
+
+        self.assertEqual(snapshot.context_id, dcc_core.ContextSnapshot(providers).context_id)
+        self.assertEqual(snapshot.data["sys_path"], sys.path)
+        self.assertEqual(snapshot.to_dict()["context_id"], snapshot.context_id)
+        self.assertIsNone(snapshot.get_delta())
+
+    def test_deltas(self):
+        snapshot = dcc_core.ContextSnapshot([
+            dcc_core.SysPathContextProvider(),
+            dcc_core.EnvironmentVariablesContextProvider(),
+        ])
+
+        sys.path.append("/exception_dialog_test_path")
+        self.addCleanup(sys.path.remove, "/exception_dialog_test_path")
+        os.environ["EXCEPTION_DIALOG_TEST_CONTEXT"] = "1"
+        self.addCleanup(os.environ.pop, "EXCEPTION_DIALOG_TEST_CONTEXT")
+        os.environ["EXCEPTION_DIALOG_TEST_TOKEN"] = "not to be reported"
+        self.addCleanup(os.environ.pop, "EXCEPTION_DIALOG_TEST_TOKEN")
+
+        delta = snapshot.get_delta()
+        self.assertEqual(delta["sys_path"], {"added": ["/exception_dialog_test_path"], "removed": []})
+        self.assertEqual(delta["environment_variables"]["EXCEPTION_DIALOG_TEST_CONTEXT"], "1")
+        self.assertEqual(delta["environment_variables"]["EXCEPTION_DIALOG_TEST_TOKEN"], "<hidden>")
+
+    def test_failing_provider(self):
+        """A failing provider is recorded as an error, and doesn't stop the other parts or the deltas"""
+        snapshot = dcc_core.ContextSnapshot([FailingContextProvider(), dcc_core.SysPathContextProvider()])
+
+        self.assertEqual(snapshot.data["failing"], {"error": "RuntimeError: no license"})
+        self.assertEqual(snapshot.unavailable_names, set())
+        self.assertEqual(snapshot.data["sys_path"], sys.path)
+        self.assertIsNone(snapshot.get_delta())
+
+    def test_retake_unavailable_parts(self):
+        main_thread_provider = MainThreadContextProvider()
+        snapshots = []
+        run_in_thread(lambda: snapshots.append(
+            dcc_core.ContextSnapshot([main_thread_provider, dcc_core.SysPathContextProvider()])))
+        snapshot = snapshots[0]
+
+        self.assertEqual(snapshot.unavailable_names, {"main_thread"})
+        self.assertEqual(snapshot.data["main_thread"], {"error": "snapshot was taken outside of the main thread"})
+
+        retaken_snapshot = snapshot.retake()
+        self.assertEqual(retaken_snapshot.unavailable_names, set())
+        self.assertEqual(retaken_snapshot.data["main_thread"], {"scene": "shot_010.ma"})
+        self.assertIs(retaken_snapshot.data["sys_path"], snapshot.data["sys_path"])  # the available parts are kept
+        self.assertNotEqual(retaken_snapshot.context_id, snapshot.context_id)
+        self.assertEqual(main_thread_provider.snapshot_count, 1)
+
+    def test_session_snapshot_is_retaken_on_the_main_thread(self):
+        """The first exception of the session came from a worker thread, the next one on the main thread completes it"""
+        main_thread_provider = MainThreadContextProvider()
+
+        class ContextDCC(dcc_core.ExceptionDialogCoreInterface):
+            def get_context_providers(self):
+                return [main_thread_provider, dcc_core.SysPathContextProvider()]
+
+        set_attributes(self, system, {"dcc": ContextDCC()})
+        set_attributes(self, system.hook_cls, {"context_snapshot": None})
+
+        snapshots = []
+        run_in_thread(lambda: snapshots.append(system.get_context_snapshot()))
+        self.assertEqual(snapshots[0].unavailable_names, {"main_thread"})
+
+        # other threads keep the incomplete snapshot
+        run_in_thread(lambda: snapshots.append(system.get_context_snapshot()))
+        self.assertIs(snapshots[1], snapshots[0])
+
+        snapshot = system.get_context_snapshot()
+        self.assertEqual(snapshot.data["main_thread"], {"scene": "shot_010.ma"})
+        self.assertIs(system.get_context_snapshot(), snapshot)
+        self.assertEqual(main_thread_provider.snapshot_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
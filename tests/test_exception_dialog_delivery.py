@@ -0,0 +1,169 @@
+import gzip
+import io
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+if sys.version_info.major >= 3:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from helpers import make_record
+import exception_dialog.exception_dialog_delivery as delivery
+import exception_dialog.exception_dialog_system as system
+
+
+class ReportServer(ThreadingMixIn, HTTPServer):
+    """Stand-in for an issue tracker, records the batches it receives"""
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), ReportRequestHandler)
+        self.batches = []
+        self.content_encodings = []
+        self.client_ports = set()
+        self.failures_left = 0  # answer this many requests with an error first
+        self.response_delay = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/reports".format(self.server_address[1])
+
+    @property
+    def reports(self):
+        return [report for batch in self.batches for report in batch["reports"]]
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.server.response_delay)
+
+        if self.server.failures_left > 0:
+            self.server.failures_left -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.server.content_encodings.append(self.headers.get("Content-Encoding"))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+        self.server.batches.append(json.loads(body.decode("utf-8")))
+        self.server.client_ports.add(self.client_address[1])
+
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestExceptionDialogDelivery(unittest.TestCase):
+
+    def setUp(self):
+        self.spool_path = tempfile.mkdtemp()
+        self.server = ReportServer()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        self.delivery = delivery.ReportDelivery(
+            delivery.Endpoint("tracker", self.server.url, batch_size=10),
+            self.spool_path,
+            retry_base_delay=0.05,
+            retry_max_delay=0.2,
+        )
+
+    def tearDown(self):
+        self.delivery.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        delivery.connection_pool.clear()
+        shutil.rmtree(self.spool_path, ignore_errors=True)
+
+    def test_reports_are_batched_over_one_connection(self):
+        """Reports arrive compressed, in batches, over a reused keep-alive connection"""
+        for report_index in range(25):
+            self.delivery.deliver({"index": report_index})
+
+        self.assertTrue(self.delivery.flush(timeout=10))
+        self.assertEqual(sorted(report["index"] for report in self.server.reports), list(range(25)))
+        self.assertLessEqual(max(len(batch["reports"]) for batch in self.server.batches), 10)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_failed_deliveries_are_retried(self):
+        """Reports are kept while the endpoint returns errors, and sent once it recovers"""
+        self.server.failures_left = 3
+        self.delivery.deliver({"index": 0})
+
+        self.assertTrue(self.delivery.flush(timeout=10))
+        self.assertEqual(self.server.reports, [{"index": 0}])
+        self.assertEqual(self.delivery.retry_count, 0)
+
+    def test_reports_survive_an_unreachable_endpoint(self):
+        """Reports spooled while the endpoint is down are sent by the next session"""
+        unreachable_delivery = delivery.ReportDelivery(
+            delivery.Endpoint("tracker", "http://127.0.0.1:1/reports"),
+            self.spool_path,
+            retry_base_delay=10,
+        )
+        unreachable_delivery.deliver({"index": 0})
+        self.assertFalse(unreachable_delivery.flush(timeout=0.5))
+        unreachable_delivery.stop()
+
+        self.delivery.start()
+        self.assertTrue(self.delivery.flush(timeout=10))
+        self.assertEqual(self.server.reports, [{"index": 0}])
+
+    def test_deliver_does_not_wait_for_the_endpoint(self):
+        """A slow endpoint doesn't slow down the action handing over the report"""
+        self.server.response_delay = 1.0
+        self.delivery.deliver({"index": 0})
+
+        start_time = time.time()
+        for report_index in range(1, 20):
+            self.delivery.deliver({"index": report_index})
+        self.assertLess(time.time() - start_time, 0.5)
+
+        self.assertTrue(self.delivery.flush(timeout=10))
+        self.assertEqual(len(self.server.reports), 20)
+
+    def test_worker_keeps_running_after_an_error(self):
+        """An unexpected error while sending keeps the reports, and they're sent after the backoff"""
+        failures_left = [2]
+
+        def format_batch(reports):
+            if failures_left[0]:
+                failures_left[0] -= 1
+                raise KeyError("report field")
+            return delivery.format_json_batch(reports)
+
+        self.delivery.endpoint.format_batch = format_batch
+        self.delivery.deliver({"index": 0})
+
+        self.assertTrue(self.delivery.flush(timeout=10))
+        self.assertEqual(self.server.reports, [{"index": 0}])
+        self.assertEqual(failures_left, [0])
+        self.assertTrue(self.delivery._worker_thread.is_alive())
+
+    def test_slack_messages(self):
+        """The slack action's endpoint sends uncompressed {"text": ...} messages, like webhooks expect"""
+        slack_delivery = delivery.register_endpoint("slack", self.server.url, spool_path=self.spool_path)
+        self.addCleanup(delivery.deliveries.pop, "slack", None)
+        self.addCleanup(slack_delivery.stop)
+
+        system.SlackExceptionAction.trigger_action(make_record("slack exception"))
+        self.assertTrue(slack_delivery.flush(timeout=10))
+        self.assertEqual(self.server.batches, [{"text": "```slack exception```"}])
+        self.assertEqual(self.server.content_encodings, [None])
@@ -0,0 +1,131 @@
+import threading
+import time
+import unittest
+
+import helpers  # adds the repository base path to the system paths
+import exception_dialog.exception_dialog_dispatcher as dispatcher
+import exception_dialog.exception_dialog_metrics as edm
+
+
+class BlockingAction(object):
+    """Stand-in for an action class, holds the workers until release_event is set"""
+    timeout = None
+    release_event = threading.Event()
+    started_records = []
+
+    @classmethod
+    def trigger_action(cls, exc_record):
+        cls.started_records.append(exc_record)
+        cls.release_event.wait(10)
+
+
+class HangingAction(object):
+    timeout = 0.1
+    release_event = threading.Event()
+
+    @classmethod
+    def trigger_action(cls, exc_record):
+        cls.release_event.wait(10)
+
+
+class RecordingAction(object):
+    timeout = 1.0
+    records = []
+    thread_names = set()
+
+    @classmethod
+    def trigger_action(cls, exc_record):
+        cls.records.append(exc_record)
+        cls.thread_names.add(threading.current_thread().name)
+
+
+class TestExceptionDialogDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        edm.metrics.reset()
+        BlockingAction.release_event.clear()
+        BlockingAction.started_records = []
+        HangingAction.release_event.clear()
+        RecordingAction.records = []
+        RecordingAction.thread_names = set()
+        self.action_dispatchers = []
+
+    def tearDown(self):
+        BlockingAction.release_event.set()
+        HangingAction.release_event.set()
+        for action_dispatcher in self.action_dispatchers:
+            action_dispatcher.shutdown(timeout=5)
+
+    def create_dispatcher(self, **kwargs):
+        action_dispatcher = dispatcher.ActionDispatcher(**kwargs)
+        self.action_dispatchers.append(action_dispatcher)
+        return action_dispatcher
+
+    def fill_queue(self, action_dispatcher):
+        """Occupy the single worker, and fill the queue behind it"""
+        action_dispatcher.submit(BlockingAction, "running")
+        end_time = time.time() + 5
+        while not BlockingAction.started_records and time.time() < end_time:
+            time.sleep(0.01)
+
+        for record_index in range(action_dispatcher.jobs.maxsize):
+            self.assertTrue(action_dispatcher.submit(BlockingAction, "queued_{}".format(record_index)))
+
+    def test_drop_newest_policy(self):
+        action_dispatcher = self.create_dispatcher(worker_count=1, queue_size=2, policy=dispatcher.QueuePolicy.drop_newest)
+        self.fill_queue(action_dispatcher)
+
+        self.assertFalse(action_dispatcher.submit(BlockingAction, "new"))
+        BlockingAction.release_event.set()
+        self.assertTrue(action_dispatcher.flush(timeout=5))
+
+        self.assertEqual(BlockingAction.started_records, ["running", "queued_0", "queued_1"])
+        self.assertEqual(action_dispatcher.dropped_count, 1)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.actions_dropped], 1)
+
+    def test_drop_oldest_policy(self):
+        """The oldest queued job makes room for the new one, and counts as dropped"""
+        action_dispatcher = self.create_dispatcher(worker_count=1, queue_size=2, policy=dispatcher.QueuePolicy.drop_oldest)
+        self.fill_queue(action_dispatcher)
+
+        self.assertTrue(action_dispatcher.submit(BlockingAction, "new"))
+        BlockingAction.release_event.set()
+        self.assertTrue(action_dispatcher.flush(timeout=5))
+
+        self.assertEqual(BlockingAction.started_records, ["running", "queued_1", "new"])
+        self.assertEqual(action_dispatcher.dropped_count, 1)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.actions_dropped], 1)
+
+    def test_block_policy(self):
+        action_dispatcher = self.create_dispatcher(
+            worker_count=1, queue_size=2, policy=dispatcher.QueuePolicy.block, block_timeout=0.05)
+        self.fill_queue(action_dispatcher)
+
+        start_time = time.time()
+        self.assertFalse(action_dispatcher.submit(BlockingAction, "new"))
+        self.assertGreaterEqual(time.time() - start_time, 0.04)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.actions_dropped], 1)
+
+    def test_timeouts_run_on_the_pool(self):
+        """Actions with a timeout don't get a thread each, a hanging one is replaced by a single new worker"""
+        action_dispatcher = self.create_dispatcher(worker_count=2, queue_size=100)
+        for record_index in range(20):
+            action_dispatcher.submit(RecordingAction, record_index)
+        self.assertTrue(action_dispatcher.flush(timeout=5))
+
+        self.assertEqual(sorted(RecordingAction.records), list(range(20)))
+        self.assertTrue(all(name.startswith("ExceptionActionWorker") for name in RecordingAction.thread_names))
+        self.assertEqual(len(action_dispatcher.workers), 2)
+
+        action_dispatcher.submit(HangingAction, "hanging")
+        self.assertTrue(action_dispatcher.flush(timeout=5))
+        self.assertEqual(action_dispatcher.timed_out_count, 1)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.actions_timed_out], 1)
+        self.assertEqual(len(action_dispatcher.workers), 3)
+        self.assertEqual(len(action_dispatcher.get_active_workers()), 2)
+
+        # the pool still has two workers for new jobs while the hanging action is stuck
+        for record_index in range(20, 30):
+            action_dispatcher.submit(RecordingAction, record_index)
+        self.assertTrue(action_dispatcher.flush(timeout=5))
+        self.assertEqual(sorted(RecordingAction.records), list(range(30)))
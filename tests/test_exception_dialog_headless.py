@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from helpers import make_record, set_attributes
+import exception_dialog.exception_dialog_headless as exception_dialog_headless
+import exception_dialog.exception_dialog_system as system
+
+
+def read_lines(file_path):
+    with open(file_path, "r") as fp:
+        return [json.loads(line) for line in fp]
+
+
+class TestExceptionDialogHeadless(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.folder_path, "exceptions.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder_path, ignore_errors=True)
+
+    def create_sink(self, **kwargs):
+        sink = exception_dialog_headless.JsonLinesSink(self.file_path, flush_interval=0.05, **kwargs)
+        self.addCleanup(sink.close, 5)
+        return sink
+
+    def test_repeats_are_written_as_one_line(self):
+        sink = self.create_sink()
+        exc_record = make_record("repeated exception", 1000.0)
+        sink.write_record(exc_record)
+        for repeat_index in range(1000):
+            sink.add_repeat_count(exc_record.fingerprint, 1000.0 + repeat_index)
+        self.assertTrue(sink.flush(5))
+
+        lines = read_lines(self.file_path)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]["message"], "repeated exception")
+        self.assertEqual(lines[0]["text"], "repeated exception")  # added on the writer thread
+        self.assertEqual(
+            lines[1], {"kind": "repeat", "fingerprint": exc_record.fingerprint, "last_time": 1999.0, "count": 1000})
+
+    def test_repeats_without_new_records_are_written(self):
+        sink = self.create_sink()
+        exc_record = make_record("idle exception", 1000.0)
+        sink.write_record(exc_record)
+        self.assertTrue(sink.flush(5))
+
+        sink.add_repeat(exc_record.occurrence, count=3)
+        self.assertTrue(sink.flush(5))
+        self.assertEqual(read_lines(self.file_path)[-1]["count"], 3)
+
+    def test_rotation(self):
+        sink = self.create_sink(max_bytes=2000, backup_count=2)
+        context_data = {"context_id": "context", "timestamp": 1000.0, "data": {}}
+        for record_index in range(100):
+            sink.write(make_record("exception {}".format(record_index), 1000.0).to_dict(), context_data)
+        self.assertTrue(sink.flush(5))
+
+        file_names = sorted(os.listdir(self.folder_path))
+        self.assertEqual(file_names, ["exceptions.jsonl", "exceptions.jsonl.1", "exceptions.jsonl.2"])
+        for file_name in file_names:
+            file_path = os.path.join(self.folder_path, file_name)
+            self.assertLessEqual(os.path.getsize(file_path), 2000 + 200)  # the context line can go over
+            # every file starts with the context its records refer to
+            self.assertEqual(read_lines(file_path)[0]["kind"], "context")
+
+        self.assertEqual(read_lines(self.file_path)[-1]["message"], "exception 99")
+
+    def test_log_file_is_made_per_process(self):
+        path_template = os.path.join(self.folder_path, "exceptions_{host}_{pid}.jsonl")
+        sink = exception_dialog_headless.create_sink(path_template, max_bytes=0, backup_count=0)
+        self.addCleanup(sink.close, 5)
+        self.assertEqual(sink.file_path, exception_dialog_headless.get_log_file_path(path_template))
+        self.assertTrue(sink.file_path.endswith("_{}.jsonl".format(os.getpid())))
+
+        # a forked child gets a sink (and log file) of its own instead of writing to the one of its parent
+        set_attributes(self, system.lk, {"headless_log_path": path_template})
+        set_attributes(self, system.hook_cls, {"headless_sink": sink})
+        self.assertIs(system.get_headless_sink(), sink)
+        sink.pid = -1
+        child_sink = system.get_headless_sink()
+        self.addCleanup(child_sink.close, 5)
+        self.assertIsNot(child_sink, sink)
+
+    def test_old_log_files_are_removed(self):
+        path_template = os.path.join(self.folder_path, "exceptions_{host}_{pid}.jsonl")
+        now = time.time()
+        old_file_names = []
+        for file_index, file_age in enumerate([60, 120, 180, 10 * 24 * 60 * 60]):
+            file_path = exception_dialog_headless.get_log_file_path(path_template, pid=100000 + file_index)
+            open(file_path, "w").close()
+            os.utime(file_path, (now - file_age, now - file_age))
+            old_file_names.append(os.path.basename(file_path))
+        other_host_path = os.path.join(self.folder_path, "exceptions_otherhost_1.jsonl")
+        open(other_host_path, "w").close()
+
+        sink = exception_dialog_headless.create_sink(
+            path_template, max_bytes=0, backup_count=0, max_old_files=2, max_old_file_age=24 * 60 * 60)
+        self.addCleanup(sink.close, 5)
+        sink.write_record(make_record("exception", 1000.0))
+        self.assertTrue(sink.flush(5))
+
+        # the two newest of this host are kept, the one past the age and the one past the count are removed
+        expected_file_names = old_file_names[:2] + [os.path.basename(sink.file_path), os.path.basename(other_host_path)]
+        self.assertEqual(sorted(os.listdir(self.folder_path)), sorted(expected_file_names))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import unittest
+
+# the models are tested without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import PySide2
+except ImportError:
+    PySide2 = None
+
+from helpers import make_record
+import exception_dialog.exception_dialog_search as exception_dialog_search
+import exception_dialog.exception_dialog_system as system
+
+
+class TestRecordRingBuffer(unittest.TestCase):
+
+    def test_append_overwrites_the_oldest(self):
+        ring_buffer = system.RecordRingBuffer(3)
+        dropped_items = [ring_buffer.append(item) for item in range(5)]
+
+        self.assertEqual(dropped_items, [None, None, None, 0, 1])
+        self.assertEqual(len(ring_buffer), 3)
+        self.assertTrue(ring_buffer.is_full())
+        self.assertEqual(list(ring_buffer), [2, 3, 4])
+        self.assertEqual(ring_buffer[0], 2)
+        self.assertEqual(ring_buffer[-1], 4)
+        self.assertRaises(IndexError, lambda: ring_buffer[3])
+
+    def test_pop_oldest(self):
+        ring_buffer = system.RecordRingBuffer(2)
+        for item in range(3):
+            ring_buffer.append(item)
+
+        self.assertEqual(ring_buffer.pop_oldest(), 1)
+        self.assertEqual(ring_buffer.pop_oldest(), 2)
+        self.assertEqual(len(ring_buffer), 0)
+        self.assertRaises(IndexError, ring_buffer.pop_oldest)
+
+        # the slots are cleared, so dropped records can be freed
+        self.assertEqual(ring_buffer.items, [None, None])
+
+    def test_size_is_at_least_one(self):
+        ring_buffer = system.RecordRingBuffer(0)
+        ring_buffer.append("first")
+        ring_buffer.append("second")
+        self.assertEqual(list(ring_buffer), ["second"])
+
+
+@unittest.skipIf(PySide2 is None, "needs PySide2")
+class TestExceptionHistoryModel(unittest.TestCase):
+
+    def setUp(self):
+        from exception_dialog import exception_dialog_ui
+        self.history_model = exception_dialog_ui.ExceptionHistoryModel(max_records=5)
+        self.filter_model = exception_dialog_ui.ExceptionHistoryFilterModel(self.history_model)
+
+    def test_history_is_bounded(self):
+        removed_rows = []
+        self.history_model.rowsRemoved.connect(lambda parent, first, last: removed_rows.append((first, last)))
+
+        for batch_index in range(4):
+            self.history_model.add_records([make_record("exception {} {}".format(batch_index, index)) for index in range(3)])
+
+        self.assertEqual(self.history_model.rowCount(), 5)
+        self.assertEqual(self.history_model.first_record_id, 7)
+        self.assertEqual(len(self.history_model.search_index), 5)
+        self.assertEqual(removed_rows, [(0, 0), (0, 2), (0, 2)])
+        self.assertEqual(
+            [record.message for record in self.history_model.records],
+            ["exception 2 1", "exception 2 2", "exception 3 0", "exception 3 1", "exception 3 2"],
+        )
+
+        # a batch bigger than the history only keeps its newest records
+        self.history_model.add_records([make_record("large batch {}".format(index)) for index in range(8)])
+        self.assertEqual(self.history_model.rowCount(), 5)
+        self.assertEqual(self.history_model.records[0].message, "large batch 3")
+
+    def test_display_text(self):
+        exc_record = make_record("first line\nsecond line")
+        exc_record.occurrence.count = 3
+        self.history_model.add_records([exc_record])
+
+        display_text = self.history_model.data(self.history_model.index(0))
+        self.assertIn("RuntimeError: first line", display_text)
+        self.assertIn("(x3, last at", display_text)
+        self.assertNotIn("second line", display_text)
+
+    def test_filter_follows_the_history(self):
+        self.history_model.add_records([make_record("render failed {}".format(index)) for index in range(3)])
+        self.filter_model.set_query(exception_dialog_search.RecordQuery(text="render"))
+        self.assertEqual(self.filter_model.rowCount(), 3)
+
+        # records that match are added to the filtered rows, dropped records removed from them
+        self.history_model.add_records([make_record("export failed"), make_record("render failed again")])
+        self.history_model.add_records([make_record("render failed last"), make_record("export failed again")])
+
+        self.assertEqual(self.history_model.rowCount(), 5)
+        self.assertEqual(
+            [self.filter_model.get_record(self.filter_model.index(row)).message for row in range(self.filter_model.rowCount())],
+            ["render failed 2", "render failed again", "render failed last"],
+        )
+
+        self.filter_model.set_query(None)
+        self.assertEqual(self.filter_model.rowCount(), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
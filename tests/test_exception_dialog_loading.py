@@ -0,0 +1,138 @@
+import collections
+import threading
+import unittest
+
+from helpers import run_in_thread
+import exception_dialog.exception_dialog_dcc_core as dcc_core
+import exception_dialog.exception_dialog_system as system
+
+HookArgs = collections.namedtuple("HookArgs", "exc_type exc_value exc_traceback thread")
+
+
+class DeferredDcc(dcc_core.ExceptionDialogCoreInterface):
+    def __init__(self):
+        self.deferred_funcs = []
+
+    def execute_deferred(self, func):
+        self.deferred_funcs.append(func)
+        return True
+
+    def run_deferred(self):
+        deferred_funcs, self.deferred_funcs = self.deferred_funcs, []
+        for func in deferred_funcs:
+            func()
+
+
+class TestExceptionDialogLoading(unittest.TestCase):
+
+    def setUp(self):
+        self.load_threads = []
+        self.dcc = DeferredDcc()
+
+        hook_state = dict(
+            (attribute_name, getattr(system.hook_cls, attribute_name)) for attribute_name in
+            ("is_loaded", "is_load_pending", "is_headless", "is_ui_imported", "is_main_thread_drain_pending",
+             "previous_threading_except_hook")
+        )
+        module_state = dict(
+            (attribute_name, getattr(system, attribute_name)) for attribute_name in
+            ("dcc", "import_extensions", "exception_triggered", "import_dialog_ui", "drain_main_thread_records")
+        )
+
+        def restore():
+            for attribute_name, value in hook_state.items():
+                setattr(system.hook_cls, attribute_name, value)
+            for attribute_name, value in module_state.items():
+                setattr(system, attribute_name, value)
+            system.hook_cls.main_thread_records.clear()
+            system.hook_cls.has_main_thread_repeats = False
+        self.addCleanup(restore)
+
+        system.hook_cls.is_loaded = False
+        system.hook_cls.is_load_pending = False
+        system.hook_cls.is_headless = False
+        system.hook_cls.is_ui_imported = False
+        system.hook_cls.is_main_thread_drain_pending = False
+        system.hook_cls.previous_threading_except_hook = None
+        system.dcc = self.dcc
+        system.import_extensions = lambda: self.load_threads.append(threading.current_thread())
+
+    def test_worker_thread_queues_the_load_onto_the_main_thread(self):
+        triggered_threads = []
+        system.exception_triggered = lambda *args: triggered_threads.append(threading.current_thread())
+
+        hook_args = HookArgs(ValueError, ValueError("worker"), None, None)
+        run_in_thread(system.threading_exception_triggered, hook_args)
+        run_in_thread(system.threading_exception_triggered, hook_args)
+
+        self.assertEqual(len(triggered_threads), 2)
+        self.assertEqual(self.load_threads, [])
+        self.assertFalse(system.hook_cls.is_loaded)
+        self.assertEqual(len(self.dcc.deferred_funcs), 1)  # only queued once
+
+        system.hook_cls.is_headless = True  # PySide2 might not be available to import the UI module
+        self.dcc.run_deferred()
+
+        self.assertEqual(self.load_threads, [threading.current_thread()])
+        self.assertTrue(system.hook_cls.is_loaded)
+        self.assertFalse(system.hook_cls.is_load_pending)
+
+    def test_records_before_the_load_are_queued(self):
+        record = system.ExceptionRecord("ValueError", "worker", text="worker")
+        run_in_thread(system.update_dialog, record)
+
+        # the UI module wasn't imported on the worker thread, the record waits for the load on the main thread
+        self.assertEqual(list(system.hook_cls.main_thread_records), [record])
+        self.assertEqual(len(self.dcc.deferred_funcs), 1)
+        self.assertEqual(self.dcc.deferred_funcs[0], system.load_pending_exception_dialog)
+
+    def test_worker_thread_without_lazy_hooks_queues_the_ui_import(self):
+        # registered without the lazy hooks, everything is loaded except for the UI module
+        system.hook_cls.is_loaded = True
+        ui_threads = []
+        drained_records = []
+
+        def import_dialog_ui():
+            ui_threads.append(threading.current_thread())
+            system.hook_cls.is_ui_imported = True
+        system.import_dialog_ui = import_dialog_ui
+        system.drain_main_thread_records = lambda: drained_records.extend(system.hook_cls.main_thread_records)
+
+        record = system.ExceptionRecord("ValueError", "worker", text="worker")
+        run_in_thread(system.update_dialog, record)
+        self.assertEqual(ui_threads, [])
+        self.assertEqual(self.dcc.deferred_funcs, [system.load_pending_exception_dialog])
+
+        self.dcc.run_deferred()
+        self.assertEqual(ui_threads, [threading.current_thread()])
+        self.assertEqual(self.load_threads, [])  # the extensions were loaded already
+        self.assertEqual(drained_records, [record])
+
+    def test_loaded_only_after_success(self):
+        def failing_import_extensions():
+            raise ImportError("broken extension")
+        system.import_extensions = failing_import_extensions
+        system.hook_cls.is_headless = True
+
+        self.assertRaises(ImportError, system.load_exception_dialog)
+        self.assertFalse(system.hook_cls.is_loaded)
+
+        # the hooks print the failure instead, and try again on the next exception
+        system.load_from_hook()
+        self.assertFalse(system.hook_cls.is_loaded)
+
+        system.import_extensions = lambda: None
+        system.load_from_hook()
+        self.assertTrue(system.hook_cls.is_loaded)
+
+    def test_headless_loads_on_any_thread(self):
+        system.hook_cls.is_headless = True
+        run_in_thread(system.load_from_hook)
+
+        self.assertEqual(len(self.load_threads), 1)
+        self.assertIsNot(self.load_threads[0], threading.current_thread())
+        self.assertTrue(system.hook_cls.is_loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
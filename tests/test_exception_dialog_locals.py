@@ -0,0 +1,96 @@
+import gc
+import time
+import unittest
+import weakref
+
+from helpers import get_exc_info
+import exception_dialog.exception_dialog_locals as exception_dialog_locals
+
+
+class SceneNode(object):
+    def __repr__(self):
+        return "SceneNode('pCube1')"
+
+
+class SlowRepr(object):
+    def __repr__(self):
+        time.sleep(exception_dialog_locals.SLOW_REPR_TIME * 2)
+        return "SlowRepr()"
+
+
+def raise_with_locals(weak_refs):
+    scene_node = SceneNode()
+    weak_refs.append(weakref.ref(scene_node))
+    frame_range = [1, 100]
+    node_names = ["pCube{}".format(index) for index in range(100)]
+    node_attributes = {"translate": [scene_node] * 50}
+    raise ValueError("failed")
+
+
+def raise_with_slow_locals():
+    slow_values = [SlowRepr() for _ in range(5)]
+    raise ValueError("failed")
+
+
+def get_local_values(exc_trace, **kwargs):
+    frame_locals = exception_dialog_locals.capture_frame_locals(exc_trace, **kwargs)
+    return dict((local_value.name, local_value) for local_value in frame_locals[-1])
+
+
+class TestExceptionDialogLocals(unittest.TestCase):
+
+    def tearDown(self):
+        exception_dialog_locals.slow_repr_types.discard(SlowRepr)
+
+    def test_only_cheap_builtins_are_repr_right_away(self):
+        weak_refs = []
+        exc_info = get_exc_info(raise_with_locals, weak_refs)
+        local_values = get_local_values(exc_info[2], frame_time_budget=1.0, total_time_budget=1.0)
+
+        self.assertEqual(local_values["frame_range"].get_repr(), "[1, 100]")
+        self.assertFalse(local_values["scene_node"].has_repr)
+        self.assertFalse(local_values["node_names"].has_repr)
+        self.assertEqual(local_values["node_names"].summary, "len=100")
+        self.assertEqual(local_values["node_names"].children[0].get_repr(), "'pCube0'")
+
+        del exc_info
+        gc.collect()
+        self.assertIsNone(weak_refs[0]())
+
+        # short lived objects only keep their summary, builtins that can't be weakly referenced their children
+        self.assertEqual(local_values["scene_node"].type_name, "SceneNode")
+        self.assertEqual(local_values["scene_node"].get_repr(), "<released, only the summary was kept>")
+        self.assertEqual(local_values["node_attributes"].children[0].summary, "len=50")
+
+    def test_repr_is_made_on_demand(self):
+        weak_refs = []
+        exc_info = get_exc_info(raise_with_locals, weak_refs)
+        local_values = get_local_values(exc_info[2], frame_time_budget=1.0, total_time_budget=1.0)
+
+        self.assertEqual(local_values["scene_node"].get_repr(), "SceneNode('pCube1')")  # still alive in exc_info
+        self.assertTrue(local_values["scene_node"].has_repr)
+        self.assertEqual(local_values["scene_node"].to_dict()["repr"], "SceneNode('pCube1')")
+
+    def test_slow_repr_is_not_called_at_capture(self):
+        exc_info = get_exc_info(raise_with_slow_locals)
+        start_time = exception_dialog_locals.timer()
+        local_values = get_local_values(exc_info[2], frame_time_budget=0.01, total_time_budget=0.01)
+        self.assertLess(exception_dialog_locals.timer() - start_time, exception_dialog_locals.SLOW_REPR_TIME)
+
+        slow_values = local_values["slow_values"]
+        self.assertEqual(slow_values.summary, "len=5")
+        self.assertFalse(any(child.has_repr for child in slow_values.children))
+        self.assertEqual(slow_values.children[0].get_repr(), "SlowRepr()")
+
+    def test_slow_repr_types_are_only_repr_once(self):
+        slow_value = SlowRepr()
+        first_value = exception_dialog_locals.capture_value("slow_value", slow_value, 200, 10)
+        self.assertEqual(first_value.get_repr(), "SlowRepr()")
+        self.assertIn(SlowRepr, exception_dialog_locals.slow_repr_types)
+
+        second_value = exception_dialog_locals.capture_value("slow_value", slow_value, 200, 10)
+        self.assertEqual(second_value.get_repr(), "<repr skipped, SlowRepr is slow to repr>")
+        self.assertFalse(second_value.has_repr)
+
+if __name__ == '__main__':
+    unittest.main()
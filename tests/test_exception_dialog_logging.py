@@ -0,0 +1,114 @@
+import logging
+import sys
+import threading
+import unittest
+
+import helpers  # adds the repository base path to the system paths
+import exception_dialog.exception_dialog_logging as exception_dialog_logging
+import exception_dialog.exception_dialog_metrics as edm
+import exception_dialog.exception_dialog_system as system
+
+
+def raise_value_error(message):
+    try:
+        raise ValueError(message)
+    except ValueError:
+        return sys.exc_info()
+
+
+class TestExceptionDialogLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.triggered_values = []
+        self.trigger_func = None
+
+        module_state = dict(
+            (attribute_name, getattr(system, attribute_name)) for attribute_name in
+            ("load_from_hook", "exception_triggered")
+        )
+
+        def restore():
+            exception_dialog_logging.uninstall_logging_handler()
+            for attribute_name, value in module_state.items():
+                setattr(system, attribute_name, value)
+        self.addCleanup(restore)
+
+        def exception_triggered(exc_type, exc_value, exc_trace):
+            self.triggered_values.append(exc_value)
+            if self.trigger_func is not None:
+                self.trigger_func()
+
+        system.load_from_hook = lambda: None
+        system.exception_triggered = exception_triggered
+        edm.metrics.reset()
+
+        self.logger = logging.getLogger("exception_dialog_test_logger")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def test_logged_exceptions_are_reported_once(self):
+        exception_dialog_logging.install_logging_handler(self.logger)
+
+        exc_info = raise_value_error("logged twice")
+        self.logger.error("first", exc_info=exc_info)
+        self.logger.critical("second", exc_info=exc_info)
+        self.logger.error("no exception")
+
+        # handles the records that are still queued
+        exception_dialog_logging.uninstall_logging_handler()
+
+        self.assertEqual(self.triggered_values, [exc_info[1]])
+        self.assertTrue(getattr(exc_info[1], exception_dialog_logging.REPORTED_ATTRIBUTE))
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.exceptions_deduplicated], 1)
+        self.assertNotIn(exception_dialog_logging.LoggingCapture.queue_handler, self.logger.handlers)
+
+    def test_records_below_the_level_are_ignored(self):
+        exception_dialog_logging.install_logging_handler(self.logger, level=logging.ERROR)
+
+        warning_info = raise_value_error("warning")
+        error_info = raise_value_error("error")
+        self.logger.warning("warning", exc_info=warning_info)
+        self.logger.error("error", exc_info=error_info)
+        exception_dialog_logging.uninstall_logging_handler()
+
+        self.assertEqual(self.triggered_values, [error_info[1]])
+
+    def test_exception_dialog_loggers_are_ignored(self):
+        package_logger = logging.getLogger("exception_dialog.test_logger")
+        package_logger.propagate = False
+        exception_dialog_logging.install_logging_handler(package_logger)
+
+        package_logger.error("internal error", exc_info=raise_value_error("internal"))
+        exception_dialog_logging.uninstall_logging_handler()
+
+        self.assertEqual(self.triggered_values, [])
+
+    def test_full_queue_drops_records(self):
+        listener_started = threading.Event()
+        listener_released = threading.Event()
+        all_handled = threading.Event()
+
+        def block_listener():
+            listener_started.set()
+            listener_released.wait(5.0)
+            if len(self.triggered_values) == 2:
+                all_handled.set()
+        self.trigger_func = block_listener
+
+        exception_dialog_logging.install_logging_handler(self.logger, queue_size=1)
+
+        self.logger.error("handled", exc_info=raise_value_error("first"))
+        self.assertTrue(listener_started.wait(5.0))
+
+        # the listener is busy with the first one, so only one more fits in the queue
+        self.logger.error("queued", exc_info=raise_value_error("second"))
+        self.logger.error("dropped", exc_info=raise_value_error("third"))
+        listener_released.set()
+        self.assertTrue(all_handled.wait(5.0))
+
+        self.assertEqual([str(exc_value) for exc_value in self.triggered_values], ["first", "second"])
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.log_records_dropped], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import helpers  # adds the repository base path to the system paths
+import exception_dialog.exception_dialog_metrics as edm
+
+
+class FailingMetrics(edm.ExceptionMetrics):
+    def __init__(self, fail_count):
+        super(FailingMetrics, self).__init__()
+        self.fail_count = fail_count
+
+    def to_prometheus_text(self):
+        if self.fail_count:
+            self.fail_count -= 1
+            raise RuntimeError("failed to format the metrics")
+        return super(FailingMetrics, self).to_prometheus_text()
+
+
+class TestExceptionDialogMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp()
+        self.metrics = edm.ExceptionMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder_path, ignore_errors=True)
+
+    def test_prometheus_text(self):
+        self.metrics.increment(edm.MetricNames.exceptions_seen, 3)
+        self.metrics.observe(edm.MetricNames.format_time, 0.00002)
+        self.metrics.observe(edm.MetricNames.format_time, 2.0)
+        self.metrics.observe(edm.MetricNames.action_time_prefix + "FirstAction", 0.002)
+        self.metrics.observe(edm.MetricNames.action_time_prefix + "SecondAction", 0.002)
+
+        lines = self.metrics.to_prometheus_text().splitlines()
+        pid_label = 'pid="{}"'.format(os.getpid())
+
+        self.assertIn("# TYPE exception_dialog_exceptions_seen_total counter", lines)
+        self.assertIn("exception_dialog_exceptions_seen_total{{{}}} 3".format(pid_label), lines)
+
+        # buckets are cumulative and end with +Inf
+        self.assertIn("# TYPE exception_dialog_format_seconds histogram", lines)
+        self.assertIn('exception_dialog_format_seconds_bucket{{{},le="1e-05"}} 0'.format(pid_label), lines)
+        self.assertIn('exception_dialog_format_seconds_bucket{{{},le="5e-05"}} 1'.format(pid_label), lines)
+        self.assertIn('exception_dialog_format_seconds_bucket{{{},le="1.0"}} 1'.format(pid_label), lines)
+        self.assertIn('exception_dialog_format_seconds_bucket{{{},le="+Inf"}} 2'.format(pid_label), lines)
+        self.assertIn("exception_dialog_format_seconds_count{{{}}} 2".format(pid_label), lines)
+
+        # the action histograms share one typed metric, with an action label each
+        self.assertEqual(lines.count("# TYPE exception_dialog_action_seconds histogram"), 1)
+        self.assertIn('exception_dialog_action_seconds_count{{{},action="FirstAction"}} 1'.format(pid_label), lines)
+        self.assertIn('exception_dialog_action_seconds_count{{{},action="SecondAction"}} 1'.format(pid_label), lines)
+
+    def test_export_replaces_the_file(self):
+        file_path = os.path.join(self.folder_path, "metrics", "exception_dialog.json")
+        self.metrics.increment(edm.MetricNames.exceptions_seen)
+        self.metrics.export(file_path, "json")
+        self.metrics.increment(edm.MetricNames.exceptions_seen)
+        self.metrics.export(file_path, "json")
+
+        with open(file_path, "r") as fp:
+            self.assertEqual(json.load(fp)["counters"], {edm.MetricNames.exceptions_seen: 2})
+        self.assertEqual(os.listdir(os.path.dirname(file_path)), ["exception_dialog.json"])
+
+    def test_exporter(self):
+        file_path = os.path.join(self.folder_path, "exception_dialog.prom")
+        self.metrics.increment(edm.MetricNames.exceptions_seen)
+
+        exporter = edm.MetricsExporter(self.metrics, file_path, interval=0.01)
+        exporter.start()
+        try:
+            end_time = time.time() + 5
+            while not os.path.exists(file_path) and time.time() < end_time:
+                time.sleep(0.01)
+        finally:
+            exporter.stop()
+
+        with open(file_path, "r") as fp:
+            self.assertIn("exception_dialog_exceptions_seen_total", fp.read())
+
+    def test_exporter_failure_is_not_raised(self):
+        # a file where the export folder should be
+        blocking_path = os.path.join(self.folder_path, "blocking")
+        with open(blocking_path, "w") as fp:
+            fp.write("")
+
+        exporter = edm.MetricsExporter(self.metrics, os.path.join(blocking_path, "exception_dialog.prom"))
+        exporter.export()
+        self.assertFalse(os.path.exists(os.path.join(blocking_path, "exception_dialog.prom")))
+
+    def test_export_while_metrics_are_added(self):
+        is_done = threading.Event()
+
+        def add_metrics():
+            for metric_index in range(20000):
+                self.metrics.increment("counter_{}".format(metric_index))
+                self.metrics.observe("histogram_{}".format(metric_index % edm.MAX_HISTOGRAMS), 0.001)
+            is_done.set()
+
+        thread = threading.Thread(target=add_metrics)
+        thread.start()
+        try:
+            while not is_done.is_set():
+                self.metrics.to_prometheus_text()
+                self.metrics.snapshot()
+        finally:
+            thread.join()
+        self.assertIn("exception_dialog_counter_19999_total", self.metrics.to_prometheus_text())
+
+    def test_exporter_keeps_running_after_an_error(self):
+        file_path = os.path.join(self.folder_path, "exception_dialog.prom")
+        exporter = edm.MetricsExporter(FailingMetrics(fail_count=2), file_path, interval=0.01)
+        exporter.start()
+        try:
+            end_time = time.time() + 5
+            while not os.path.exists(file_path) and time.time() < end_time:
+                time.sleep(0.01)
+        finally:
+            exporter.stop()
+        self.assertTrue(os.path.exists(file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
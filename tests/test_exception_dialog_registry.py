@@ -0,0 +1,170 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import helpers  # adds the repository base path to the system paths
+import exception_dialog.exception_dialog_system as system
+
+EXTENSION_NAME = "exception_dialog_ext_unittest"
+
+EXTENSION_SOURCE = """
+import exception_dialog.exception_dialog_system as eds
+
+class UnittestExtensionAction(eds.AutomaticExceptionAction):
+    label = "{label}"
+"""
+
+
+class TestExceptionDialogRegistry(unittest.TestCase):
+
+    def setUp(self):
+        previous_action_classes = list(system.action_registry.action_classes)
+        self.addCleanup(system.action_registry.set_action_classes, previous_action_classes)
+
+    def test_actions_are_split_when_defined(self):
+        class UnittestAutomaticAction(system.AutomaticExceptionAction):
+            pass
+
+        # indirect subclasses are registered too, abstract bases aren't
+        class UnittestAbstractAction(system.AutomaticExceptionAction):
+            is_abstract = True
+
+        class UnittestButtonAction(UnittestAbstractAction):
+            is_automatic = False
+
+        class UnittestHiddenAction(system.BaseExceptionAction):
+            show_button = False
+
+        registry = system.action_registry
+        self.assertIn(UnittestAutomaticAction, registry.automatic_actions)
+        self.assertNotIn(UnittestAbstractAction, registry.all_actions)
+        self.assertIn(UnittestButtonAction, registry.button_actions)
+        self.assertNotIn(UnittestButtonAction, registry.automatic_actions)
+        self.assertIn(UnittestHiddenAction, registry.all_actions)
+        self.assertNotIn(UnittestHiddenAction, registry.button_actions)
+        self.assertIsInstance(registry.automatic_actions, tuple)
+
+        # flags changed after the class definition need a refresh
+        UnittestHiddenAction.show_button = True
+        self.assertNotIn(UnittestHiddenAction, registry.button_actions)
+        registry.refresh()
+        self.assertIn(UnittestHiddenAction, registry.button_actions)
+
+    def test_redefined_action_replaces_the_previous_class(self):
+        class UnittestRedefinedAction(system.AutomaticExceptionAction):
+            label = "first"
+        first_cls = UnittestRedefinedAction
+
+        class UnittestRedefinedAction(system.AutomaticExceptionAction):
+            label = "second"
+
+        self.assertIn(UnittestRedefinedAction, system.action_registry.automatic_actions)
+        self.assertNotIn(first_cls, system.action_registry.all_actions)
+
+    def test_staged_classes_are_swapped_in_together(self):
+        class UnittestStagedAction(system.AutomaticExceptionAction):
+            label = "previous"
+        previous_cls = UnittestStagedAction
+
+        registry = system.action_registry
+        registry.begin_staging()
+
+        class UnittestStagedAction(system.AutomaticExceptionAction):
+            label = "staged"
+
+        # nothing changes until the module imported fine
+        self.assertIn(previous_cls, registry.all_actions)
+        registry.discard_staged()
+        self.assertIn(previous_cls, registry.all_actions)
+
+        registry.begin_staging()
+
+        class UnittestStagedAction(system.AutomaticExceptionAction):
+            label = "committed"
+
+        registry.commit_staged({__name__})
+        labels = [cls.label for cls in registry.all_actions if cls.__name__ == "UnittestStagedAction"]
+        self.assertEqual(labels, ["committed"])
+
+
+class TestExceptionDialogExtensionDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder_path, True)
+        self.index_path = os.path.join(self.folder_path, "index", "discovery_index.json")
+
+        self.extension_folder_path = os.path.join(self.folder_path, "extensions")
+        os.makedirs(self.extension_folder_path)
+        self.extension_path = os.path.join(self.extension_folder_path, EXTENSION_NAME + ".py")
+
+        previous_action_classes = list(system.action_registry.action_classes)
+        self.addCleanup(system.action_registry.set_action_classes, previous_action_classes)
+
+    def write_extension(self, source, mtime_offset=0):
+        with open(self.extension_path, "w") as fp:
+            fp.write(source)
+
+        # file systems with a coarse mtime wouldn't see the change otherwise
+        mtime = time.time() + mtime_offset
+        os.utime(self.extension_path, (mtime, mtime))
+        os.utime(self.extension_folder_path, (mtime, mtime))
+
+    def test_scan_uses_the_index(self):
+        self.write_extension("")
+        open(os.path.join(self.extension_folder_path, "unrelated_module.py"), "w").close()
+        search_paths = [self.extension_folder_path, os.path.join(self.folder_path, "missing")]
+
+        index = system.ExtensionDiscoveryIndex(self.index_path)
+        self.assertEqual(system.scan_extension_modules(search_paths, index), [EXTENSION_NAME])
+        self.assertTrue(os.path.exists(self.index_path))
+
+        # an unchanged folder isn't listed again, the index on disk answers
+        index = system.ExtensionDiscoveryIndex(self.index_path)
+        index.entries[self.extension_folder_path]["modules"] = ["exception_dialog_ext_from_index"]
+        self.assertEqual(system.scan_extension_modules(search_paths, index), ["exception_dialog_ext_from_index"])
+
+        # a changed folder is
+        os.utime(self.extension_folder_path, (time.time() + 10, time.time() + 10))
+        self.assertEqual(system.scan_extension_modules(search_paths, index), [EXTENSION_NAME])
+
+    def test_import_and_reload_extensions(self):
+        self.write_extension(EXTENSION_SOURCE.format(label="first"))
+
+        previous_env_value = os.environ.get(system.lk.extension_modules_env_var)
+        os.environ[system.lk.extension_modules_env_var] = EXTENSION_NAME
+        sys.path.insert(0, self.extension_folder_path)
+
+        def cleanup():
+            sys.path.remove(self.extension_folder_path)
+            sys.modules.pop(EXTENSION_NAME, None)
+            system.extension_states.pop(EXTENSION_NAME, None)
+            if previous_env_value is None:
+                os.environ.pop(system.lk.extension_modules_env_var, None)
+            else:
+                os.environ[system.lk.extension_modules_env_var] = previous_env_value
+        self.addCleanup(cleanup)
+
+        def get_labels():
+            return [cls.label for cls in system.action_registry.automatic_actions
+                    if cls.__name__ == "UnittestExtensionAction"]
+
+        system.import_extensions()
+        self.assertEqual(get_labels(), ["first"])
+        self.assertEqual(system.reload_extensions(), [])
+
+        self.write_extension(EXTENSION_SOURCE.format(label="second version"), mtime_offset=10)
+        self.assertEqual(system.reload_extensions(), [EXTENSION_NAME])
+        self.assertEqual(get_labels(), ["second version"])
+
+        # a broken file keeps the previous action classes
+        self.write_extension(EXTENSION_SOURCE.format(label="broken") + "\nraise RuntimeError('broken')\n", mtime_offset=20)
+        self.assertEqual(system.reload_extensions(), [])
+        self.assertEqual(get_labels(), ["second version"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import base64
+import os
+import sys
+import unittest
+
+# the images are tested without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import PySide2
+except ImportError:
+    PySide2 = None
+
+import helpers  # adds the repository base path to the system paths
+from exception_dialog import resources
+
+qt_app = None
+
+
+class TestExceptionDialogResources(unittest.TestCase):
+
+    def tearDown(self):
+        resources.clear_image_cache()
+
+    def test_image_paths(self):
+        for image_name in ("default_icon", "warning_icon", "copy_icon"):
+            self.assertTrue(os.path.exists(resources.get_image_path(image_name)))
+
+    def test_embedded_images_are_optional(self):
+        embedded_module_path = os.path.join(resources.CURRENT_DIR, resources.EMBEDDED_MODULE_NAME + ".py")
+        if os.path.exists(embedded_module_path):
+            self.skipTest("the embedded images module was generated")
+        self.assertEqual(resources.get_embedded_images(), {})
+
+
+@unittest.skipIf(PySide2 is None, "needs PySide2")
+class TestExceptionDialogImageCache(unittest.TestCase):
+
+    def setUp(self):
+        global qt_app
+        from exception_dialog.ui_utils import QtWidgets
+        qt_app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+        resources.clear_image_cache()
+
+    def tearDown(self):
+        resources.clear_image_cache()
+
+    def test_pixmaps_are_decoded_once(self):
+        pixmap = resources.get_pixmap("warning_icon")
+        self.assertFalse(pixmap.isNull())
+        self.assertIs(resources.get_pixmap("warning_icon"), pixmap)
+
+        # scaled versions are cached separately, and scaled from the cached original
+        scaled_pixmap = resources.get_pixmap("warning_icon", size=(16, 16))
+        self.assertEqual((scaled_pixmap.width(), scaled_pixmap.height()), (16, 16))
+        self.assertIs(resources.get_pixmap("warning_icon", size=(16, 16)), scaled_pixmap)
+        self.assertEqual(len(resources.ImageCache.pixmaps), 2)
+
+    def test_icons_are_shared(self):
+        icon = resources.get_icon("copy_icon")
+        self.assertFalse(icon.isNull())
+        self.assertIs(resources.get_icon("copy_icon"), icon)
+
+        resources.clear_image_cache()
+        self.assertIsNot(resources.get_icon("copy_icon"), icon)
+
+    def test_embedded_images(self):
+        with open(resources.get_image_path("clock_icon"), "rb") as fp:
+            image_data = base64.b64encode(fp.read()).decode("ascii")
+
+        # an image that only exists in the embedded module
+        resources.ImageCache.embedded_images = {"embedded_only_icon": image_data}
+        self.assertFalse(os.path.exists(resources.get_image_path("embedded_only_icon")))
+        self.assertFalse(resources.get_pixmap("embedded_only_icon").isNull())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import helpers  # adds the repository base path to the system paths
+import exception_dialog.exception_dialog_rules as rules
+import exception_dialog.exception_dialog_system as system
+
+
+class ViewportError(RuntimeError):
+    pass
+
+
+def get_exc_info(exc):
+    try:
+        raise exc
+    except Exception:
+        return sys.exc_info()
+
+
+class TestExceptionDialogRules(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp()
+        self.rules_path = os.path.join(self.folder_path, "rules.json")
+        self.file_version = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.folder_path, ignore_errors=True)
+
+    def write_rules(self, rules_data):
+        with open(self.rules_path, "w") as fp:
+            fp.write(rules_data if isinstance(rules_data, str) else json.dumps(rules_data))
+
+        # file systems with a coarse mtime wouldn't see the change otherwise
+        self.file_version += 1
+        mtime = time.time() + self.file_version
+        os.utime(self.rules_path, (mtime, mtime))
+
+    def create_engine(self, rules_data, dcc_name="python"):
+        self.write_rules(rules_data)
+        return rules.RuleEngine(self.rules_path, dcc_name=dcc_name, reload_interval=0)
+
+    def match(self, engine, exc):
+        return engine.match(*get_exc_info(exc))
+
+    def test_suppression(self):
+        engine = self.create_engine({"rules": [
+            {"name": "viewport", "exc_type": "RuntimeError", "message": "Object '.*' not found"},
+            {"name": "other dcc", "exc_type": "KeyError", "dcc": "maya"},
+            {"name": "this file", "file": "*test_exception_dialog_rules.py*", "exc_type": "OSError"},
+        ]})
+
+        # subclasses match as well
+        self.assertEqual(self.match(engine, ViewportError("Object 'pCube1' not found")).name, "viewport")
+        self.assertIsNone(self.match(engine, RuntimeError("something else")))
+        self.assertIsNone(self.match(engine, KeyError("key")))
+        self.assertEqual(self.match(engine, OSError("no file")).name, "this file")
+
+    def test_rate_limit(self):
+        engine = self.create_engine([{"exc_type": "ValueError", "rate_limit": 2, "action": "silent"}])
+
+        matched_rules = [self.match(engine, ValueError("value")) for _ in range(5)]
+        self.assertEqual(matched_rules[:2], [None, None])
+        self.assertEqual([rule.action for rule in matched_rules[2:]], ["silent"] * 3)
+
+    def test_hot_reload(self):
+        engine = self.create_engine([{"exc_type": "ValueError"}])
+        self.assertIsNotNone(self.match(engine, ValueError("value")))
+
+        self.write_rules([{"exc_type": "TypeError"}])
+        self.assertIsNone(self.match(engine, ValueError("value")))
+        self.assertIsNotNone(self.match(engine, TypeError("type")))
+
+        # removing the file removes the rules
+        os.remove(self.rules_path)
+        self.assertIsNone(self.match(engine, TypeError("type")))
+
+    def test_malformed_rules_are_skipped(self):
+        engine = self.create_engine({"rules": [
+            "oops",
+            {"exc_type": "ValueError", "rate_limit": "2"},
+            {"exc_type": "ValueError", "file": 5},
+            {"exc_type": "ValueError", "message": "("},
+            {"exc_type": ["KeyError", 1]},
+            {"exc_type": "ValueError", "action": "explode"},
+            {"name": "valid", "exc_type": "ValueError"},
+        ]})
+        self.assertEqual(self.match(engine, ValueError("value")).name, "valid")
+        self.assertEqual(len(engine.compiled_rules.rules), 1)
+
+    def test_malformed_file_keeps_the_last_rules(self):
+        engine = self.create_engine([{"name": "valid", "exc_type": "ValueError"}])
+        self.assertEqual(self.match(engine, ValueError("value")).name, "valid")
+
+        for rules_data in ("{not json", '{"rules": 5}', "5"):
+            self.write_rules(rules_data)
+            self.assertEqual(self.match(engine, ValueError("value")).name, "valid")
+
+    def test_hook_failure_still_calls_the_previous_hook(self):
+        previous_hook_calls = []
+
+        def failing_exception_triggered(*args, **kwargs):
+            raise AttributeError("broken rule")
+
+        original_exception_triggered = system.exception_triggered
+        original_previous_hook = system.hook_cls.previous_except_hook
+        system.exception_triggered = failing_exception_triggered
+        system.hook_cls.previous_except_hook = lambda *args: previous_hook_calls.append(args)
+        try:
+            exc_info = get_exc_info(ValueError("value"))
+            system.normal_exception_triggered(*exc_info)
+        finally:
+            system.exception_triggered = original_exception_triggered
+            system.hook_cls.previous_except_hook = original_previous_hook
+
+        self.assertEqual(previous_hook_calls, [exc_info])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import get_exc_info, make_record, set_attributes
+import exception_dialog.exception_dialog_headless as exception_dialog_headless
+import exception_dialog.exception_dialog_sampling as sampling
+import exception_dialog.exception_dialog_store as exception_dialog_store
+import exception_dialog.exception_dialog_system as system
+
+
+def create_sampler(**kwargs):
+    # no refill during the test, so only the burst passes
+    sampler_kwargs = dict(rate=0.0001, burst=2, global_rate=0.0001, global_burst=100)
+    sampler_kwargs.update(kwargs)
+    return sampling.AdaptiveSampler(**sampler_kwargs)
+
+
+def make_frame_record(message, function_name="process_scene", line_number=10):
+    return make_record(message, frames=[("/tools/scene_tools.py", line_number, function_name, None)])
+
+
+def make_raising_functions(count):
+    """Functions that raise the same exception from a different line each, like the steps of a failing tool"""
+    raising_functions = []
+    for line_index in range(count):
+        source = "def process_item():\n" + "    pass\n" * line_index + "    raise RuntimeError('failed to process item')\n"
+        namespace = {}
+        exec(compile(source, "item_tools.py", "exec"), namespace)
+        raising_functions.append(namespace["process_item"])
+    return raising_functions
+
+
+class TestExceptionDialogSampling(unittest.TestCase):
+
+    def test_similar_exceptions_share_a_budget(self):
+        sampler = create_sampler()
+        # same type and functions, only the line number (and so the fingerprint) differs
+        first_results = [sampler.sample(make_frame_record("line {}".format(i), line_number=i)) for i in range(4)]
+        other_results = [sampler.sample(make_frame_record("other {}".format(i), "export_scene", i)) for i in range(4)]
+
+        self.assertEqual(first_results, [True, True, False, False])
+        self.assertEqual(other_results, [True, True, False, False])
+        self.assertEqual(sampler.get_stats(sampling.get_sampling_key(make_frame_record("line 0"))).count, 4)
+
+    def test_skips_at_the_end_of_a_burst_are_taken(self):
+        sampler = create_sampler()
+        exc_record = make_record("burst exception")
+        for _ in range(10):
+            sampler.sample(exc_record)
+
+        skipped_counts = sampler.take_skipped_counts()
+        self.assertEqual(list(skipped_counts.keys()), [exc_record.fingerprint])
+        self.assertEqual(skipped_counts[exc_record.fingerprint][0], 8)
+        self.assertEqual(sampler.take_skipped_counts(), {})
+
+    def test_skips_without_a_passed_record_are_carried(self):
+        sampler = create_sampler(global_burst=1)
+        self.assertTrue(sampler.sample(make_frame_record("first exception")))
+        self.assertFalse(sampler.sample(make_frame_record("starved exception", "export_scene")))
+
+        # nothing of this fingerprint was stored yet, the next passed record carries the count instead
+        self.assertEqual(sampler.take_skipped_counts(), {})
+        sampler.global_bucket.tokens = 1.0
+        exc_record = make_frame_record("starved exception", "export_scene")
+        self.assertTrue(sampler.sample(exc_record))
+        self.assertEqual(exc_record.skipped_count, 1)
+
+    def test_stored_counts_are_exact(self):
+        folder_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder_path, True)
+        store = exception_dialog_store.ExceptionStore(os.path.join(folder_path, "exceptions.db"), flush_interval=0.05)
+
+        def add_repeat_counts(repeat_counts):
+            for fingerprint, (count, last_time) in repeat_counts.items():
+                store.add_repeat_count(fingerprint, last_time, count)
+
+        sampler = create_sampler()
+        flusher = sampling.SkippedCountFlusher(sampler, add_repeat_counts)
+        for _ in range(25):
+            exc_record = make_record("sampled exception")
+            if sampler.sample(exc_record):
+                store.add_record(exc_record)
+
+        flusher.flush()  # what the flush timer and the exit handler do
+        self.assertTrue(store.flush(5))
+        self.assertEqual(store.top_fingerprints(since=0)[0]["count"], 25)
+
+    def test_hook_limits_a_burst(self):
+        """Through the hook, a burst of similar exceptions only passes sampling_burst records on to the actions"""
+        folder_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder_path, True)
+        sink = exception_dialog_headless.JsonLinesSink(os.path.join(folder_path, "exceptions.jsonl"))
+        self.addCleanup(sink.close, 5)
+
+        set_attributes(self, system, {"coalescer": system.ExceptionCoalescer()})
+        set_attributes(self, system.hook_cls, {"is_loaded": True, "is_headless": True, "headless_sink": sink,
+                                               "sampler": None, "sampling_flusher": None,
+                                               "previous_except_hook": None, "exc_info_record": None})
+        set_attributes(self, system.lk, {"rules_path": None, "store_enabled": False, "aggregator_enabled": False,
+                                         "context_enabled": False, "capture_locals": False,
+                                         "release_exception_frames": False, "sampling_enabled": True,
+                                         "sampling_rate": 0.0001, "sampling_burst": 3, "sampling_flush_interval": 60})
+
+        received_records = []
+        self.addCleanup(system.action_registry.set_action_classes, list(system.action_registry.action_classes))
+
+        class BurstAction(system.AutomaticExceptionAction):
+            @staticmethod
+            def trigger_action(exc_record):
+                received_records.append(exc_record)
+
+        raising_functions = make_raising_functions(20)
+        for raising_function in raising_functions:
+            system.normal_exception_triggered(*get_exc_info(raising_function))
+        self.addCleanup(system.hook_cls.sampling_flusher.stop)
+
+        # repeats of a skipped record (collapsed by the coalescer) are still counted by the sampler
+        for _ in range(5):
+            system.normal_exception_triggered(*get_exc_info(raising_functions[-1]))
+
+        self.assertEqual(len(received_records), 3)
+        sampling_key = sampling.get_sampling_key(received_records[0])
+        self.assertEqual(system.hook_cls.sampler.get_stats(sampling_key).count, 25)
+        self.assertEqual(len(system.hook_cls.sampler.stats), 1)
+
+        # the next record of the last function that passes carries all of its skips
+        system.hook_cls.sampler.get_stats(sampling_key).bucket.tokens = 1.0
+        set_attributes(self, system, {"coalescer": system.ExceptionCoalescer()})
+        system.normal_exception_triggered(*get_exc_info(raising_functions[-1]))
+        self.assertEqual(received_records[-1].skipped_count, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from helpers import make_record
+import exception_dialog.exception_dialog_search as search
+
+
+def make_tool_record(exc_type_name, message, file_path="/tools/scene_tools.py", exc_module="builtins", timestamp=1000.0):
+    return make_record(message, timestamp, exc_type_name, frames=[(file_path, 10, "run", None)], exc_module=exc_module)
+
+
+class TestExceptionDialogSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.index = search.RecordIndex()
+        records = [
+            make_tool_record("RuntimeError", "Object 'pCube1' not found", timestamp=1000),
+            make_tool_record("ValueError", "invalid literal for int()", file_path="/tools/rig_tools.py", timestamp=2000),
+            make_tool_record("RuntimeError", "No object matches name: pSphere1", timestamp=3000),
+            make_tool_record("RenderError", "Frame 12 failed", exc_module="render_pipeline", timestamp=4000),
+        ]
+        for record_id, record in enumerate(records):
+            self.index.add(record_id, record)
+
+    def search(self, **query_kwargs):
+        return self.index.search(search.RecordQuery(**query_kwargs))
+
+    def test_filters(self):
+        """Each filter matches part of the field, case insensitive, and filters are combined"""
+        self.assertEqual(self.search(exc_type="runtime"), [0, 2])
+        self.assertEqual(self.search(exc_type="error"), [0, 1, 2, 3])
+        self.assertEqual(self.search(module="rig_"), [1])
+        self.assertEqual(self.search(module="render_pipeline"), [3])
+        self.assertEqual(self.search(text="OBJ"), [0, 2])
+        self.assertEqual(self.search(text="'pcube1' not"), [0])
+        self.assertEqual(self.search(text="not pcube1"), [])
+        self.assertEqual(self.search(since=1500, until=3500), [1, 2])
+        self.assertEqual(self.search(exc_type="runtime", text="sphere", since=2500), [2])
+        self.assertEqual(self.search(), [0, 1, 2, 3])
+
+    def test_index_is_updated_incrementally(self):
+        """Removed records are no longer found, added ones are, while typing gives the same results"""
+        self.assertEqual(self.search(text="p"), [0, 2])
+        self.assertEqual(self.search(text="pc"), [0])
+
+        self.index.remove(0)
+        self.index.add(4, make_tool_record("KeyError", "pCube2"))
+        self.assertEqual(self.search(text="pc"), [4])
+        self.assertEqual(self.search(text="pcube2"), [4])
+        self.assertEqual(self.search(exc_type="runtime"), [2])
+
+        query = search.RecordQuery(exc_type="key", text="cube")
+        self.assertTrue(self.index.matches(4, query))
+        self.assertFalse(self.index.matches(2, query))
+        self.assertNotIn("pcube1", self.index.word_postings.postings)
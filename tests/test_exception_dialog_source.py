@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers  # adds the repository base path to the system paths
+import exception_dialog.exception_dialog_source as exception_dialog_source
+import exception_dialog.exception_dialog_system as system
+
+
+class TestExceptionDialogSource(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_folder)
+
+    def write_source_file(self, file_name, file_content):
+        file_path = os.path.join(self.temp_folder, file_name)
+        with open(file_path, "w") as fp:
+            fp.write(file_content)
+        return file_path
+
+    def test_get_line(self):
+        source_cache = exception_dialog_source.SourceCache()
+        file_path = self.write_source_file("module.py", "def func():\n    raise ValueError()\n")
+
+        self.assertEqual(source_cache.get_line(file_path, 2), "raise ValueError()")
+        self.assertEqual(source_cache.get_line(file_path, 0), "")
+        self.assertEqual(source_cache.get_line(file_path, 3), "")
+        self.assertEqual(source_cache.get_line(os.path.join(self.temp_folder, "missing.py"), 1), "")
+
+    def test_changed_files_are_read_again(self):
+        source_cache = exception_dialog_source.SourceCache(check_interval=0)
+        file_path = self.write_source_file("module.py", "first = 1\n")
+        self.assertEqual(source_cache.get_line(file_path, 1), "first = 1")
+
+        self.write_source_file("module.py", "second_version = 2\n")
+        self.assertEqual(source_cache.get_line(file_path, 1), "second_version = 2")
+
+    def test_files_are_not_checked_within_the_interval(self):
+        source_cache = exception_dialog_source.SourceCache(check_interval=60)
+        file_path = self.write_source_file("module.py", "first = 1\n")
+        self.assertEqual(source_cache.get_line(file_path, 1), "first = 1")
+
+        self.write_source_file("module.py", "second_version = 2\n")
+        self.assertEqual(source_cache.get_line(file_path, 1), "first = 1")
+
+        source_cache.clear()
+        self.assertEqual(source_cache.get_line(file_path, 1), "second_version = 2")
+
+    def test_least_recently_used_files_are_dropped(self):
+        source_cache = exception_dialog_source.SourceCache(max_files=2)
+        file_paths = [self.write_source_file("module_{}.py".format(index), "index = {}\n".format(index))
+                      for index in range(3)]
+
+        source_cache.get_lines(file_paths[0])
+        source_cache.get_lines(file_paths[1])
+        source_cache.get_lines(file_paths[0])  # now the most recently used
+        source_cache.get_lines(file_paths[2])
+
+        self.assertEqual(list(source_cache.files.keys()), [file_paths[0], file_paths[2]])
+
+    def test_records_read_the_source_when_formatted(self):
+        file_path = self.write_source_file("module.py", "def func():\n    raise ValueError('lazy')\n")
+        exc_record = system.ExceptionRecord(
+            "ValueError",
+            "lazy",
+            frames=[(file_path, 2, "func", None)],
+            exception_lines=["ValueError: lazy\n"],
+        )
+        exception_dialog_source.source_cache.clear()
+        self.assertNotIn(file_path, exception_dialog_source.source_cache.files)
+
+        self.assertIn("    raise ValueError('lazy')\n", exc_record.text)
+        self.assertIn(file_path, exception_dialog_source.source_cache.files)
+        self.assertEqual(exc_record.frames[0][3], "raise ValueError('lazy')")
+        self.assertEqual(exc_record.get_source_data()["frames"], [[file_path, 2, "func", "raise ValueError('lazy')"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
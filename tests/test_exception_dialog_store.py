@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import make_record
+import exception_dialog.exception_dialog_metrics as edm
+import exception_dialog.exception_dialog_store as exception_dialog_store
+
+
+class TestExceptionDialogStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder_path = tempfile.mkdtemp()
+        self.store = exception_dialog_store.ExceptionStore(
+            os.path.join(self.folder_path, "exceptions.db"), flush_interval=0.05, queue_size=10)
+        edm.metrics.reset()
+
+    def tearDown(self):
+        self.store.flush(5)
+        shutil.rmtree(self.folder_path, ignore_errors=True)
+
+    def test_repeat_storm_does_not_drop_records(self):
+        """Repeats are added up per fingerprint, so they never take the place of records in the write queue"""
+        first_record = make_record("storm exception", 1000.0)
+        self.store.add_record(first_record)
+        for repeat_index in range(20000):
+            first_record.occurrence.count += 1
+            first_record.occurrence.last_time = 1000.0 + repeat_index
+            self.store.add_repeat(first_record.occurrence)
+
+        self.store.add_record(make_record("later exception", 1001.0))
+        self.assertTrue(self.store.flush(5))
+
+        counts = dict(
+            (fingerprint_info["message"], fingerprint_info["count"])
+            for fingerprint_info in self.store.top_fingerprints(since=0)
+        )
+        self.assertEqual(counts, {"storm exception": 20001, "later exception": 1})
+        self.assertEqual(self.store.dropped_count, 0)
+
+    def test_dropped_items_are_counted_in_the_metrics(self):
+        for record_index in range(50):
+            self.store.add_record(make_record("exception {}".format(record_index), 1000.0 + record_index))
+        self.assertTrue(self.store.flush(5))
+
+        self.assertGreater(self.store.dropped_count, 0)
+        self.assertEqual(edm.metrics.counters[edm.MetricNames.store_items_dropped], self.store.dropped_count)
@@ -1,3 +1,13 @@
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import unittest
+import weakref
+
 from maya import cmds
 
 from base import MayaBaseTestCase
@@ -6,12 +16,127 @@ from base import MayaBaseTestCase
 import exception_dialog.exception_dialog_system as system
 
 
+class LargeSceneData(object):
+    def __init__(self):
+        self.points = [0.0] * 1000000
+
+    def __repr__(self):
+        return "LargeSceneData(points={})".format(len(self.points))
+
+
+def raise_with_large_locals(weak_refs):
+    scene_data = LargeSceneData()
+    weak_refs.append(weakref.ref(scene_data))
+    raise ValueError("failed to process scene data")
+
+
+def get_large_locals_exc_info(weak_refs):
+    """exc_info of a traceback with only finished frames, like the one the exception hook gets"""
+    try:
+        raise_with_large_locals(weak_refs)
+    except ValueError:
+        return sys.exc_info()
+
+
 class TestExceptionDialogSystem(MayaBaseTestCase):
     
     def test_system(self):
         """Test system in some fashion"""
         return True
 
+    @unittest.skipIf(not hasattr(traceback, "clear_frames"), "frames can't be cleared in this python version")
+    def test_reported_exception_releases_frame_locals(self):
+        """Scene data in the frame locals is freed once the exception has been reported"""
+        weak_refs = []
+        try:
+            raise_with_large_locals(weak_refs)
+        except ValueError:
+            exc_info = sys.exc_info()
+
+        # keep the traceback alive, like sys.last_traceback does after an unhandled exception
+        exc_trace = exc_info[2]
+
+        record = system.capture_exception(*exc_info)
+        system.release_exception_frames(*exc_info)
+        del exc_info
+        gc.collect()
+
+        self.assertIsNone(weak_refs[0]())
+        self.assertIsNotNone(exc_trace)
+        self.assertEqual(record.exc_type_name, "ValueError")
+        self.assertEqual(record.frames[-1][2], "raise_with_large_locals")
+
+    def test_captured_locals_keep_their_repr_without_the_value(self):
+        """Locals get their repr on demand, keep it once it's made, and don't keep scene data alive"""
+        weak_refs = []
+        exc_info = get_large_locals_exc_info(weak_refs)
+
+        capture_locals = system.lk.capture_locals
+        system.lk.capture_locals = True
+        try:
+            record = system.capture_exception(*exc_info)
+        finally:
+            system.lk.capture_locals = capture_locals
+
+        local_values = dict((local_value.name, local_value) for local_value in record.frame_locals[-1])
+        self.assertEqual(local_values["scene_data"].type_name, "LargeSceneData")
+        self.assertFalse(local_values["scene_data"].has_repr)  # not a builtin, its __repr__ could be slow
+        self.assertEqual(local_values["scene_data"].get_repr(), "LargeSceneData(points=1000000)")
+
+        system.release_exception_frames(*exc_info)
+        del exc_info
+        gc.collect()
+        self.assertIsNone(weak_refs[0]())
+        self.assertEqual(local_values["scene_data"].get_repr(), "LargeSceneData(points=1000000)")
+
+    def test_context_is_snapshotted_once_with_deltas(self):
+        """Records share the session's context snapshot, and only hold what changed since it was taken"""
+        from exception_dialog import exception_dialog_dcc_core
+
+        snapshot = exception_dialog_dcc_core.ContextSnapshot(system.get_dcc().get_context_providers())
+        self.assertIn("sys_path", snapshot.data)
+        self.assertIsNone(snapshot.get_delta())
+
+        os.environ["EXCEPTION_DIALOG_TEST_CONTEXT"] = "1"
+        os.environ["EXCEPTION_DIALOG_TEST_TOKEN"] = "not to be reported"
+        try:
+            delta = snapshot.get_delta()
+        finally:
+            del os.environ["EXCEPTION_DIALOG_TEST_CONTEXT"]
+            del os.environ["EXCEPTION_DIALOG_TEST_TOKEN"]
+
+        self.assertEqual(delta["environment_variables"]["EXCEPTION_DIALOG_TEST_CONTEXT"], "1")
+        self.assertEqual(delta["environment_variables"]["EXCEPTION_DIALOG_TEST_TOKEN"], "<hidden>")
+
+    def test_reload_extensions_swaps_changed_actions(self):
+        """Only changed extensions are reloaded, and their action classes replace the old ones"""
+        extension_folder = tempfile.mkdtemp()
+        sys.path.insert(0, extension_folder)
+        os.environ["EXCEPTION_DIALOG_EXTENSIONS"] = "exception_dialog_ext_reload_test"
+        extension_path = os.path.join(extension_folder, "exception_dialog_ext_reload_test.py")
+
+        def write_extension(class_name, mtime):
+            with open(extension_path, "w") as fp:
+                fp.write("import exception_dialog.exception_dialog_system as eds\n")
+                fp.write("class {}(eds.BaseExceptionAction):\n    pass\n".format(class_name))
+            os.utime(extension_path, (mtime, mtime))
+
+        try:
+            write_extension("ReloadTestAction", time.time() - 10)
+            system.import_extensions()
+            self.assertEqual(system.reload_extensions(), [])
 
+            write_extension("RenamedReloadTestAction", time.time())
+            self.assertEqual(system.reload_extensions(), ["exception_dialog_ext_reload_test"])
 
+            action_names = [cls.__name__ for cls in system.action_registry.all_actions]
+            self.assertIn("RenamedReloadTestAction", action_names)
+            self.assertNotIn("ReloadTestAction", action_names)
+        finally:
+            os.environ.pop("EXCEPTION_DIALOG_EXTENSIONS")
+            sys.path.remove(extension_folder)
+            sys.modules.pop("exception_dialog_ext_reload_test", None)
+            system.extension_states.pop("exception_dialog_ext_reload_test", None)
+            system.action_registry.commit_staged({"exception_dialog_ext_reload_test"})
+            shutil.rmtree(extension_folder)
 
@@ -0,0 +1,112 @@
+import os
+import threading
+import unittest
+
+# the window is tested without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+try:
+    import PySide2
+except ImportError:
+    PySide2 = None
+
+from helpers import make_record, run_in_thread
+import exception_dialog.exception_dialog_system as system
+
+
+@unittest.skipIf(PySide2 is None, "needs PySide2")
+class TestExceptionDialogUI(unittest.TestCase):
+
+    def setUp(self):
+        from exception_dialog import exception_dialog_ui
+        self.exception_dialog_ui = exception_dialog_ui
+        self.app = exception_dialog_ui.QtWidgets.QApplication.instance()
+
+        self.win = exception_dialog_ui.build_window()
+        self.win.show()
+        self.history_model = self.win.ui.history_model
+
+        self.inserted_batches = []
+        self.history_model.rowsInserted.connect(
+            lambda parent, first, last: self.inserted_batches.append(last - first + 1)
+        )
+
+        hook_state = dict(
+            (attribute_name, getattr(system.hook_cls, attribute_name)) for attribute_name in
+            ("dialog_instance", "is_loaded", "is_ui_imported", "is_main_thread_drain_pending")
+        )
+
+        def restore():
+            for attribute_name, value in hook_state.items():
+                setattr(system.hook_cls, attribute_name, value)
+            system.hook_cls.main_thread_records.clear()
+            system.hook_cls.has_main_thread_repeats = False
+            self.win.close()
+            self.win.deleteLater()
+        self.addCleanup(restore)
+
+    def test_records_are_added_in_one_batch(self):
+        for index in range(20):
+            self.win.set_latest_exception(make_record("exception {}".format(index)))
+
+        # nothing is added until the update timer fires
+        self.assertTrue(self.win._update_timer.isActive())
+        self.assertEqual(self.history_model.rowCount(), 0)
+
+        self.win.flush_pending_records()
+        self.assertEqual(self.inserted_batches, [20])
+        self.assertEqual(self.history_model.rowCount(), 20)
+
+        # the view follows the latest exception
+        self.assertEqual(self.win.get_selected_record().message, "exception 19")
+
+    def test_repeats_refresh_the_history(self):
+        self.win.set_latest_exception(make_record("repeated exception"))
+        self.win.flush_pending_records()
+
+        changed_rows = []
+        self.history_model.dataChanged.connect(lambda top_left, bottom_right, *args: changed_rows.append(
+            (top_left.row(), bottom_right.row())
+        ))
+
+        self.win.mark_records_updated()
+        self.win.mark_records_updated()
+        self.assertEqual(changed_rows, [])
+
+        self.win.flush_pending_records()
+        self.assertEqual(changed_rows, [(0, 0)])
+        self.assertEqual(self.inserted_batches, [1])
+
+    def test_worker_thread_records_are_drained_on_the_main_thread(self):
+        system.hook_cls.dialog_instance = self.win
+        system.hook_cls.is_loaded = True
+        system.hook_cls.is_ui_imported = True
+        system.hook_cls.is_main_thread_drain_pending = False
+
+        run_in_thread(system.update_dialog, make_record("worker exception 1"))
+        run_in_thread(system.update_dialog, make_record("worker exception 2"))
+        run_in_thread(system.update_dialog)
+
+        # queued until the main thread processes its events
+        self.assertEqual(len(system.hook_cls.main_thread_records), 2)
+        self.assertTrue(system.hook_cls.is_main_thread_drain_pending)
+
+        self.app.processEvents()
+        self.assertEqual(len(system.hook_cls.main_thread_records), 0)
+        self.assertFalse(system.hook_cls.has_main_thread_repeats)
+
+        self.win.flush_pending_records()
+        self.assertEqual(self.inserted_batches, [2])
+
+    def test_invoke_in_main_thread(self):
+        called_threads = []
+        run_in_thread(self.exception_dialog_ui.invoke_in_main_thread,
+                      lambda: called_threads.append(threading.current_thread()))
+
+        self.assertEqual(called_threads, [])
+        self.app.processEvents()
+        self.assertEqual(called_threads, [threading.current_thread()])
+
+
+if __name__ == '__main__':
+    unittest.main()